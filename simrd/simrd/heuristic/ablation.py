@@ -14,6 +14,7 @@ class AbESizeStale(DTR):
 
 @register_heuristic
 class AbESize(Heuristic):
+  INVALIDATED_BY = set(['regions'])
   MARKER = 'D'
   COLOR = 'blue'
   FEATURES = set(['regions'])
@@ -22,15 +23,22 @@ class AbESize(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     compute = s.compute
-    compute += s.meta['region'].compute + s.meta['region_rev'].compute
+    compute += s.region.compute + s.region_rev.compute
     denominator = s.size
     return compute / denominator if denominator > 0 else math.inf
 
+  def evaluate_batch(self, table, slots, rt):
+    compute = table.compute[slots] + \
+      (table.region_compute[slots] + table.region_rev_compute[slots])
+    return Heuristic.divide_or_inf(compute, table.size[slots])
+
   def __str__(self):
     return r'$e^*$, size, no staleness'
 
 @register_heuristic
 class AbEStale(Heuristic):
+  INVALIDATED_BY = set(['regions'])
+  STALENESS_SCALED = True
   MARKER = '^'
   COLOR = 'orange'
   FEATURES = set(['regions', 'last_access_int'])
@@ -39,15 +47,25 @@ class AbEStale(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     compute = s.compute
-    compute += s.meta['region'].compute + s.meta['region_rev'].compute
-    denominator = Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    compute += s.region.compute + s.region_rev.compute
+    denominator = Heuristic.staleness(s.last_access_int, rt.clock)
     return compute / denominator if denominator > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    return s.compute + s.region.compute + s.region_rev.compute
+
+  def evaluate_batch(self, table, slots, rt):
+    compute = table.compute[slots] + \
+      (table.region_compute[slots] + table.region_rev_compute[slots])
+    denom = Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(compute, denom)
+
   def __str__(self):
     return r'$e^*$, no size, staleness'
 
 @register_heuristic
 class AbE(Heuristic):
+  INVALIDATED_BY = set(['regions'])
   MARKER = 'X'
   COLOR = 'red'
   FEATURES = set(['regions'])
@@ -55,7 +73,11 @@ class AbE(Heuristic):
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    return s.compute + s.meta['region'].compute + s.meta['region_rev'].compute
+    return s.compute + s.region.compute + s.region_rev.compute
+
+  def evaluate_batch(self, table, slots, rt):
+    return table.compute[slots] + table.region_compute[slots] + \
+      table.region_rev_compute[slots]
 
   def __str__(self):
     return r'$e^*$, no size, no staleness'
@@ -78,8 +100,8 @@ class AbEqSize(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     cpi = CheckpointInfo(s.compute)
-    ns = Storage.evicted_neighbors(s, rt.telemetry)
-    n_cpis = set(map(lambda n: EqClassNode.get_value(n.meta['ecn']), ns))
+    ns = s.evicted_adjacent
+    n_cpis = set(map(lambda n: EqClassNode.get_value(n.ecn), ns))
     for n_cpi in n_cpis:
       cpi = CheckpointInfo.merge_f(cpi, n_cpi)
     denom = s.size
@@ -98,11 +120,11 @@ class AbEqStale(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     cpi = CheckpointInfo(s.compute)
-    ns = Storage.evicted_neighbors(s, rt.telemetry)
-    n_cpis = set(map(lambda n: EqClassNode.get_value(n.meta['ecn']), ns))
+    ns = s.evicted_adjacent
+    n_cpis = set(map(lambda n: EqClassNode.get_value(n.ecn), ns))
     for n_cpi in n_cpis:
       cpi = CheckpointInfo.merge_f(cpi, n_cpi)
-    denom = Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    denom = Heuristic.staleness(s.last_access_int, rt.clock)
     return cpi.compute / denom if denom > 0 else math.inf
 
   def __str__(self):
@@ -118,8 +140,8 @@ class AbEq(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     cpi = CheckpointInfo(s.compute)
-    ns = Storage.evicted_neighbors(s, rt.telemetry)
-    n_cpis = set(map(lambda n: EqClassNode.get_value(n.meta['ecn']), ns))
+    ns = s.evicted_adjacent
+    n_cpis = set(map(lambda n: EqClassNode.get_value(n.ecn), ns))
     for n_cpi in n_cpis:
       cpi = CheckpointInfo.merge_f(cpi, n_cpi)
     return cpi.compute
@@ -137,6 +159,7 @@ class AbLocalSizeStale(DTRLocal):
 
 @register_heuristic
 class AbLocalSize(Heuristic):
+  INVALIDATED_BY = set()
   MARKER = 'D'
   COLOR = 'blue'
 
@@ -145,11 +168,16 @@ class AbLocalSize(Heuristic):
     rt.telemetry.summary['heuristic_access_count'] += 1
     return s.compute / s.size if s.size > 0 else math.inf
 
+  def evaluate_batch(self, table, slots, rt):
+    return Heuristic.divide_or_inf(table.compute[slots], table.size[slots])
+
   def __str__(self):
     return r'local, size, no staleness'
 
 @register_heuristic
 class AbLocalStale(Heuristic):
+  INVALIDATED_BY = set()
+  STALENESS_SCALED = True
   MARKER = '^'
   COLOR = 'orange'
   FEATURES = set(['last_access_int'])
@@ -157,14 +185,22 @@ class AbLocalStale(Heuristic):
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    stale = Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    stale = Heuristic.staleness(s.last_access_int, rt.clock)
     return s.compute / stale if stale > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    return s.compute
+
+  def evaluate_batch(self, table, slots, rt):
+    stale = Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(table.compute[slots], stale)
+
   def __str__(self):
     return r'local, no size, staleness'
 
 @register_heuristic
 class AbLocal(Heuristic):
+  INVALIDATED_BY = set()
   MARKER = 'X'
   COLOR = 'red'
 
@@ -173,11 +209,16 @@ class AbLocal(Heuristic):
     rt.telemetry.summary['heuristic_access_count'] += 1
     return s.compute
 
+  def evaluate_batch(self, table, slots, rt):
+    return table.compute[slots]
+
   def __str__(self):
     return r'local, no size, no staleness'
 
 @register_heuristic
 class AbSizeStale(Heuristic):
+  INVALIDATED_BY = set()
+  STALENESS_SCALED = True
   MARKER = '*'
   COLOR = 'green'
   FEATURES = set(['last_access_int'])
@@ -185,9 +226,16 @@ class AbSizeStale(Heuristic):
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    denom = s.size * Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    denom = s.size * Heuristic.staleness(s.last_access_int, rt.clock)
     return 1 / denom if denom > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    return 1 / s.size if s.size > 0 else math.inf
+
+  def evaluate_batch(self, table, slots, rt):
+    denom = table.size[slots] * Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(1, denom)
+
   def __str__(self):
     return r'no cost, size, staleness'
 
@@ -201,6 +249,8 @@ class AbSize(LargestStorage):
 
 @register_heuristic
 class AbStale(Heuristic):
+  INVALIDATED_BY = set()
+  STALENESS_SCALED = True
   MARKER = '^'
   COLOR = 'orange'
   FEATURES = set(['last_access_int'])
@@ -208,9 +258,16 @@ class AbStale(Heuristic):
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    stale = Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    stale = Heuristic.staleness(s.last_access_int, rt.clock)
     return 1 / stale if stale > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    return 1
+
+  def evaluate_batch(self, table, slots, rt):
+    stale = Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(1, stale)
+
   def __str__(self):
     return r'no cost, no size, staleness'
 
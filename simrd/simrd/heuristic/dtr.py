@@ -7,6 +7,8 @@ from .heuristic import *
 @register_heuristic
 class DTR(Heuristic):
   FEATURES = set(['regions', 'last_access_int'])
+  INVALIDATED_BY = set(['regions'])
+  STALENESS_SCALED = True
   COLOR = 'green'
   MARKER = '*'
 
@@ -14,10 +16,21 @@ class DTR(Heuristic):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
     compute = s.compute
-    compute += s.meta['region'].compute + s.meta['region_rev'].compute
-    denominator = s.size * Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    compute += s.region.compute + s.region_rev.compute
+    denominator = s.size * Heuristic.staleness(s.last_access_int, rt.clock)
     return compute / denominator if denominator > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    compute = s.compute
+    compute += s.region.compute + s.region_rev.compute
+    return compute / s.size if s.size > 0 else math.inf
+
+  def evaluate_batch(self, table, slots, rt):
+    compute = table.compute[slots] + \
+      (table.region_compute[slots] + table.region_rev_compute[slots])
+    denom = table.size[slots] * Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(compute, denom)
+
   def __str__(self):
     return r'$h_{DTR}$'
 
@@ -32,11 +45,11 @@ class DTREqClass(Heuristic):
     rt.telemetry.summary['heuristic_access_count'] += 1
     cpi = CheckpointInfo(s.compute)
     # NOTE: we only want unique CPIs, don't overcount
-    ns = Storage.evicted_neighbors(s, rt.telemetry)
-    n_cpis = set(map(lambda n: EqClassNode.get_value(n.meta['ecn']), ns))
+    ns = s.evicted_adjacent
+    n_cpis = set(map(lambda n: EqClassNode.get_value(n.ecn), ns))
     for n_cpi in n_cpis:
       cpi = CheckpointInfo.merge_f(cpi, n_cpi)
-    denom = s.size * Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    denom = s.size * Heuristic.staleness(s.last_access_int, rt.clock)
     return cpi.compute / denom if denom > 0 else math.inf
 
   def __str__(self):
@@ -45,15 +58,24 @@ class DTREqClass(Heuristic):
 @register_heuristic
 class DTRLocal(Heuristic):
   FEATURES = set(['last_access_int'])
+  INVALIDATED_BY = set()
+  STALENESS_SCALED = True
   COLOR = 'rebeccapurple'
   MARKER = 'o'
 
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    denom = s.size * Heuristic.staleness(s.meta['last_access_int'], rt.clock)
+    denom = s.size * Heuristic.staleness(s.last_access_int, rt.clock)
     return s.compute / denom if denom > 0 else math.inf
 
+  def base_cost(self, s, rt, **kwargs):
+    return s.compute / s.size if s.size > 0 else math.inf
+
+  def evaluate_batch(self, table, slots, rt):
+    denom = table.size[slots] * Heuristic.staleness(table.last_access[slots], rt.clock)
+    return Heuristic.divide_or_inf(table.compute[slots], denom)
+
   def __str__(self):
     return r'$h_{DTR}^{local}$'
 
@@ -68,10 +90,10 @@ class DTRUnopt(Heuristic):
     rt.telemetry.summary['heuristic_access_count'] += 1
     nbhd = Heuristic.evicted_neighborhood(s, rt.tensor_map, rt.telemetry)
     compute = s.compute
-    last_access = s.meta['last_access_int']
+    last_access = s.last_access_int
     for u in nbhd:
       compute += u.compute
-      last_access = max(last_access, u.meta['last_access_int'])
+      last_access = max(last_access, u.last_access_int)
     denom = s.size * Heuristic.staleness(last_access, rt.clock)
     return compute / denom if denom > 0 else math.inf
 
@@ -5,6 +5,7 @@ from .heuristic import *
 @register_heuristic
 class MSPS(Heuristic):
   FEATURES = set(['regions'])
+  INVALIDATED_BY = set(['regions'])
   COLOR = 'cyan'
   MARKER = 'v'
 
@@ -15,29 +16,38 @@ class MSPS(Heuristic):
     #       more granular feature information and having the runtime check.
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    compute = s.compute + s.meta['region_rev'].compute
+    compute = s.compute + s.region_rev.compute
     denominator = s.size
     return compute / denominator if denominator > 0 else math.inf
 
+  def evaluate_batch(self, table, slots, rt):
+    compute = table.compute[slots] + table.region_rev_compute[slots]
+    return Heuristic.divide_or_inf(compute, table.size[slots])
+
   def __str__(self):
     return r'$h_{MSPS}$'
 
 @register_heuristic
 class LRU(Heuristic):
   FEATURES = set(['last_access_int'])
+  INVALIDATED_BY = set(['last_access'])
   COLOR = 'orange'
   MARKER = '^'
 
   def evaluate(self, s, rt, **kwargs):
     rt.telemetry.summary['heuristic_eval_count'] += 1
     rt.telemetry.summary['heuristic_access_count'] += 1
-    return s.meta['last_access_int']
+    return s.last_access_int
+
+  def evaluate_batch(self, table, slots, rt):
+    return table.last_access[slots]
 
   def __str__(self):
     return r'$h_{LRU}$'
 
 @register_heuristic
 class LargestStorage(Heuristic):
+  INVALIDATED_BY = set()
   COLOR = 'red'
   MARKER = 's'
 
@@ -46,6 +56,9 @@ class LargestStorage(Heuristic):
     rt.telemetry.summary['heuristic_access_count'] += 1
     return 1 / s.size if s.size > 0 else math.inf
 
+  def evaluate_batch(self, table, slots, rt):
+    return Heuristic.divide_or_inf(1, table.size[slots])
+
   def __str__(self):
     return r'$h_{size}$'
 
@@ -1,6 +1,8 @@
 import math
 from typing import List, Set
 
+import numpy as np
+
 from ..tensor import *
 from ..optimization import *
 from ..telemetry import Telemetry
@@ -14,6 +16,14 @@ def register_heuristic(cls):
 
 class Heuristic:
   FEATURES = set()
+  # Runtime events that can change the cost of an evictable Storage, besides it
+  # entering the pool (e.g. being unlocked or rematerialized). None means the
+  # cost may change at any time, so the pool is scanned.
+  INVALIDATED_BY = None
+  # If True, the cost is `base_cost(s) / staleness(last_access_int)` and
+  # INVALIDATED_BY refers to `base_cost` instead, since the cost itself changes
+  # with the clock.
+  STALENESS_SCALED = False
   COLOR = 'black'
   LINESTYLE = 'solid'
   MARKER = 'x'
@@ -34,7 +44,31 @@ class Heuristic:
     From the given `storage_pool`, returns the Storage(s) to evict. By default,
     chooses a single Storage with the lowest cost. This allows for heuristics to
     incorporate batched eviction, or other features.
+
+    If the runtime keeps a `PriorityEvictionPool` or `StalenessEvictionPool`
+    (see `INVALIDATED_BY`), the same Storage is found from the pool's index
+    instead of by scanning. A `SampledEvictionPool` restricts the scan to its
+    sample, and an `ArrayEvictionPool` is costed by one `evaluate_batch` call.
     """
+    if isinstance(storage_pool, (PriorityEvictionPool, StalenessEvictionPool)):
+      best_storage = storage_pool.min()
+      assert best_storage.ref_int == 0 and best_storage.material
+      return [best_storage]
+    if isinstance(storage_pool, ArrayEvictionPool):
+      table = storage_pool.table
+      slots = table.evictable_slots()
+      with np.errstate(invalid='ignore'):
+        # e.g. 0 * inf for a never-accessed empty Storage, which costs inf
+        costs = self.evaluate_batch(table, slots, rt)
+      best_slot, evaluated = table.argmin(slots, costs)
+      # count the evaluations the scan would have made, not the whole batch
+      rt.telemetry.summary['heuristic_eval_count'] += evaluated
+      rt.telemetry.summary['heuristic_access_count'] += evaluated
+      best_storage = table.storages[best_slot]
+      assert best_storage.ref_int == 0 and best_storage.material
+      return [best_storage]
+    if isinstance(storage_pool, SampledEvictionPool):
+      storage_pool = storage_pool.sample()
     best_cost = math.inf
     best_storage = None
     for s in storage_pool:
@@ -47,13 +81,28 @@ class Heuristic:
         break
     return [best_storage]
 
+  def evaluate_batch(self, table : StorageTable, slots : np.ndarray, rt) -> np.ndarray:
+    """
+    Returns the costs for evicting the Storages in the given `slots` of `table`,
+    as an array matching `evaluate` on each. Optional; heuristics implementing
+    it can use an `ArrayEvictionPool`.
+    """
+    raise NotImplementedError
+
+  def base_cost(self, s : Storage, rt, **kwargs):
+    """
+    For `STALENESS_SCALED` heuristics, returns the cost of evicting Storage `s`
+    multiplied by its staleness.
+    """
+    raise NotImplementedError
+
   @staticmethod
   def evicted_neighborhood(s : Storage, tensor_map, tel : Telemetry) -> Set[Storage]:
     """
     Returns the evicted neighborhood of `s`. This is an unoptimized/uncached
     implementation that internally creates and rebuilds `Region`s. If your
     heuristic uses evicted neighborhoods, then consider using the optimized
-    runtime that maintains `s.meta['region']` and `s.meta['region_rev']`.
+    runtime that maintains `s.region` and `s.region_rev`.
     """
     region = Region(s, reverse=False)
     region_rev = Region(s, reverse=True)
@@ -67,6 +116,12 @@ class Heuristic:
 
     return nbhd
 
+  @staticmethod
+  def divide_or_inf(num, denom) -> np.ndarray:
+    """Vectorized `num / denom if denom > 0 else math.inf`."""
+    num = np.broadcast_to(num, np.shape(denom))
+    return np.divide(num, denom, out=np.full(np.shape(denom), math.inf), where=denom > 0)
+
   @staticmethod
   def staleness(T, clock) -> float:
     """Returns a number representing the staleness of the timestamp `T`."""
@@ -1,2 +1,4 @@
 from .eqclass import *
 from .region import *
+from .pool import *
+from .table import *
@@ -1,7 +1,17 @@
 class EqClassNode:
+  """
+  A node of a union-find structure over equivalence classes, where the root of
+  each class holds the value of the whole class. Classes are linked by rank, and
+  `find_root` compresses paths, so queries take near-constant amortized time.
+
+  There is no way to remove a node from its class; to split a class, give the
+  members of each new class fresh nodes (see `RuntimeV2Optimized`). The old
+  nodes stay in the structure as links to the old root.
+  """
   def __init__(self, value, parent=None, tel=None):
     self._value = value
     self._parent = parent
+    self._rank = 0
     self.tel = tel
 
   def is_root(self):
@@ -9,13 +19,23 @@ class EqClassNode:
 
   @staticmethod
   def find_root(ecn : 'EqClassNode'):
-    if ecn.tel:
-      ecn.tel.summary['heuristic_access_count'] += 1
-    if ecn.is_root():
-      return ecn
-    else:
-      ecn._parent = EqClassNode.find_root(ecn._parent)
-      return ecn._parent
+    """
+    Returns the root of `ecn`'s class, compressing the path so that every node
+    visited points directly at the root. Iterative, so deep chains of nodes
+    cannot exceed the recursion limit.
+    """
+    root = ecn
+    accesses = 1
+    while root._parent is not None:
+      root = root._parent
+      accesses += 1
+    if root.tel:
+      root.tel.summary['heuristic_access_count'] += accesses
+    while ecn is not root:
+      parent = ecn._parent
+      ecn._parent = root
+      ecn = parent
+    return root
 
   @staticmethod
   def get_value(ecn : 'EqClassNode'):
@@ -31,8 +51,13 @@ class EqClassNode:
     r = EqClassNode.find_root(rhs)
     if l == r:
       return l
+    value = merge_f(l._value, r._value)
+    if l._rank > r._rank:
+      l, r = r, l
+    elif l._rank == r._rank:
+      r._rank += 1
     l._parent = r
-    r._value = merge_f(l._value, r._value)
+    r._value = value
     return r
 
 class CheckpointInfo:
@@ -0,0 +1,530 @@
+import heapq, math, random
+
+from .table import StorageTable
+
+class EvictionPool:
+  """
+  Stores the set of evictable Storages for a runtime, with O(1) add, remove,
+  and membership. Iteration follows insertion order (re-adding a removed
+  Storage moves it to the end), which is exactly the order a plain list with
+  `append`/`remove` would give, so heuristics that break ties by pool order
+  make the same decisions.
+
+  Indexed access (for random heuristics) is O(1) too, through an array that
+  removal fills by moving its last Storage into the gap, so indices do not
+  follow the iteration order (but each Storage still has exactly one). This
+  differs from the plain list: after a removal, `pool[i]` may be a different
+  Storage, so heuristics that pick by index (e.g. `RandomStorage`) choose
+  differently for the same seed, though still uniformly at random.
+  """
+  def __init__(self):
+    self._members = {}  # insertion-ordered; map Storage -> index in `_array`
+    self._array = []
+
+  def __len__(self):
+    return len(self._members)
+
+  def __contains__(self, s):
+    return s in self._members
+
+  def __iter__(self):
+    return iter(self._members)
+
+  def __getitem__(self, i):
+    return self._array[i]
+
+  def add(self, s) -> bool:
+    """Adds `s` to the pool, returning False if it was already present."""
+    if s in self._members:
+      return False
+    self._members[s] = len(self._array)
+    self._array.append(s)
+    return True
+
+  def remove(self, s) -> bool:
+    """Removes `s` from the pool, returning False if it was not present."""
+    i = self._members.pop(s, None)
+    if i is None:
+      return False
+    last = self._array.pop()
+    if last is not s:
+      self._array[i] = last
+      self._members[last] = i
+    return True
+
+  def invalidate(self, s):
+    """Signals that the cost of `s` changed; a plain pool caches no costs."""
+    pass
+
+  def clear(self):
+    self._members.clear()
+    self._array.clear()
+
+class PriorityEvictionPool(EvictionPool):
+  """
+  An `EvictionPool` that additionally keeps a min-heap of heuristic costs, for
+  heuristics whose cost of a Storage only changes on known events (declared in
+  the heuristic's `INVALIDATED_BY`). Choosing a victim costs O(log n) instead
+  of a scan over the whole pool.
+
+  Invalidation is lazy: `invalidate` (and `add`) only marks a Storage as dirty,
+  and dirty Storages are re-keyed right before the next choice. Heap entries
+  made stale by removal or re-keying are discarded when they reach the top.
+
+  The chosen Storage is the same one `Heuristic.choose` would pick by scanning
+  the pool in order, which stops at the earliest Storage of cost 0: the lowest
+  cost among the Storages up to that one, with ties going to the Storage added
+  to the pool most recently. Costs may be negative (e.g. `-inf`); then the
+  heap is searched past the lowest costs that come after the earliest 0.
+  """
+  def __init__(self, heuristic, rt):
+    super().__init__()
+    self.heuristic = heuristic
+    self.rt = rt
+    self._heap = []   # heap of (cost, -order, entry id, Storage)
+    self._zero = []   # heap of (order, entry id, Storage) with cost 0
+    self._dirty = {}  # insertion-ordered; map Storage -> None
+    self._order = {}  # map Storage -> position in pool order
+    self._live = {}   # map Storage -> id of its valid heap entry
+    self._counter = 0
+
+  @staticmethod
+  def supports(heuristic, events) -> bool:
+    """
+    Returns whether a runtime that signals the given invalidation `events` can
+    use a `PriorityEvictionPool` for `heuristic`.
+    """
+    invalidated_by = heuristic.INVALIDATED_BY
+    return not heuristic.STALENESS_SCALED and invalidated_by is not None and \
+      invalidated_by.issubset(events)
+
+  def _next(self) -> int:
+    self._counter += 1
+    return self._counter
+
+  def add(self, s) -> bool:
+    if not super().add(s):
+      return False
+    self._order[s] = self._next()
+    self._dirty[s] = None
+    return True
+
+  def remove(self, s) -> bool:
+    if not super().remove(s):
+      return False
+    del self._order[s]
+    self._live.pop(s, None)
+    self._dirty.pop(s, None)
+    return True
+
+  def clear(self):
+    super().clear()
+    self._heap.clear()
+    self._zero.clear()
+    self._dirty.clear()
+    self._order.clear()
+    self._live.clear()
+
+  def invalidate(self, s):
+    """Marks the cost of `s` as changed; has no effect if `s` is not in the pool."""
+    if s in self._order:
+      self._dirty[s] = None
+
+  def _flush(self):
+    if len(self._heap) > 2 * len(self) + 64:
+      # drop stale entries so the heaps stay proportional to the pool
+      self._heap = [e for e in self._heap if self._live.get(e[3]) == e[2]]
+      heapq.heapify(self._heap)
+      self._zero = [e for e in self._zero if self._live.get(e[2]) == e[1]]
+      heapq.heapify(self._zero)
+    for s in self._dirty:
+      cost = self.heuristic.evaluate(s, self.rt)
+      order = self._order[s]
+      entry_id = self._next()
+      self._live[s] = entry_id
+      heapq.heappush(self._heap, (cost, -order, entry_id, s))
+      if cost == 0:
+        heapq.heappush(self._zero, (order, entry_id, s))
+    self._dirty.clear()
+
+  @staticmethod
+  def _top(heap, is_live):
+    while heap and not is_live(heap[0]):
+      heapq.heappop(heap)
+    return heap[0] if heap else None
+
+  def min(self):
+    """Returns the Storage the scan would choose, without removing it."""
+    self._flush()
+    live = self._live
+    top = PriorityEvictionPool._top(self._heap, lambda e: live.get(e[3]) == e[2])
+    zero = PriorityEvictionPool._top(self._zero, lambda e: live.get(e[2]) == e[1])
+    if top is None or zero is None:
+      return top[3] if top is not None else None
+    if top[0] >= 0:
+      # the lowest cost is 0, and the scan stops at the earliest 0
+      return zero[2]
+    # the scan only sees the negative costs before the earliest 0
+    popped, best = [], zero[2]
+    while self._heap and self._heap[0][0] < 0:
+      entry = heapq.heappop(self._heap)
+      if live.get(entry[3]) != entry[2]:
+        continue
+      popped.append(entry)
+      if -entry[1] < zero[0]:
+        best = entry[3]
+        break
+    for entry in popped:
+      heapq.heappush(self._heap, entry)
+    return best
+
+class StalenessEvictionPool(EvictionPool):
+  """
+  An `EvictionPool` for staleness-scaled heuristics, i.e. those whose cost is
+  `base_cost(s) / (clock - last_access_int)` (see `Heuristic.STALENESS_SCALED`),
+  where `base_cost` only changes on the events in the heuristic's
+  `INVALIDATED_BY`. These costs change whenever the clock advances, but the
+  cost of `s` is never below `A / (clock - t)` for any `A <= base_cost(s)`.
+
+  Storages are bucketed by the binary exponent of their base cost, and each
+  bucket is a heap ordered by last access, so the bucket's lowest possible cost
+  is at its top. Choosing searches buckets best-first, evaluating Storages
+  exactly until no remaining bound can beat (or tie) the best cost found. The
+  result is the same Storage the linear scan in `Heuristic.choose` returns.
+
+  With `approx > 0`, the search instead stops once the best cost found is within
+  a factor of `1 + approx` of every remaining bound.
+  """
+  # relative slack so float rounding in `evaluate` never beats a bound
+  EPS = 1e-9
+
+  def __init__(self, heuristic, rt, approx=0.0):
+    super().__init__()
+    self.heuristic = heuristic
+    self.rt = rt
+    self.approx = approx
+    self._buckets = {}  # map exponent -> heap of (last_access, order, entry id, Storage)
+    self._zero = []     # heap of (order, entry id, Storage) with base cost 0
+    self._dirty = {}    # insertion-ordered; map Storage -> None
+    self._order = {}    # map Storage -> position in pool order
+    self._live = {}     # map Storage -> id of its valid heap entry
+    self._entries = 0
+    self._counter = 0
+
+  @staticmethod
+  def supports(heuristic, events) -> bool:
+    """
+    Returns whether a runtime that signals the given invalidation `events` can
+    use a `StalenessEvictionPool` for `heuristic`.
+    """
+    invalidated_by = heuristic.INVALIDATED_BY
+    return heuristic.STALENESS_SCALED and invalidated_by is not None and \
+      invalidated_by.union(['last_access']).issubset(events)
+
+  def _next(self) -> int:
+    self._counter += 1
+    return self._counter
+
+  def add(self, s) -> bool:
+    if not super().add(s):
+      return False
+    self._order[s] = self._next()
+    self._dirty[s] = None
+    return True
+
+  def remove(self, s) -> bool:
+    if not super().remove(s):
+      return False
+    del self._order[s]
+    self._live.pop(s, None)
+    self._dirty.pop(s, None)
+    return True
+
+  def clear(self):
+    super().clear()
+    self._buckets.clear()
+    self._zero.clear()
+    self._dirty.clear()
+    self._order.clear()
+    self._live.clear()
+    self._entries = 0
+
+  def invalidate(self, s):
+    """Marks the base cost or last access of `s` as changed."""
+    if s in self._order:
+      self._dirty[s] = None
+
+  def _is_live(self, s, entry_id) -> bool:
+    return self._live.get(s) == entry_id
+
+  def _compact(self):
+    self._entries = 0
+    for k in list(self._buckets.keys()):
+      heap = [e for e in self._buckets[k] if self._is_live(e[3], e[2])]
+      if len(heap) == 0:
+        del self._buckets[k]
+        continue
+      heapq.heapify(heap)
+      self._buckets[k] = heap
+      self._entries += len(heap)
+    self._zero = [e for e in self._zero if self._is_live(e[2], e[1])]
+    heapq.heapify(self._zero)
+    self._entries += len(self._zero)
+
+  def _flush(self):
+    if self._entries > 2 * len(self) + 64:
+      self._compact()
+    for s in self._dirty:
+      base = self.heuristic.base_cost(s, self.rt)
+      order = self._order[s]
+      entry_id = self._next()
+      self._live[s] = entry_id
+      if base == math.inf:
+        # always costs inf, only chosen when every cost is inf (see `min`)
+        continue
+      assert base >= 0
+      self._entries += 1
+      if base == 0:
+        heapq.heappush(self._zero, (order, entry_id, s))
+      else:
+        k = math.frexp(base)[1]
+        heap = self._buckets.get(k)
+        if heap is None:
+          heap = self._buckets[k] = []
+        heapq.heappush(heap, (s.last_access_int, order, entry_id, s))
+    self._dirty.clear()
+
+  @staticmethod
+  def _bound(k, last_access, clock) -> float:
+    stale = clock - last_access
+    if stale <= 0:
+      return math.inf
+    # every base cost in bucket k is at least 2 ** (k - 1)
+    return math.ldexp(0.5, k) / stale
+
+  def min(self):
+    """Returns the Storage with the lowest cost, without removing it."""
+    if len(self) == 0:
+      return None
+    self._flush()
+    clock = self.rt.clock
+    evaluate = self.heuristic.evaluate
+    best, best_key = None, None
+    popped = []
+
+    # Zero base costs: the earliest such Storage with nonzero staleness costs 0,
+    # which beats everything but an earlier Storage of cost 0.
+    while self._zero:
+      entry = heapq.heappop(self._zero)
+      order, entry_id, s = entry
+      if not self._is_live(s, entry_id):
+        self._entries -= 1
+        continue
+      popped.append((None, entry))
+      cost = evaluate(s, self.rt)
+      key = (cost, order if cost == 0 else -order)
+      if best_key is None or key < best_key:
+        best, best_key = s, key
+      if cost == 0:
+        break
+
+    frontier = []
+    for k, heap in self._buckets.items():
+      if heap:
+        heapq.heappush(frontier, (StalenessEvictionPool._bound(k, heap[0][0], clock), k))
+
+    slack = (1 - StalenessEvictionPool.EPS) * (1 + self.approx)
+    while frontier:
+      bound, k = heapq.heappop(frontier)
+      if bound == math.inf:
+        break
+      if best_key is not None and bound * slack > best_key[0]:
+        break
+      heap = self._buckets[k]
+      entry = heapq.heappop(heap)
+      last_access, order, entry_id, s = entry
+      if self._is_live(s, entry_id):
+        popped.append((k, entry))
+        cost = evaluate(s, self.rt)
+        key = (cost, order if cost == 0 else -order)
+        if best_key is None or key < best_key:
+          best, best_key = s, key
+      else:
+        self._entries -= 1
+      if heap:
+        heapq.heappush(frontier, (StalenessEvictionPool._bound(k, heap[0][0], clock), k))
+
+    for k, entry in popped:
+      heapq.heappush(self._zero if k is None else self._buckets[k], entry)
+
+    if best_key is None or best_key[0] == math.inf:
+      # every cost is inf, and the scan picks the last Storage in the pool
+      return next(reversed(self._members))
+    return best
+
+class SampledEvictionPool(EvictionPool):
+  """
+  An `EvictionPool` whose heuristic scan only considers a seeded random sample
+  of the pool, and optionally skips small Storages, like the sampling and
+  `ignore_small_tensors` options of the DTR PyTorch implementation.
+
+  `sample` is either 'sqrt', which walks the pool with random strides in
+  [1, floor(sqrt(n))] as the PyTorch runtime does, an int k, which takes k
+  Storages uniformly without replacement, or None to consider every Storage.
+  Samples are drawn through the pool's indices, so they cost O(k) (resp.
+  O(sqrt(n))) rather than O(n), and are then put in pool order, so ties are
+  broken as in a full scan.
+
+  With `small_ratio > 0`, Storages smaller than `small_ratio` times the mean
+  size of the Storages in the pool are not candidates: they are skipped by
+  the walk, and redrawn for k samples (up to `REDRAWS` times k draws). Unlike
+  PyTorch, which never evicts them, a sample that only found small Storages
+  is returned as is, so that filtering alone never causes an OOM.
+  """
+  REDRAWS = 4
+
+  def __init__(self, sample=None, seed=0, small_ratio=0.0):
+    super().__init__()
+    assert sample is None or sample == 'sqrt' or \
+      (isinstance(sample, int) and sample > 0), \
+      'invalid sample size {}'.format(sample)
+    self.sample_size = sample
+    self.small_ratio = small_ratio
+    self.rng = random.Random(seed)
+    self._order = {}  # map Storage -> position in pool order
+    self._counter = 0
+    self._size_sum = 0
+
+  def add(self, s) -> bool:
+    if not super().add(s):
+      return False
+    self._counter += 1
+    self._order[s] = self._counter
+    self._size_sum += s.size
+    return True
+
+  def remove(self, s) -> bool:
+    if not super().remove(s):
+      return False
+    del self._order[s]
+    self._size_sum -= s.size
+    return True
+
+  def clear(self):
+    super().clear()
+    self._order.clear()
+    self._size_sum = 0
+
+  def _is_small(self, s) -> bool:
+    return s.size * len(self) < self.small_ratio * self._size_sum
+
+  def sample(self):
+    """Returns the Storages a heuristic should consider, in pool order."""
+    n = len(self)
+    filtered = self.small_ratio > 0
+    if self.sample_size is None or n == 0:
+      if not filtered:
+        return self
+      # the heuristic scans every Storage anyway
+      candidates = [s for s in self if not self._is_small(s)]
+      return candidates if len(candidates) > 0 else self
+    array = self._array
+    picked, small = [], []
+    if self.sample_size == 'sqrt':
+      stride = max(1, int(math.sqrt(n)))
+      i = 0
+      while i < n:
+        s = array[i]
+        (small if filtered and self._is_small(s) else picked).append(s)
+        i += self.rng.randint(1, stride)
+    elif self.sample_size >= n and not filtered:
+      return self
+    elif not filtered:
+      picked = [array[i] for i in self.rng.sample(range(n), self.sample_size)]
+    else:
+      k = min(self.sample_size, n)
+      drawn = set()
+      draws = min(n, self.REDRAWS * k)
+      while len(picked) < k and len(drawn) < draws:
+        i = self.rng.randrange(n)
+        if i in drawn:
+          continue
+        drawn.add(i)
+        s = array[i]
+        (small if self._is_small(s) else picked).append(s)
+    if len(picked) == 0:
+      picked = small
+    picked.sort(key=self._order.__getitem__)
+    return picked
+
+class ArrayEvictionPool(EvictionPool):
+  """
+  An `EvictionPool` that mirrors its members into a `StorageTable`, so that
+  heuristics implementing `evaluate_batch` can cost the whole pool in one
+  vectorized pass. The table row of a Storage is rewritten when it enters the
+  pool and whenever the runtime invalidates it, so this needs the same events
+  as a `PriorityEvictionPool`, plus 'last_access' for staleness.
+  """
+  def __init__(self):
+    super().__init__()
+    self.table = StorageTable()
+    self._counter = 0
+
+  @staticmethod
+  def supports(heuristic, events) -> bool:
+    """
+    Returns whether a runtime that signals the given invalidation `events` can
+    use an `ArrayEvictionPool` for `heuristic`.
+    """
+    from ..heuristic import Heuristic
+    invalidated_by = heuristic.INVALIDATED_BY
+    return type(heuristic).evaluate_batch is not Heuristic.evaluate_batch and \
+      invalidated_by is not None and \
+      invalidated_by.union(['last_access']).issubset(events)
+
+  def add(self, s) -> bool:
+    if not super().add(s):
+      return False
+    i = self.table.write(s)
+    self._counter += 1
+    self.table.order[i] = self._counter
+    self.table.evictable[i] = True
+    return True
+
+  def remove(self, s) -> bool:
+    if not super().remove(s):
+      return False
+    self.table.evictable[self.table.slot(s)] = False
+    return True
+
+  def clear(self):
+    for s in self:
+      self.table.evictable[self.table.slot(s)] = False
+    super().clear()
+
+  def invalidate(self, s):
+    """Rewrites the table row of `s`; has no effect if `s` is not in the pool."""
+    if s in self._members:
+      self.table.write(s)
+
+def make_eviction_pool(heuristic, rt, events, indexed=True, approx=0.0,
+                       sample=None, sample_seed=0, small_ratio=0.0,
+                       vectorized=False) -> EvictionPool:
+  """
+  Returns an eviction pool for `rt`, which signals the invalidation `events`.
+  If `sample` or `small_ratio` is set, this is a `SampledEvictionPool`. If
+  `vectorized`, this is an `ArrayEvictionPool` when `heuristic` allows it. If
+  `indexed`, this is a `PriorityEvictionPool` or `StalenessEvictionPool` when
+  `heuristic` allows it (with the given `approx` for the latter), and otherwise
+  a plain `EvictionPool` that heuristics scan.
+  """
+  if sample is not None or small_ratio > 0:
+    return SampledEvictionPool(sample=sample, seed=sample_seed, small_ratio=small_ratio)
+  if vectorized and ArrayEvictionPool.supports(heuristic, events):
+    return ArrayEvictionPool()
+  if indexed:
+    if StalenessEvictionPool.supports(heuristic, events):
+      return StalenessEvictionPool(heuristic, rt, approx=approx)
+    if PriorityEvictionPool.supports(heuristic, events):
+      return PriorityEvictionPool(heuristic, rt)
+  return EvictionPool()
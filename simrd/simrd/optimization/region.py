@@ -1,3 +1,5 @@
+from typing import Set
+
 class Region:
   """
   Stores a reachable set of evicted storages (respective to some base storage),
@@ -21,6 +23,11 @@ class Region:
       return t.parents
     return t.children
 
+  def inverse_visitor(self, t):
+    if self.reverse:
+      return t.children
+    return t.parents
+
   def absorb(self, frontier_s, tensor_map, tel : 'Telemetry'):
     """
     Absorbs the corresponding Region for `frontier_s` (i.e., the Region of the
@@ -36,19 +43,20 @@ class Region:
     assert not frontier_s.material
     assert frontier_s.root_id in self.frontier
 
-    reg = frontier_s.meta['region_rev'] if self.reverse else frontier_s.meta['region']
+    reg = frontier_s.region_rev if self.reverse else frontier_s.region
 
     self.frontier.remove(frontier_s.root_id)
     self.frontier.update(reg.frontier)
+    # aliases can make cycles through the base, which is never its own frontier
+    self.frontier.discard(self.base.root_id)
 
     # TODO: the difference in the other direction might be smaller, generally
     interior_diff = reg.interior.difference(self.interior)
     interior_diff.add(frontier_s.root_id)
 
     for sid in interior_diff:
-      tel.summary['heuristic_access_count'] += 1
-      interior_s = tensor_map[sid].storage
-      self.compute += interior_s.compute
+      self.compute += tensor_map[sid].storage.compute
+    tel.summary['heuristic_access_count'] += len(interior_diff)
 
     self.interior.update(interior_diff)
 
@@ -64,12 +72,13 @@ class Region:
     self.frontier.clear()
     self.compute = 0
 
+    accesses = 0
     stack = [self.base]
     while stack:
       s = stack.pop()
       for t in s.tensors:
         for u in self.visitor(t):
-          tel.summary['heuristic_access_count'] += 1
+          accesses += 1
           us = u.storage
           us_id = us.root_id
           if us.material:
@@ -80,3 +89,110 @@ class Region:
             self.compute += us.compute
             self.interior.add(us_id)
             stack.append(us)
+    tel.summary['heuristic_access_count'] += accesses
+
+  def shrink(self, remat : Set[int], downstream : Set[int], fresh : Set[int],
+             tensor_map, tel : 'Telemetry'):
+    """
+    Updates this Region after the (previously evicted) storages `remat` are
+    rematerialized, giving the same result as `rebuild` but only visiting the
+    part of the Region that may have been cut off.
+
+    `downstream` must contain every evicted storage reachable from `remat` in
+    this Region's direction, i.e. the union of the same-direction Regions of
+    the storages in `remat` (rebuilt after they became material). Storages of
+    the interior outside `downstream` are still reachable without passing
+    through `remat`, so only those inside it are re-checked: they stay if they
+    can be reached from the rest of the interior (or the base) without leaving
+    `downstream`.
+
+    `fresh` are the storages that are not computed yet (the outputs of the
+    operator being computed). They were added to the graph after this Region
+    was built, so are added to the interior if they are now reachable, as
+    `rebuild` would. They have no children yet, so nothing is reachable
+    through them.
+
+    NOTE: This should be called after `remat` are rematerialized, on every
+    Region containing or adjacent to one of them.
+
+    INVARIANTS: self.base.material
+                all(tensor_map[sid].storage.material for sid in remat)
+    """
+    assert self.base.material
+    base_id = self.base.root_id
+
+    # frontier storages next to anything leaving the interior must be re-checked
+    candidates = set(remat)
+    for sid in self.interior & remat:
+      self._drop(tensor_map[sid].storage, candidates, tel)
+
+    # interior storages that might only have been reachable through `remat`
+    cut = self.interior & downstream
+
+    # find the ones still reachable from outside of the cut, then close forward
+    reached = set()
+    stack = []
+    for sid in cut:
+      s = tensor_map[sid].storage
+      if self._adjacent(s, lambda pid: pid not in cut, tel):
+        reached.add(sid)
+        stack.append(s)
+    accesses = 0
+    while stack:
+      s = stack.pop()
+      for t in s.tensors:
+        for u in self.visitor(t):
+          accesses += 1
+          us = u.storage
+          us_id = us.root_id
+          if us_id in cut and us_id not in reached:
+            reached.add(us_id)
+            stack.append(us)
+    tel.summary['heuristic_access_count'] += accesses
+
+    for sid in cut - reached:
+      self._drop(tensor_map[sid].storage, candidates, tel)
+    candidates.discard(base_id)
+
+    for sid in candidates:
+      if self._adjacent(tensor_map[sid].storage, lambda pid: True, tel):
+        self.frontier.add(sid)
+      else:
+        self.frontier.discard(sid)
+
+    for sid in fresh - self.interior:
+      s = tensor_map[sid].storage
+      if self._adjacent(s, lambda pid: True, tel):
+        self.interior.add(sid)
+        self.compute += s.compute
+
+  def _drop(self, s, candidates : Set[int], tel : 'Telemetry'):
+    """
+    Removes `s` from the interior, adding its material neighbors to `candidates`.
+    """
+    self.interior.remove(s.root_id)
+    self.compute -= s.compute
+    accesses = 0
+    for t in s.tensors:
+      for u in self.visitor(t):
+        accesses += 1
+        if u.storage.material:
+          candidates.add(u.storage.root_id)
+    tel.summary['heuristic_access_count'] += accesses
+
+  def _adjacent(self, s, pred, tel : 'Telemetry') -> bool:
+    """
+    Returns whether `s` is directly reachable from the base, or from an interior
+    storage whose id satisfies `pred`.
+    """
+    base_id = self.base.root_id
+    accesses = 0
+    for t in s.tensors:
+      for u in self.inverse_visitor(t):
+        accesses += 1
+        pid = u.storage.root_id
+        if pid == base_id or (pid in self.interior and pred(pid)):
+          tel.summary['heuristic_access_count'] += accesses
+          return True
+    tel.summary['heuristic_access_count'] += accesses
+    return False
@@ -0,0 +1,87 @@
+import numpy as np
+
+class StorageTable:
+  """
+  Struct-of-arrays view of per-Storage heuristic state, for vectorized cost
+  evaluation (see `Heuristic.evaluate_batch`). Each Storage gets a dense slot
+  the first time it is written, and every column is a contiguous NumPy array
+  indexed by slot:
+
+  - `size`, `compute`: the Storage's size and (cached) compute.
+  - `last_access`: `s.last_access_int`, or -inf if unset.
+  - `region_compute`, `region_rev_compute`: the compute of the Storage's
+    forward and reverse evicted `Region`s, or 0 if the runtime keeps none.
+  - `evictable`: whether the Storage is in the eviction pool.
+  - `order`: position in pool order, for breaking ties like a scan does.
+
+  The table is only as fresh as its last `write`; the owning pool rewrites a
+  Storage whenever the runtime invalidates it.
+  """
+  COLUMNS = {
+    'size': np.float64,
+    'compute': np.float64,
+    'last_access': np.float64,
+    'region_compute': np.float64,
+    'region_rev_compute': np.float64,
+    'evictable': np.bool_,
+    'order': np.int64
+  }
+
+  def __init__(self, capacity=1024):
+    self.storages = []
+    self._slot = {}  # map Storage -> slot
+    self._capacity = capacity
+    for name, dtype in StorageTable.COLUMNS.items():
+      setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+  def __len__(self):
+    return len(self.storages)
+
+  def _grow(self):
+    self._capacity *= 2
+    for name in StorageTable.COLUMNS:
+      old = getattr(self, name)
+      new = np.zeros(self._capacity, dtype=old.dtype)
+      new[:len(old)] = old
+      setattr(self, name, new)
+
+  def slot(self, s) -> int:
+    """Returns the slot of `s`, assigning a new one if needed."""
+    i = self._slot.get(s)
+    if i is None:
+      i = len(self.storages)
+      if i == self._capacity:
+        self._grow()
+      self._slot[s] = i
+      self.storages.append(s)
+    return i
+
+  def write(self, s) -> int:
+    """Copies the current state of `s` into its slot, which is returned."""
+    i = self.slot(s)
+    self.size[i] = s.size
+    self.compute[i] = s.compute
+    self.last_access[i] = s.last_access_int
+    region, region_rev = s.region, s.region_rev
+    self.region_compute[i] = region.compute if region is not None else 0
+    self.region_rev_compute[i] = region_rev.compute if region_rev is not None else 0
+    return i
+
+  def evictable_slots(self) -> np.ndarray:
+    """Returns the slots of all evictable Storages, in increasing order."""
+    return np.flatnonzero(self.evictable[:len(self.storages)])
+
+  def argmin(self, slots : np.ndarray, costs : np.ndarray) -> (int, int):
+    """
+    Returns the slot that the scan in `Heuristic.choose` would pick among
+    `slots`, and how many Storages the scan would evaluate: the scan stops at
+    the first Storage (in pool order) of cost 0, and otherwise keeps the latest
+    Storage with the lowest cost.
+    """
+    order = self.order[slots]
+    zero = costs == 0
+    if zero.any():
+      prefix = order <= order[zero].min()
+      slots, costs, order = slots[prefix], costs[prefix], order[prefix]
+    ties = costs == costs.min()
+    return int(slots[ties][order[ties].argmax()]), len(slots)
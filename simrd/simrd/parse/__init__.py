@@ -1 +1,3 @@
 from .parse import *
+from .cache import *
+from .stream import *
@@ -0,0 +1,46 @@
+import hashlib, os, shutil, tempfile
+
+from .graph import Topology
+from .parse import parse_file, OutputCondition
+
+# bump whenever parsing or the saved Topology format changes
+CACHE_VERSION = 1
+
+def cache_key(path : str, start=True, out_cond=OutputCondition.REMATERIALIZE,
+              ignore_undefined_release=True) -> str:
+  """
+  Returns a key for the log at `path` parsed with the given options, from a
+  hash of the log's contents (so renamed or copied logs share an entry).
+  """
+  h = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(1 << 20), b''):
+      h.update(block)
+  h.update(repr((CACHE_VERSION, start, out_cond.name, ignore_undefined_release)).encode())
+  return h.hexdigest()
+
+def parse_file_cached(path : str, cache_dir : str, start=True,
+                      out_cond=OutputCondition.REMATERIALIZE,
+                      ignore_undefined_release=True, workers=1) -> Topology:
+  """
+  Returns the `Topology` of the `Graph` that `parse_file` gives for the log at
+  `path`, parsing the log only if `cache_dir` has no entry for it yet. Entries
+  are saved as `Topology` directories, so loading one is memory-mapped and
+  cheap; concurrent processes may race to create an entry, but each one is
+  written to a temporary directory and then moved into place. `workers` is
+  passed to `parse_file`.
+  """
+  entry = os.path.join(cache_dir, cache_key(path, start, out_cond, ignore_undefined_release))
+  if not os.path.isdir(entry):
+    with open(path, 'r') as f:
+      g = parse_file(f, start=start, out_cond=out_cond,
+                     ignore_undefined_release=ignore_undefined_release, workers=workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+    Topology(g).save(tmp)
+    try:
+      os.rename(tmp, entry)
+    except OSError:
+      # another process created the entry first
+      shutil.rmtree(tmp)
+  return Topology.load(entry)
@@ -12,9 +12,9 @@ def to_dfgraph(g : Graph) -> DFGraph:
     return op_map[name]
 
   args = {}
-  for t in g.ops.keys():
-    parents = sorted([map_op(p) for p in g.op_parents[t]])
-    args[map_op(t)] = parents
+  for op in g.op_list:
+    parents = sorted([map_op(g.op_list[p].name) for p in g.op_parent_ids[op.id]])
+    args[map_op(op.name)] = parents
 
   v = op_map.values()
   cost_cpu = {op_map[t]: g.ops[t].cost for t in g.ops.keys()}
@@ -74,18 +74,7 @@ def from_dfgraph(dfg : DFGraph, liveness_analysis=True) -> Graph:
   return g
 
 def dfgraph_topological(dfg : DFGraph) -> List[int]:
-  visited = {v : False for v in dfg.v}
-  stack = []
-  def visit(v):
-    visited[v] = True
-    for u in dfg.successors(v):
-      if not visited[u]:
-        visit(u)
-    stack.insert(0, v)
-  for v in dfg.v:
-    if not visited[v]:
-      visit(v)
-  return stack
+  return topological_order(dfg.v, dfg.successors)
 
 def analyze_liveness(ordering : List[int], dfg : DFGraph) -> Mapping[int, int]:
   """
@@ -1,7 +1,10 @@
+import copy, os
 import attr
 from attr import attrib, s
 from typing import Tuple, List, Optional, Callable, Mapping, Union, Set
-from collections import defaultdict
+from collections.abc import Mapping as MappingABC
+
+import numpy as np
 
 from ..tensor import Operator
 
@@ -14,6 +17,7 @@ class GOp:
   result  : Tuple['GTensor'] 
   name    : str
   meta    : dict
+  id      : int = -1  # dense index in its graph, set by `Graph.add_op`
 
   def __attrs_post_init__(self):
     assert len(self.size) == len(self.alias) == len(self.result)
@@ -61,6 +65,7 @@ class GTensor:
   name : str
   storage_size : int
   meta : dict = attrib(factory=dict)
+  id : int = -1  # dense index in its graph, set by `Graph.add_op`
 
   def size(self) -> int:
     return self.op.size[self.index]
@@ -97,7 +102,56 @@ class GRelease:
   def __str__(self):
     return 'Release({})'.format(self.tensor.name)
 
+def topological_order(vertices, children : Callable) -> list:
+  """
+  Returns `vertices` in reverse postorder of a depth-first search that visits
+  them in order, and the `children(v)` of each vertex `v` in order. Iterative,
+  so linear time and not limited by the recursion depth.
+  """
+  visited = set()
+  order = []
+  for root in vertices:
+    if root in visited:
+      continue
+    visited.add(root)
+    stack = [(root, iter(children(root)))]
+    while stack:
+      v, it = stack[-1]
+      for u in it:
+        if u not in visited:
+          visited.add(u)
+          stack.append((u, iter(children(u))))
+          break
+      else:
+        stack.pop()
+        order.append(v)
+  order.reverse()
+  return order
+
+class _NameSets(MappingABC):
+  """
+  A read-only view of per-op adjacency lists of op ids, as sets of op names
+  keyed by op name.
+  """
+  def __init__(self, g : 'Graph', adjacency : List[List[int]]):
+    self._g, self._adjacency = g, adjacency
+
+  def __getitem__(self, name : str) -> Set[str]:
+    op_list = self._g.op_list
+    return set([op_list[i].name for i in self._adjacency[self._g.ops[name].id]])
+
+  def __iter__(self):
+    return iter(self._g.ops)
+
+  def __len__(self) -> int:
+    return len(self._g.ops)
+
 class Graph:
+  """
+  Ops and tensors are numbered densely in order of creation (their `id`), and
+  the graph structure is kept in lists indexed by id; the names are only used
+  to look ops and tensors up (`ops`, `tensors`) and for reporting.
+  """
   def __init__(self):
     self._id : int = 0
     self.schedule : List[Union['GCompute', 'GGet', 'GRelease']] = []
@@ -105,12 +159,23 @@ class Graph:
     self.fwd_ops  : Mapping[str, 'GOp'] = {}
     self.bwd_ops  : Mapping[str, 'GOp'] = {}
     self.tensors  : Mapping[str, 'GTensor'] = {}
-    self.op_children : Mapping[str, Set[str]] = defaultdict(set)
-    self.op_parents  : Mapping[str, Set[str]] = defaultdict(set)
+    self.op_list     : List['GOp'] = []
+    self.tensor_list : List['GTensor'] = []
+    self.op_parent_ids : List[Tuple[int]] = []
+    self.op_child_ids  : List[List[int]] = []
+    self._topological : Optional[List[int]] = None
     self.meta = {
       'compute': 0
     }
 
+  @property
+  def op_children(self) -> Mapping[str, Set[str]]:
+    return _NameSets(self, self.op_child_ids)
+
+  @property
+  def op_parents(self) -> Mapping[str, Set[str]]:
+    return _NameSets(self, self.op_parent_ids)
+
   def _next_id(self) -> int:
     i = self._id
     self._id += 1
@@ -118,83 +183,234 @@ class Graph:
 
   def add_op(self, op : 'GOp') -> None:
     assert op.name not in self.ops
+    op.id = len(self.op_list)
     self.ops[op.name] = op
+    self.op_list.append(op)
+    self._topological = None
     if op.meta.get('bwd', False):
       self.bwd_ops[op.name] = op
     else:
       self.fwd_ops[op.name] = op
     for ti in op.args:
-      assert ti.name in self.tensors
-    op_parents = set([ti.op.name for ti in op.args])
-    for ps in op_parents:
-      self.op_children[ps].add(op.name)
-    self.op_parents[op.name] = op_parents
+      assert 0 <= ti.id < len(self.tensor_list) and self.tensor_list[ti.id] is ti
+    op_parents = tuple(dict.fromkeys([ti.op.id for ti in op.args]))
+    for p in op_parents:
+      self.op_child_ids[p].append(op.id)
+    self.op_parent_ids.append(op_parents)
+    self.op_child_ids.append([])
     for to in op.result:
       assert to.name not in self.tensors
+      to.id = len(self.tensor_list)
       self.tensors[to.name] = to
+      self.tensor_list.append(to)
     self.meta['compute'] += op.cost
 
-  # returns op names, not ops
+  def ops_topological_ids(self) -> List[int]:
+    """
+    Returns the op ids in topological order; computed once and cached until the
+    next `add_op`.
+    """
+    if self._topological is None:
+      self._topological = topological_order(
+        range(len(self.op_list)), self.op_child_ids.__getitem__
+      )
+    return list(self._topological)
+
   def ops_topological(self) -> List[str]:
-    visited = {v : False for v in self.ops}
-    stack   = []
-    def visit(v):
-      visited[v] = True
-      for u in self.op_children[v]:
-        if not visited[u]:
-          visit(u)
-      stack.insert(0, v)
-    for v in self.ops:
-      if not visited[v]:
-        visit(v)
-    return stack
+    """Returns the op names in topological order, see `ops_topological_ids`."""
+    if self._topological is None:
+      self.ops_topological_ids()
+    return [self.op_list[i].name for i in self._topological]
 
   def get_closure(self) -> Callable[['Runtime'], None]:
-    def f(rt):
-      tensor_map = {}
-      for cmd in self.schedule:
-        if isinstance(cmd, GCompute):
-          # TODO: add a rematerialize cmd? this assumes once-compute only
-          for x in cmd.op.args:
-            assert x.name in tensor_map
-          args = [tensor_map[x.name] for x in cmd.op.args]
-          rt_op = Operator(
-            cmd.op.cost,
-            cmd.op.size,
-            cmd.op.alias,
-            cmd.op.name
-          )
-          res = rt.compute(args, rt_op, names=tuple([o.name for o in cmd.op.result]))
-          for i, r in enumerate(res):
-            assert cmd.op.result[i].name not in tensor_map
-            tensor_map[cmd.op.result[i].name] = r
-        elif isinstance(cmd, GGet):
-          assert cmd.tensor.name in tensor_map
-          t = tensor_map[cmd.tensor.name]
-          if cmd.pin:
-            if not t.defined:
-              rt.rematerialize(t)
-            assert t.defined
-            rt.pin(t)
-          else:
-            rt.get(t)
-        elif isinstance(cmd, GRelease):
-          assert cmd.tensor.name in tensor_map
-          rt.release(tensor_map[cmd.tensor.name])
-    return f
+    """
+    Returns a callback that executes the schedule on a runtime. The schedule is
+    compiled once into a `Topology`, which the callback shares across runs.
+    """
+    return Topology(self).run
+
+class Topology:
+  """
+  The static part of a `Graph`'s schedule, compiled once so that many runtimes
+  (e.g. one per budget and heuristic) can execute it without going back to the
+  `Graph`. `Operator`s are created once and shared by every run, since runtimes
+  never mutate them.
+
+  The schedule is lowered to `program`, a NumPy structured array of
+  (opcode, op index, tensor index) instructions, where tensors are dense
+  integer slots in order of creation. For a compute, the tensor index is the
+  slot of its first result. `ops`, `op_args` and `op_names` hold, per op index,
+  the `Operator`, its argument slots and its result names. A `Topology` can be
+  saved to and loaded from a `.npz` file or a memory-mappable directory of
+  arrays (see `save` and `load`), and is much cheaper to send to worker
+  processes than the `Graph` it came from.
+
+  The `Tensor`s and `Storage`s themselves are still created by each runtime,
+  since their edges are revealed (and, for banishing, rewired) as the schedule
+  executes and the heuristics depend on that.
+  """
+  COMPUTE, GET, PIN, RELEASE = range(4)
+  INSTRUCTION = np.dtype([('opcode', np.uint8), ('op', np.int32), ('tensor', np.int32)])
+  ARRAYS = [
+    'program', 'tensor_count', 'output_ram', 'op_cost', 'op_name', 'out_offset',
+    'out_size', 'out_alias', 'out_name', 'arg_offset', 'arg'
+  ]
+
+  def __init__(self, g : 'Graph' = None):
+    self.ops : Tuple[Operator] = ()
+    self.op_args : Tuple[Tuple[int]] = ()
+    self.op_names : Tuple[Tuple[str]] = ()
+    self.program = np.zeros(0, dtype=Topology.INSTRUCTION)
+    self.tensor_count = 0
+    self.output_ram = g.meta.get('output_ram', 0) if g is not None else 0
+    self._instructions = None
+    if g is not None:
+      self._compile(g)
+
+  def _compile(self, g : 'Graph'):
+    # slot of each tensor by id, or -1 if not yet computed
+    slots : List[int] = [-1] * len(g.tensor_list)
+    tensor_count = 0
+    ops, op_args, op_names, program = [], [], [], []
+    for cmd in g.schedule:
+      if isinstance(cmd, GCompute):
+        # TODO: add a rematerialize cmd? this assumes once-compute only
+        args = tuple([slots[x.id] for x in cmd.op.args])
+        assert all([a >= 0 for a in args])
+        program.append((Topology.COMPUTE, len(ops), tensor_count))
+        ops.append(Operator(
+          cmd.op.cost,
+          cmd.op.size,
+          cmd.op.alias,
+          cmd.op.name
+        ))
+        op_args.append(args)
+        op_names.append(tuple([o.name for o in cmd.op.result]))
+        for o in cmd.op.result:
+          assert slots[o.id] < 0
+          slots[o.id] = tensor_count
+          tensor_count += 1
+      elif isinstance(cmd, GGet):
+        assert slots[cmd.tensor.id] >= 0
+        opcode = Topology.PIN if cmd.pin else Topology.GET
+        program.append((opcode, -1, slots[cmd.tensor.id]))
+      elif isinstance(cmd, GRelease):
+        assert slots[cmd.tensor.id] >= 0
+        program.append((Topology.RELEASE, -1, slots[cmd.tensor.id]))
+    self.ops, self.op_args, self.op_names = tuple(ops), tuple(op_args), tuple(op_names)
+    self.program = np.array(program, dtype=Topology.INSTRUCTION)
+    self.tensor_count = tensor_count
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_instructions'] = None
+    return state
+
+  def run(self, rt : 'RuntimeBase') -> None:
+    """Executes the schedule on `rt`."""
+    if self._instructions is None:
+      # plain tuples are much faster to iterate over than the NumPy array
+      self._instructions = self.program.tolist()
+    ops, op_args, op_names = self.ops, self.op_args, self.op_names
+    tensors = []
+    for opcode, op, tensor in self._instructions:
+      if opcode == Topology.COMPUTE:
+        args = [tensors[i] for i in op_args[op]]
+        tensors.extend(rt.compute(args, ops[op], names=op_names[op]))
+      elif opcode == Topology.GET:
+        rt.get(tensors[tensor])
+      elif opcode == Topology.PIN:
+        t = tensors[tensor]
+        if not t.defined:
+          rt.rematerialize(t)
+        assert t.defined
+        rt.pin(t)
+      else:
+        rt.release(tensors[tensor])
+
+  def without_releases(self) -> 'Topology':
+    """Returns a copy of this `Topology` that never releases a Tensor."""
+    topology = copy.copy(self)
+    topology.program = self.program[self.program['opcode'] != Topology.RELEASE]
+    topology._instructions = None
+    return topology
+
+  def save(self, path : str) -> None:
+    """
+    Saves this `Topology` to the `.npz` file at `path`, or if `path` does not
+    end in `.npz`, to a directory of `.npy` files that `load` memory-maps.
+    """
+    costs = [op.compute for op in self.ops]
+    integral = all(isinstance(c, int) for c in costs)
+    arrays = dict(
+      program=self.program,
+      tensor_count=np.int64(self.tensor_count),
+      output_ram=np.array(self.output_ram),
+      op_cost=np.array(costs, dtype=np.int64 if integral else np.float64),
+      op_name=np.array([op.name for op in self.ops], dtype=str),
+      out_offset=np.cumsum([0] + [op.outputs for op in self.ops]),
+      out_size=np.array([x for op in self.ops for x in op.sizes], dtype=np.int64),
+      out_alias=np.array([x for op in self.ops for x in op.aliases], dtype=np.int64),
+      out_name=np.array([x for names in self.op_names for x in names], dtype=str),
+      arg_offset=np.cumsum([0] + [len(args) for args in self.op_args]),
+      arg=np.array([x for args in self.op_args for x in args], dtype=np.int64)
+    )
+    if path.endswith('.npz'):
+      np.savez(path, **arrays)
+    else:
+      os.makedirs(path, exist_ok=True)
+      for name, array in arrays.items():
+        np.save(os.path.join(path, name + '.npy'), array)
+
+  @staticmethod
+  def load(path : str) -> 'Topology':
+    """
+    Loads a `Topology` saved by `save` at `path`. From a directory, `program`
+    stays a read-only memory map, so processes loading the same `Topology`
+    share its pages.
+    """
+    if path.endswith('.npz'):
+      with np.load(path) as f:
+        return Topology._from_arrays(f)
+    return Topology._from_arrays({
+      name : np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+      for name in Topology.ARRAYS
+    })
+
+  @staticmethod
+  def _from_arrays(f) -> 'Topology':
+    topology = Topology()
+    topology.program = f['program']
+    topology.tensor_count = int(f['tensor_count'])
+    topology.output_ram = f['output_ram'].item() if 'output_ram' in f else 0
+    out_offset, arg_offset = f['out_offset'].tolist(), f['arg_offset'].tolist()
+    out_size, out_alias = f['out_size'].tolist(), f['out_alias'].tolist()
+    out_name, arg = f['out_name'].tolist(), f['arg'].tolist()
+    ops, op_args, op_names = [], [], []
+    for i, (cost, name) in enumerate(zip(f['op_cost'].tolist(), f['op_name'].tolist())):
+      lo, hi = out_offset[i], out_offset[i + 1]
+      ops.append(Operator(cost, tuple(out_size[lo:hi]), tuple(out_alias[lo:hi]), name))
+      op_names.append(tuple(out_name[lo:hi]))
+      op_args.append(tuple(arg[arg_offset[i]:arg_offset[i + 1]]))
+    topology.ops, topology.op_args, topology.op_names = \
+      tuple(ops), tuple(op_args), tuple(op_names)
+    return topology
+
+def _name_map(old : list, new : list) -> Mapping[str, str]:
+  """Returns the map of names from the id-indexed map `new` of `old`."""
+  return {o.name: n.name for o, n in zip(old, new) if n is not None}
 
 def rewrite_collapse_aliases(g : 'Graph') -> 'Graph':
   g_r = Graph()
   g_r.meta = g.meta.copy()
   g_r.meta['compute'] = 0
 
-  ops_topological = g.ops_topological()
-  # maps old -> new
-  tensor_map : Mapping[str, 'GTensor'] = {}
-  op_map : Mapping[str, 'GOp'] = {}
+  # maps old -> new, by id
+  tensor_map : List[Optional['GTensor']] = [None] * len(g.tensor_list)
+  op_map : List[Optional['GOp']] = [None] * len(g.op_list)
 
-  for op_name in ops_topological:
-    op = g.ops[op_name]
+  for op_id in g.ops_topological_ids():
+    op = g.op_list[op_id]
     if op.is_aliasing():
       if not op.all_aliasing():
         raise RuntimeError(
@@ -202,36 +418,36 @@ def rewrite_collapse_aliases(g : 'Graph') -> 'Graph':
           .format(op)
         )
       for r in op.result:
-        tensor_map[r.name] = tensor_map[r.alias().name]
+        tensor_map[r.id] = tensor_map[r.alias().id]
     else:
       # keep operator
-      args = [tensor_map[x.name] for x in op.args]
+      args = [tensor_map[x.id] for x in op.args]
       op_new, res = GOp.make(
         g_r, args, op.cost, op.size, op.alias,
         op.name, tuple([o.name for o in op.result]), op.meta,
         make_uname=False
       )
-      for r in res:
-        tensor_map[r.name] = r
-      op_map[op.name] = op_new
+      for r, r_new in zip(op.result, res):
+        tensor_map[r.id] = r_new
+      op_map[op.id] = op_new
 
   # rewrite schedule
   for cmd in g.schedule:
     if isinstance(cmd, GCompute):
-      if cmd.op.name in op_map:
-        g_r.schedule.append(GCompute(op_map[cmd.op.name]))
+      if op_map[cmd.op.id] is not None:
+        g_r.schedule.append(GCompute(op_map[cmd.op.id]))
       else:
         # aliasing op; increase refcount
         for r in cmd.op.result:
-          g_r.schedule.append(GGet(tensor_map[r.name], pin=False))
+          g_r.schedule.append(GGet(tensor_map[r.id], pin=False))
     elif isinstance(cmd, GGet):
-      g_r.schedule.append(GGet(tensor_map[cmd.tensor.name], pin=cmd.pin))
+      g_r.schedule.append(GGet(tensor_map[cmd.tensor.id], pin=cmd.pin))
     elif isinstance(cmd, GRelease):
-      g_r.schedule.append(GRelease(tensor_map[cmd.tensor.name]))
+      g_r.schedule.append(GRelease(tensor_map[cmd.tensor.id]))
 
   g_r.meta['no_aliases'] = True
-  g_r.meta['tensor_map'] = {old: new.name for old, new in tensor_map.items()}
-  g_r.meta['op_map'] = {old: new.name for old, new in op_map.items()}
+  g_r.meta['tensor_map'] = _name_map(g.tensor_list, tensor_map)
+  g_r.meta['op_map'] = _name_map(g.op_list, op_map)
 
   return g_r
 
@@ -240,50 +456,49 @@ def rewrite_merge_tuples(g : 'Graph') -> 'Graph':
   g_r.meta = g.meta.copy()
   g_r.meta['compute'] = 0
 
-  ops_topological = g.ops_topological()
-  # maps old -> new
-  tensor_map : Mapping[str, 'GTensor'] = {}
-  op_map : Mapping[str, 'GOp'] = {}
+  # maps old -> new, by id
+  tensor_map : List[Optional['GTensor']] = [None] * len(g.tensor_list)
+  op_map : List[Optional['GOp']] = [None] * len(g.op_list)
 
-  for op_name in ops_topological:
-    op = g.ops[op_name]
+  for op_id in g.ops_topological_ids():
+    op = g.op_list[op_id]
     assert not op.is_aliasing()
     if op.is_tuple():
-      args = tuple([tensor_map[x.name] for x in op.args])
+      args = tuple([tensor_map[x.id] for x in op.args])
       op_new, res = GOp.make(
         g_r, args, op.cost, (sum(op.size),), (-1,),
         op.name, ('+'.join([o.name for o in op.result]),), op.meta,
         make_uname=False
       )
       for r in op.result:
-        tensor_map[r.name] = res[0]
-      op_map[op.name] = op_new
+        tensor_map[r.id] = res[0]
+      op_map[op.id] = op_new
     else:
       # keep
-      args = [tensor_map[x.name] for x in op.args]
+      args = [tensor_map[x.id] for x in op.args]
       op_new, res = GOp.make(
         g_r, args, op.cost, op.size, op.alias,
         op.name, (op.result[0].name,), op.meta,
         make_uname=False
       )
-      tensor_map[res[0].name] = res[0]
-      op_map[op.name] = op_new
+      tensor_map[op.result[0].id] = res[0]
+      op_map[op.id] = op_new
 
   for cmd in g.schedule:
     if isinstance(cmd, GCompute):
-      op_new = op_map[cmd.op.name]
+      op_new = op_map[cmd.op.id]
       g_r.schedule.append(GCompute(op_new))
       # need to get more refs for each missing tuple output
       for _ in range(len(cmd.op.result) - 1):
         g_r.schedule.append(GGet(op_new.result[0], pin=False))
     elif isinstance(cmd, GGet):
-      g_r.schedule.append(GGet(tensor_map[cmd.tensor.name], pin=cmd.pin))
+      g_r.schedule.append(GGet(tensor_map[cmd.tensor.id], pin=cmd.pin))
     elif isinstance(cmd, GRelease):
-      g_r.schedule.append(GRelease(tensor_map[cmd.tensor.name]))
+      g_r.schedule.append(GRelease(tensor_map[cmd.tensor.id]))
 
   g_r.meta['no_tuples'] = True
-  g_r.meta['tensor_map'] = {old: new.name for old, new in tensor_map.items()}
-  g_r.meta['op_map'] = {old: new.name for old, new in op_map.items()}
+  g_r.meta['tensor_map'] = _name_map(g.tensor_list, tensor_map)
+  g_r.meta['op_map'] = _name_map(g.op_list, op_map)
 
   return g_r
 
@@ -297,51 +512,118 @@ def rewrite_constant_elim(g : 'Graph') -> 'Graph':
   g_r.meta['compute'] = 0
   g_r.meta['constant_ram'] = 0
 
-  ops_topological = g.ops_topological()
-  # maps old -> new
-  tensor_map : Mapping[str, 'GTensor'] = {}
-  op_map : Mapping[str, 'GOp'] = {}
+  # maps old -> new, by id
+  tensor_map : List[Optional['GTensor']] = [None] * len(g.tensor_list)
+  op_map : List[Optional['GOp']] = [None] * len(g.op_list)
 
-  for op_name in ops_topological:
-    op = g.ops[op_name]
-    if op_name.split('/')[0] == GOp.CONST_NAME:
-      args = [tensor_map[x.name] for x in op.args]
+  for op_id in g.ops_topological_ids():
+    op = g.op_list[op_id]
+    if op.name.split('/')[0] == GOp.CONST_NAME:
+      args = [tensor_map[x.id] for x in op.args]
       assert len(args) == 0
       g_r.meta['constant_ram'] += sum(op.size)
     else:
       # keep operator
-      args = [tensor_map[x.name] for x in op.args if x.name in tensor_map]
+      args = [tensor_map[x.id] for x in op.args if tensor_map[x.id] is not None]
       op_new, res = GOp.make(
         g_r, args, op.cost, op.size, op.alias,
         op.name, tuple([o.name for o in op.result]), op.meta,
         make_uname=False
       )
-      for r in res:
-        tensor_map[r.name] = r
-      op_map[op.name] = op_new
+      for r, r_new in zip(op.result, res):
+        tensor_map[r.id] = r_new
+      op_map[op.id] = op_new
 
   for cmd in g.schedule:
     if isinstance(cmd, GCompute):
-      if cmd.op.name in op_map:
-        op_new = op_map[cmd.op.name]
+      if op_map[cmd.op.id] is not None:
+        op_new = op_map[cmd.op.id]
         g_r.schedule.append(GCompute(op_new))
     elif isinstance(cmd, GGet):
-      if cmd.tensor.name in tensor_map:
-        g_r.schedule.append(GGet(tensor_map[cmd.tensor.name], pin=cmd.pin))
+      if tensor_map[cmd.tensor.id] is not None:
+        g_r.schedule.append(GGet(tensor_map[cmd.tensor.id], pin=cmd.pin))
     elif isinstance(cmd, GRelease):
-      if cmd.tensor.name in tensor_map:
-        g_r.schedule.append(GRelease(tensor_map[cmd.tensor.name]))
+      if tensor_map[cmd.tensor.id] is not None:
+        g_r.schedule.append(GRelease(tensor_map[cmd.tensor.id]))
 
   g_r.meta['no_constants'] = True
-  g_r.meta['tensor_map'] = {old: new.name for old, new in tensor_map.items()}
-  g_r.meta['op_map'] = {old: new.name for old, new in op_map.items()}
+  g_r.meta['tensor_map'] = _name_map(g.tensor_list, tensor_map)
+  g_r.meta['op_map'] = _name_map(g.op_list, op_map)
 
   assert compute_pre == g_r.meta['compute']
 
   return g_r
 
 def rewrite_checkmate(g : 'Graph') -> 'Graph':
-  g_r = rewrite_collapse_aliases(g)
-  g_r = rewrite_merge_tuples(g_r)
-  g_r = rewrite_constant_elim(g_r)
+  """
+  Same as `rewrite_collapse_aliases`, `rewrite_merge_tuples` and then
+  `rewrite_constant_elim`, fused into a single pass; `tensor_map` and `op_map`
+  in the result's meta map from the names in `g` (eliminated constants have no
+  entry).
+  """
+  g_r = Graph()
+  g_r.meta = g.meta.copy()
+  g_r.meta['compute'] = 0
+  g_r.meta['constant_ram'] = 0
+
+  # maps old -> new by id, or None for (aliases of) eliminated constants
+  tensor_map : List[Optional['GTensor']] = [None] * len(g.tensor_list)
+  op_map : List[Optional['GOp']] = [None] * len(g.op_list)
+
+  for op_id in g.ops_topological_ids():
+    op = g.op_list[op_id]
+    if op.is_aliasing():
+      if not op.all_aliasing():
+        raise RuntimeError(
+          'cannot collapse aliases, {} is not all aliasing'
+          .format(op)
+        )
+      for r in op.result:
+        tensor_map[r.id] = tensor_map[r.alias().id]
+    elif op.name.split('/')[0] == GOp.CONST_NAME:
+      assert len(op.args) == 0 and op.cost == 0
+      g_r.meta['constant_ram'] += sum(op.size)
+      for r in op.result:
+        tensor_map[r.id] = None
+    else:
+      args = [tensor_map[x.id] for x in op.args]
+      args = tuple([x for x in args if x is not None])
+      if op.is_tuple():
+        size, names = (sum(op.size),), ('+'.join([o.name for o in op.result]),)
+      else:
+        size, names = op.size, (op.result[0].name,)
+      op_new, res = GOp.make(
+        g_r, args, op.cost, size, (-1,), op.name, names, op.meta,
+        make_uname=False
+      )
+      for r in op.result:
+        tensor_map[r.id] = res[0]
+      op_map[op.id] = op_new
+
+  for cmd in g.schedule:
+    if isinstance(cmd, GCompute):
+      if op_map[cmd.op.id] is not None:
+        op_new = op_map[cmd.op.id]
+        g_r.schedule.append(GCompute(op_new))
+        # need to get more refs for each missing tuple output
+        for _ in range(len(cmd.op.result) - 1):
+          g_r.schedule.append(GGet(op_new.result[0], pin=False))
+      elif cmd.op.is_aliasing():
+        # aliasing op; increase refcount
+        for r in cmd.op.result:
+          if tensor_map[r.id] is not None:
+            g_r.schedule.append(GGet(tensor_map[r.id], pin=False))
+    elif isinstance(cmd, GGet):
+      if tensor_map[cmd.tensor.id] is not None:
+        g_r.schedule.append(GGet(tensor_map[cmd.tensor.id], pin=cmd.pin))
+    elif isinstance(cmd, GRelease):
+      if tensor_map[cmd.tensor.id] is not None:
+        g_r.schedule.append(GRelease(tensor_map[cmd.tensor.id]))
+
+  g_r.meta['no_aliases'] = True
+  g_r.meta['no_tuples'] = True
+  g_r.meta['no_constants'] = True
+  g_r.meta['tensor_map'] = _name_map(g.tensor_list, tensor_map)
+  g_r.meta['op_map'] = _name_map(g.op_list, op_map)
+
   return g_r
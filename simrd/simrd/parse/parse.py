@@ -1,6 +1,13 @@
-from attr import attrs, attrib, Factory
+from attr import attrs, attrib, astuple, Factory
 from enum import Enum, auto
-import json
+from itertools import islice
+import multiprocessing
+
+try:
+    # much faster than the stdlib decoder, when available
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 from ..tensor import Operator
 from .graph import *
@@ -68,7 +75,7 @@ class OutputCondition(Enum):
 
 def parse(line):
     try:
-        j = json.loads(line)
+        j = json_loads(line)
     except Exception as e:
         return ParseError(line + str(e))
     instr = j["INSTRUCTION"]
@@ -93,27 +100,82 @@ def parse(line):
     else:
         return Unknown(line)
 
-def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_undefined_release=True) -> Graph:
-    lines = [parse(line.rstrip()) for line in f]
-    errors = [x for x in lines if isinstance(x, (ParseError, Unknown))]
-    if len(errors) != 0:
-        print(errors)
-        raise
-    lines.reverse()
+def parse_chunk(lines):
+    """
+    Parses a chunk of log lines, stopping at the first line that cannot be
+    parsed (which is then the last one returned).
+    """
+    result = []
+    for line in lines:
+        l = parse(line.rstrip())
+        result.append(l)
+        if isinstance(l, (ParseError, Unknown)):
+            break
+    return result
+
+# parsed lines are sent from pool workers as (index into LINE_TYPES, *fields),
+# which is much cheaper to unpickle than the instances themselves
+LINE_TYPES = (Call, Mutate, Constant, Release, Memory, Copy, CopyFrom, Annotate,
+              Alias, Unknown, ParseError)
+_LINE_TYPE_INDEX = {t: i for i, t in enumerate(LINE_TYPES)}
+
+def _parse_chunk_packed(lines):
+    return [(_LINE_TYPE_INDEX[type(l)],) + astuple(l, recurse=False)
+            for l in parse_chunk(lines)]
+
+def parse_lines(f, workers=1, chunk_lines=1 << 14):
+    """
+    Lazily parses the lines of the log `f`, raising on the first line that
+    cannot be parsed. With `workers > 1`, chunks of `chunk_lines` lines are
+    decoded in a process pool (while the caller consumes earlier chunks) and
+    yielded in order.
+    """
+    if workers > 1:
+        chunks = iter(lambda: list(islice(f, chunk_lines)), [])
+        with multiprocessing.Pool(workers) as pool:
+            chunks = pool.imap(_parse_chunk_packed, chunks)
+            yield from _check_lines(LINE_TYPES[l[0]](*l[1:]) for c in chunks for l in c)
+    else:
+        yield from _check_lines(parse(line.rstrip()) for line in f)
+
+def _check_lines(lines):
+    for l in lines:
+        if isinstance(l, (ParseError, Unknown)):
+            raise RuntimeError('could not parse log line: {}'.format(l))
+        yield l
+
+def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_undefined_release=True,
+               workers=1) -> Graph:
+    """
+    Builds the `Graph` of the log `f` while reading it, so only the graph (and
+    not the text or the parsed lines) is ever held in memory. See `parse_lines`
+    for `workers`.
+    """
+    g = Graph()
+    lines = parse_lines(f, workers=workers)
+    g.schedule.extend(translate_lines(lines, g, start, out_cond, ignore_undefined_release))
+    return g
+
+def translate_lines(lines, g, start=True, out_cond=OutputCondition.REMATERIALIZE,
+                    ignore_undefined_release=True):
+    """
+    Translates the parsed log `lines` into the schedule of `g`, yielding each
+    `GCompute`, `GGet` or `GRelease` as soon as it is known (the ops are added
+    to `g` as they are made).
+    """
+    lines = iter(lines)
     if start:
-        while True:
-            x = lines.pop()
+        for x in lines:
             if isinstance(x, Annotate) and x.annotation == Annotate.START:
                 break
 
     tensor_map = {}
+    refs = []  # reference counts, by tensor id
     in_bwd = False
-    g = Graph()
     g.meta['outputs'] = set()
-    pop = lambda: lines.pop()
+    pop = lambda: next(lines)
 
-    while len(lines) > 0:
-        l = pop()
+    for l in lines:
         if isinstance(l, Constant):
             m = pop()
             assert isinstance(m, Memory)
@@ -122,19 +184,19 @@ def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_und
                 g, tuple(), 0, (int(m.memory),), (-1,),
                 GOp.CONST_NAME, (m.name,), {'bwd': in_bwd}
             )
-            g.schedule.append(GCompute(op))
-            g.schedule.append(GGet(v, pin=True))
+            yield GCompute(op)
+            yield GGet(v, pin=True)
             tensor_map[m.name] = v
-            tensor_map[m.name].meta['_ref'] = 1
+            refs.append(1)
         elif isinstance(l, Copy):
             assert l.dst not in tensor_map
             tensor_map[l.dst] = tensor_map[l.src]
-            tensor_map[l.dst].meta['_ref'] += 1
-            g.schedule.append(GGet(tensor_map[l.src], pin=False))
+            refs[tensor_map[l.dst].id] += 1
+            yield GGet(tensor_map[l.src], pin=False)
         elif isinstance(l, Release):
             if l.name in tensor_map:
-                tensor_map[l.name].meta['_ref'] -= 1
-                g.schedule.append(GRelease(tensor_map[l.name]))
+                refs[tensor_map[l.name].id] -= 1
+                yield GRelease(tensor_map[l.name])
             elif not ignore_undefined_release:
                 raise RuntimeError('tried to release an undefined tensor')
         elif isinstance(l, Call):
@@ -159,9 +221,9 @@ def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_und
             )
             for i in range(cnt):
                 assert l.result[i] not in tensor_map
-                res[i].meta['_ref'] = 1
                 tensor_map[l.result[i]] = res[i]
-            g.schedule.append(GCompute(op))
+            refs.extend([1] * cnt)
+            yield GCompute(op)
         elif isinstance(l, Mutate):
             in_bwd |= 'backward' in l.name
             args = tuple([tensor_map[x] for x in l.args])
@@ -169,35 +231,33 @@ def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_und
             alias = tuple([-1 for _ in l.mutate])
             mut_names = tuple([args[m].name + '$' for m in l.mutate])
             op, res = GOp.make(g, args, int(l.time), memory, alias, l.name, mut_names, {'bwd': in_bwd})
-            g.schedule.append(GCompute(op))
+            yield GCompute(op)
+            refs.extend([1] * len(res))
             for i, m in enumerate(l.mutate):
                 old_tensor = tensor_map[l.args[m]]
                 tensor_map[l.args[m]] = res[i]
-                res[i].meta['_ref'] = 1
-                old_tensor.meta['_ref'] -= 1
-                g.schedule.append(GRelease(old_tensor))
+                refs[old_tensor.id] -= 1
+                yield GRelease(old_tensor)
         elif isinstance(l, Annotate):
             if l.annotation == Annotate.BACKWARD:
                 in_bwd = True
         elif isinstance(l, CopyFrom):
             old_tensor = tensor_map[l.dst]
             tensor_map[l.dst] = tensor_map[l.src]
-            old_tensor.meta['_ref'] -= 1
-            tensor_map[l.src].meta['_ref'] += 1
-            g.schedule.append(GRelease(old_tensor))
-            g.schedule.append(GGet(tensor_map[l.src], pin=False))
+            refs[old_tensor.id] -= 1
+            refs[tensor_map[l.src].id] += 1
+            yield GRelease(old_tensor)
+            yield GGet(tensor_map[l.src], pin=False)
         else:
-            print(l)
-            print(len(lines))
-            raise
+            raise RuntimeError('unexpected log instruction: {}'.format(l))
 
     outputs = set()
     for name in tensor_map:
         t = tensor_map[name]
-        if t.meta['_ref'] > 0:
+        if refs[t.id] > 0:
             storage_name = t.alias().name if t.alias() else t.name
             if out_cond == OutputCondition.REMATERIALIZE:
-                g.schedule.append(GGet(t, pin=True))
+                yield GGet(t, pin=True)
             elif out_cond == OutputCondition.PREALLOCATE:
                 if storage_name not in outputs:
                     g.meta['output_ram'] = g.meta.get('output_ram', 0) + t.storage_size
@@ -205,5 +265,3 @@ def parse_file(f, start=True, out_cond=OutputCondition.REMATERIALIZE, ignore_und
                 raise RuntimeError('Unsupported output condition: {}'.format(out_cond))
             outputs.add(storage_name)
         g.meta['outputs'] = outputs
-
-    return g
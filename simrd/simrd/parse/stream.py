@@ -0,0 +1,109 @@
+import queue, threading
+from itertools import islice
+
+from ..tensor import Operator
+from .graph import GCompute, GGet, GRelease, Graph
+from .parse import parse_lines, translate_lines, OutputCondition
+
+class _StreamGraph:
+  """
+  Stands in for the `Graph` of a log whose ops are executed as soon as they are
+  made, so that none of them are kept (only their ids are assigned).
+  """
+  _next_id = Graph._next_id
+
+  def __init__(self):
+    self._id = 0
+    self.op_count = 0
+    self.tensor_count = 0
+    self.meta = {'compute': 0}
+
+  def add_op(self, op):
+    op.id = self.op_count
+    self.op_count += 1
+    for o in op.result:
+      o.id = self.tensor_count
+      self.tensor_count += 1
+    self.meta['compute'] += op.cost
+
+def _read_ahead(lines, queue_size : int, batch_size : int):
+  """
+  Iterates over `lines` in a reader thread, at most `queue_size` batches of
+  `batch_size` lines ahead of the caller.
+  """
+  q = queue.Queue(queue_size)
+  done = threading.Event()
+
+  def put(item):
+    while not done.is_set():
+      try:
+        q.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+  def read():
+    try:
+      it = iter(lines)
+      while not done.is_set():
+        batch = list(islice(it, batch_size))
+        put(batch)
+        if not batch:
+          break
+    except Exception as e:
+      put(e)
+    finally:
+      if hasattr(lines, 'close'):
+        lines.close()
+
+  thread = threading.Thread(target=read, daemon=True)
+  thread.start()
+  try:
+    while True:
+      batch = q.get()
+      if isinstance(batch, Exception):
+        raise batch
+      if not batch:
+        return
+      yield from batch
+  finally:
+    # stop the reader if the caller gave up early (e.g. on OOM)
+    done.set()
+
+def stream_file(f, rt : 'RuntimeBase', start=True, out_cond=OutputCondition.REMATERIALIZE,
+                ignore_undefined_release=True, workers=1, queue_size=64,
+                batch_size=1024) -> dict:
+  """
+  Executes the log `f` on `rt` while it is being read, without building its
+  `Graph`; the result is the same as that of `parse_file(f, ...).get_closure()`.
+  The log is parsed in a reader thread (see `parse_lines` for `workers`), at
+  most `queue_size` batches of `batch_size` lines ahead of the runtime.
+  Returns the meta of the `Graph` that `parse_file` would have built.
+  """
+  g = _StreamGraph()
+  tensors = []  # runtime Tensors, by id
+  lines = _read_ahead(parse_lines(f, workers=workers), queue_size, batch_size)
+  try:
+    for cmd in translate_lines(lines, g, start, out_cond, ignore_undefined_release):
+      if isinstance(cmd, GCompute):
+        op = cmd.op
+        args = [tensors[x.id] for x in op.args]
+        res = rt.compute(
+          args, Operator(op.cost, op.size, op.alias, op.name),
+          names=tuple([o.name for o in op.result])
+        )
+        tensors.extend(res)
+      elif isinstance(cmd, GGet):
+        t = tensors[cmd.tensor.id]
+        if cmd.pin:
+          if not t.defined:
+            rt.rematerialize(t)
+          assert t.defined
+          rt.pin(t)
+        else:
+          rt.get(t)
+      else:
+        rt.release(tensors[cmd.tensor.id])
+  finally:
+    lines.close()
+  return g.meta
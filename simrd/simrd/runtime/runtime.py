@@ -60,15 +60,42 @@ class RuntimeBase:
   def pin(self, t : Tensor):
     raise NotImplementedError
 
+def _skip(*args, **kwargs):
+  pass
+
 class TelemetrizedRuntimeBase(RuntimeBase):
+  """
+  With `summary_only`, the runtime only keeps the summary statistics (see
+  `Telemetry.SUMMARY_STATS`), which is all that e.g. pareto results need: the
+  hooks that only record stats or the trace are bound to no-ops at construction,
+  and the rest to summary-only versions, so nothing is checked per call.
+  """
   FEATURES = RuntimeBase.FEATURES.union(['telemetry'])
-  KWARGS   = {**RuntimeBase.KWARGS, 'stats': False, 'trace': False}
+  KWARGS   = {
+    **RuntimeBase.KWARGS,
+    'stats': False, 'trace': False, 'trace_spill': None, 'summary_only': False
+  }
+
+  # hooks that do nothing without stats or a trace
+  STATS_HOOKS = [
+    '_T_birth', '_T_death', '_T_use', '_T_pending', '_T_pressure', '_T_evict',
+    '_T_banish', '_T_pin', '_T_lock', '_T_unlock'
+  ]
 
   def __init__(self, budget, heuristic, **kwargs):
     super().__init__(budget, heuristic, **kwargs)
     self.stats = kwargs.get('stats', False)
     self.trace = kwargs.get('trace', False)
-    self.telemetry = Telemetry(has_stats=self.stats, has_trace=self.trace)
+    self.summary_only = kwargs.get('summary_only', False)
+    self.telemetry = Telemetry(has_stats=self.stats, has_trace=self.trace,
+                               trace_spill=kwargs.get('trace_spill', None))
+
+    if self.summary_only:
+      if self.stats or self.trace:
+        raise RuntimeError('summary_only runtimes cannot keep stats or a trace')
+      for hook in TelemetrizedRuntimeBase.STATS_HOOKS:
+        setattr(self, hook, _skip)
+      self._T_compute = self._T_compute_summary
 
   def _prepickle(self):
     super()._prepickle()
@@ -86,7 +113,7 @@ class TelemetrizedRuntimeBase(RuntimeBase):
     if not self.stats: return
 
     self.telemetry.set('tensor', t.id, 'birth_time', self.clock)
-    if not t.meta['is_alias']:
+    if not t.is_alias:
       self.telemetry.set('storage', t.id, 'birth_time', self.clock)
 
   def _T_death(self, t : Tensor):
@@ -95,7 +122,7 @@ class TelemetrizedRuntimeBase(RuntimeBase):
     """
     if not self.stats: return
 
-    assert t.meta['ref_ext'] == 0
+    assert t.ref_ext == 0
     self.telemetry.set('tensor', t.id, 'death_time', self.clock)
     if t.storage.ref_ext == 0:
       self.telemetry.set('storage', t.storage.root_id, 'death_time', self.clock)
@@ -115,7 +142,7 @@ class TelemetrizedRuntimeBase(RuntimeBase):
       rid = t.id if field == 'tensor' else t.storage.root_id
       self.telemetry.set(field, rid, 'last_{}_use_time'.format(key), self.clock)
       self.telemetry.inc(field, rid, '{}_use_count'.format(key))
-    if t.storage.meta.get('pinned', False):
+    if t.storage.pinned:
       for field in ['tensor', 'storage']:
         rid = t.id if field == 'tensor' else t.storage.root_id
         self.telemetry.inc(field, rid, '{}_use_count_pinned'.format(key))
@@ -136,7 +163,7 @@ class TelemetrizedRuntimeBase(RuntimeBase):
     space for `t` (to ensure this gets logged in the case of an OOM error).
     """
     if self.trace:
-      self.telemetry.trace.pressure[self.clock] = t.op.total_size
+      self.telemetry.trace.record('pressure', self.clock, t.id, t.op.total_size)
 
   def _T_compute(self, t : Tensor, rematerialize : bool, direct : bool):
     """
@@ -152,13 +179,20 @@ class TelemetrizedRuntimeBase(RuntimeBase):
     if rematerialize and self.stats:
       key = 'direct' if direct else 'collateral'
       self.telemetry.inc('tensor', t.id, '{}_remat_count'.format(key))
-      if not t.meta['is_alias']:
+      if not t.is_alias:
         self.telemetry.inc('storage', t.storage.root_id, '{}_remat_count'.format(key))
       self.telemetry.inc('operator', t.op_id, 'recompute_count')
 
     if self.trace:
       self.telemetry.trace.record('compute', self.clock, t.id)
 
+  def _T_compute_summary(self, t : Tensor, rematerialize : bool, direct : bool):
+    if direct:
+      if rematerialize:
+        self.telemetry.summary['remat_compute'] += t.op.compute
+      else:
+        self.telemetry.summary['model_compute'] += t.op.compute
+
   def _T_bottleneck(self, t : Tensor):
     if t.op.name != 'constant':
       req_memory = t.op.total_size
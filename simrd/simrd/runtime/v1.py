@@ -1,20 +1,31 @@
 import math
 
 from .runtime import *
+from ..optimization import make_eviction_pool
 
 @register_runtime
 class RuntimeV1(TelemetrizedRuntimeBase):
   FEATURES = TelemetrizedRuntimeBase.FEATURES.union([
     'banishing', 'last_access', 'last_access_int'
   ])
-  KWARGS = {**TelemetrizedRuntimeBase.KWARGS, 'remat_limit': math.inf}
+  KWARGS = {
+    **TelemetrizedRuntimeBase.KWARGS,
+    'remat_limit': math.inf,
+    'priority_pool': True,
+    'staleness_approx': 0.0
+  }
+  INVALIDATION_EVENTS = set(['last_access'])
   ID = 'V1'
 
   def __init__(self, budget, heuristic, **kwargs):
     super().__init__(budget, heuristic, **kwargs)
     self.remat_limit = kwargs.get('remat_limit', math.inf)
     self.remat_exceeded = False
-    self.storage_pool = []
+    self.storage_pool = make_eviction_pool(
+      heuristic, self, self.INVALIDATION_EVENTS,
+      indexed=kwargs.get('priority_pool', True),
+      approx=kwargs.get('staleness_approx', 0.0)
+    )
 
   def _prepickle(self):
     super()._prepickle()
@@ -25,16 +36,10 @@ class RuntimeV1(TelemetrizedRuntimeBase):
 
   def _make_evictable(self, s : Storage) -> bool:
     assert s.ref_int == 0, 'tried to make locked Storage evictable {}'.format(s)
-    if s in self.storage_pool:
-      return False
-    self.storage_pool.append(s)
-    return True
+    return self.storage_pool.add(s)
 
   def _make_unevictable(self, s : Storage) -> bool:
-    if s not in self.storage_pool:
-      return False
-    self.storage_pool.remove(s)
-    return True
+    return self.storage_pool.remove(s)
 
   def _evict(self, s : Storage):
     assert s.ref_int == 0, 'tried to evict locked Storage {}'.format(s)
@@ -46,7 +51,7 @@ class RuntimeV1(TelemetrizedRuntimeBase):
       t.defined = False
       for p in t.parents:
         if s.root_id != p.storage.root_id:
-          p.storage.meta['evicted_dependents'].add(t.id)
+          p.storage.evicted_dependents.add(t.id)
     self._T_evict(s)
 
   def _free(self, size : int):
@@ -68,7 +73,7 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     any lock is held.
     """
     assert s.material, 'cannot lock evicted Storage {}'.format(s)
-    assert not s.meta['banished'], 'cannot lock banished Storage {}'.format(s)
+    assert not s.banished, 'cannot lock banished Storage {}'.format(s)
     if s.ref_int == 0:
       succ = self._make_unevictable(s)
       assert succ, 'unevictable Storage that is not locked {}'.format(s)
@@ -120,7 +125,7 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     #       sibling tensors or something, but this might violate locks on the
     #       Storages and is hard in PyTorch, so I don't do it here.
     
-    if t.meta['is_alias']:
+    if t.is_alias:
       # If 'materializing' an alias, then it should just be defining the Tensor
       # (i.e. metadata in the PyTorch implementation). The underlying Storage
       # should ALWAYS be material at this point, via materializing the parents.
@@ -132,7 +137,7 @@ class RuntimeV1(TelemetrizedRuntimeBase):
 
     # Materialize siblings
     for u in remat_siblings:
-      if u.meta['is_alias']: assert u.storage.material
+      if u.is_alias: assert u.storage.material
       u.storage.material = True
       u.defined = True
       self._T_compute(u, rematerialize=rematerialize, direct=False)
@@ -148,37 +153,68 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     return remat_siblings, remat_storages
 
   def _materialize(self, t : Tensor, rematerialize=True):
+    """
+    Materializes `t`, first rematerializing its evicted ancestors depth-first.
+    This uses an explicit stack instead of recursion, so long chains of evicted
+    Tensors cannot exceed the recursion limit, and performs the same locks,
+    computes and telemetry callbacks in the same order as the recursive form.
+    """
+    # frames are [tensor, rematerialize, undefined parents, next parent index]
+    stack = [[t, rematerialize, self._materialize_enter(t, rematerialize), 0]]
+    while stack:
+      frame = stack[-1]
+      u, u_remat, pending, i = frame
+      if i < len(pending):
+        p = pending[i]
+        # p may already be defined if a sibling of it was rematerialized
+        if not p.defined:
+          stack.append([p, True, self._materialize_enter(p, True), 0])
+          continue
+        self._lock(p.storage)
+        frame[3] = i + 1
+        continue
+      stack.pop()
+      self._materialize_exit(u, u_remat)
+    return t
+
+  def _materialize_enter(self, t : Tensor, rematerialize : bool) -> List[Tensor]:
+    """
+    Starts materializing `t`: records the parent accesses and locks the defined
+    parents. Returns the undefined parents, which must be rematerialized and
+    then locked (in order) before `_materialize_exit`.
+    """
     # NOTE: t.defined is False when a Tensor is an alias which has not
     #       been recomputed, even after the underlying Storage was rematerialized.
     #       This models the behavior in the PyTorch implementation, where alias
     #       Tensors are fully destroyed (rather than just the storage).
     assert not t.defined, 'cannot materialize a defined Tensor {}'.format(t)
     assert t.storage.material or t.storage.ref_int == 0, 'a locked Storage is evicted {}'.format(t.storage)
-    assert not t.storage.meta['banished']
+    assert not t.storage.banished
 
     self._T_pending(t)
 
     for p in t.parents:
       # Update last accessed times iff the underlying Storage is externally accessible
       if p.storage.ref_ext > 0:
-        p.storage.meta['last_access_int'] = self.clock
+        p.storage.last_access_int = self.clock
         if not rematerialize:
-          p.storage.meta['last_access'] = self.clock
+          p.storage.last_access = self.clock
+        self.storage_pool.invalidate(p.storage)
       self._T_use(p, rematerialize=rematerialize)
 
     # TODO (MAJOR): figure out how to soundly order the rematerializations
 
-    # get locks on all parents; rematerialize if needed
+    # get locks on all parents; the rest are rematerialized by `_materialize`
     for p in list(filter(lambda p: p.defined, t.parents)):
       self._lock(p.storage)
-    for p in list(filter(lambda p: not p.defined, t.parents)):
-      # NOTE: we wrap the filter in a list since lazy evaluation might cause
-      #       locks to not be acquired when two parents are siblings
-      if not p.defined:
-        # As above, this condition may be true if siblings get rematerialized
-        self._materialize(p)
-      self._lock(p.storage)
+    # NOTE: we wrap the filter in a list since lazy evaluation might cause
+    #       locks to not be acquired when two parents are siblings
+    return list(filter(lambda p: not p.defined, t.parents))
 
+  def _materialize_exit(self, t : Tensor, rematerialize : bool):
+    """
+    Finishes materializing `t` once all of its parents are locked.
+    """
     self._T_pressure(t)
 
     if self.memory_usage + t.op.total_size > self.budget:
@@ -191,8 +227,8 @@ class RuntimeV1(TelemetrizedRuntimeBase):
       self._unlock(p.storage)
       for u in remat_siblings + [t]:
         if u.storage.root_id != p.storage.root_id:
-          if u.id in p.storage.meta['evicted_dependents']:
-            p.storage.meta['evicted_dependents'].remove(u.id)
+          if u.id in p.storage.evicted_dependents:
+            p.storage.evicted_dependents.remove(u.id)
       self._try_banish_V1(p.storage)
 
     if self.telemetry.summary['remat_compute'] > self.remat_limit:
@@ -202,13 +238,11 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     # record total required memory
     self._T_bottleneck(t)
 
-    return t
-
   def _try_banish_V1(self, s : Storage):
-    if s.ref_ext > 0 or len(s.meta['evicted_dependents']) > 0:
+    if s.ref_ext > 0 or len(s.evicted_dependents) > 0:
       return
 
-    assert all(map(lambda t: t.meta['ref_ext'] == 0, s.tensors)),\
+    assert all(map(lambda t: t.ref_ext == 0, s.tensors)),\
       'tried to banish a Storage with live Tensors {}'.format(s)
     if s.material:
       if s.ref_int > 0:
@@ -223,15 +257,15 @@ class RuntimeV1(TelemetrizedRuntimeBase):
       for p in t.parents:
         if s.root_id != p.storage.root_id:
           # NOTE: this condition can be false due to aliasing
-          if t.id in p.storage.meta['evicted_dependents']:
-            p.storage.meta['evicted_dependents'].remove(t.id)
+          if t.id in p.storage.evicted_dependents:
+            p.storage.evicted_dependents.remove(t.id)
           p.children.remove(t)
       for c in t.children:
         if s.root_id != c.storage.root_id:
           c.parents.remove(t)
           self.pin(c)
 
-    s.meta['banished'] = True
+    s.banished = True
     self._T_banish(s)
 
   def rematerialize(self, t : Tensor):
@@ -248,20 +282,15 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     tensors = Tensor.from_op(inputs, op, op_id, ids, names)
     for t in tensors:
       self.tensor_map[t.id] = t
-      if 'last_access' not in t.storage.meta:
-        t.storage.meta['last_access'] = -math.inf
-      if 'last_access_int' not in t.storage.meta:
-        t.storage.meta['last_access_int'] = -math.inf
-      if 'banished' in t.storage.meta:
-        assert not t.storage.meta['banished']
-      else:
-        t.storage.meta['banished'] = False
+      # aliases add to the compute of an existing (possibly evictable) Storage
+      self.storage_pool.invalidate(t.storage)
+      assert not t.storage.banished
       # update V1 metadata for parent Storages
-      if not t.meta['is_alias']:
-        t.storage.meta['evicted_dependents'] = set()
+      if not t.is_alias:
+        t.storage.evicted_dependents = set()
       for p in inputs:
         if t.storage.root_id != p.storage.root_id:
-          p.storage.meta['evicted_dependents'].add(t.id)
+          p.storage.evicted_dependents.add(t.id)
       self._T_new_tensor(t, op_id)
 
     # materialize
@@ -269,8 +298,9 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     
     for t in tensors:
       # set the last access times to avoid them being evicted immediately
-      t.storage.meta['last_access'] = self.clock
-      t.storage.meta['last_access_int'] = self.clock
+      t.storage.last_access = self.clock
+      t.storage.last_access_int = self.clock
+      self.storage_pool.invalidate(t.storage)
 
       # finalize telemetry
       self._T_birth(t)
@@ -281,15 +311,15 @@ class RuntimeV1(TelemetrizedRuntimeBase):
     assert t.storage.ref_ext > 0, \
       'cannot get a Tensor whose Storage has no external refs {}'.format(t)
     t.storage.ref_ext += 1
-    t.meta['ref_ext'] += 1
+    t.ref_ext += 1
     return t
 
   def release(self, t : Tensor):
     assert t.storage.ref_ext > 0, \
       'cannot release a Tensor whose Storage has no external refs {}'.format(t)
     t.storage.ref_ext -= 1
-    t.meta['ref_ext'] -= 1
-    if t.meta['ref_ext'] == 0:
+    t.ref_ext -= 1
+    if t.ref_ext == 0:
       self._T_death(t)
     if t.storage.ref_ext == 0:
       self._try_banish_V1(t.storage)
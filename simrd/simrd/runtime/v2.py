@@ -10,15 +10,30 @@ class RuntimeV2(TelemetrizedRuntimeBase):
   ])
   KWARGS = {
     **TelemetrizedRuntimeBase.KWARGS,
-    'remat_limit': math.inf
+    'remat_limit': math.inf,
+    'priority_pool': True,
+    'staleness_approx': 0.0,
+    'sample': None,
+    'sample_seed': 0,
+    'small_storage_ratio': 0.0,
+    'vectorized': False
   }
+  INVALIDATION_EVENTS = set(['last_access'])
   ID = 'V2'
 
   def __init__(self, budget, heuristic, **kwargs):
     super().__init__(budget, heuristic, **kwargs)
     self.remat_limit = kwargs.get('remat_limit', math.inf)
     self.remat_exceeded = False
-    self.storage_pool = []
+    self.storage_pool = make_eviction_pool(
+      heuristic, self, self.INVALIDATION_EVENTS,
+      indexed=kwargs.get('priority_pool', True),
+      approx=kwargs.get('staleness_approx', 0.0),
+      sample=kwargs.get('sample', None),
+      sample_seed=kwargs.get('sample_seed', 0),
+      small_ratio=kwargs.get('small_storage_ratio', 0.0),
+      vectorized=kwargs.get('vectorized', False)
+    )
 
   def _prepickle(self):
     super()._prepickle()
@@ -29,22 +44,16 @@ class RuntimeV2(TelemetrizedRuntimeBase):
 
   def _make_evictable(self, s : Storage) -> bool:
     assert s.ref_int == 0, 'tried to make locked Storage evictable {}'.format(s)
-    if s in self.storage_pool:
-      return False
-    self.storage_pool.append(s)
-    return True
+    return self.storage_pool.add(s)
 
   def _make_unevictable(self, s : Storage) -> bool:
-    if s not in self.storage_pool:
-      return False
-    self.storage_pool.remove(s)
-    return True
+    return self.storage_pool.remove(s)
 
   def _evict(self, s : Storage):
     assert s.ref_int == 0, 'tried to evict locked Storage {}'.format(s)
     assert not s.pinned and s.tensors[0].op.name != 'constant'
     s.material = False
-    s.meta['last_evict'] = self.clock
+    s.last_evict = self.clock
     self.memory_usage -= s.size
     self._make_unevictable(s)
     for t in s.tensors:
@@ -124,7 +133,7 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     #       sibling tensors or something, but this might violate locks on the
     #       Storages and is hard in PyTorch, so I don't do it here.
     
-    if t.meta['is_alias']:
+    if t.is_alias:
       # If 'materializing' an alias, then it should just be defining the Tensor
       # (i.e. metadata in the PyTorch implementation). The underlying Storage
       # should ALWAYS be material at this point, via materializing the parents.
@@ -136,7 +145,7 @@ class RuntimeV2(TelemetrizedRuntimeBase):
 
     # Materialize siblings
     for u in remat_siblings:
-      if u.meta['is_alias']: assert u.storage.material
+      if u.is_alias: assert u.storage.material
       u.storage.material = True
       u.defined = True
       self._T_compute(u, rematerialize=rematerialize, direct=False)
@@ -152,6 +161,36 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     return remat_siblings, remat_storages
 
   def _materialize(self, t : Tensor, rematerialize=True):
+    """
+    Materializes `t`, first rematerializing its evicted ancestors depth-first.
+    This uses an explicit stack instead of recursion, so long chains of evicted
+    Tensors cannot exceed the recursion limit, and performs the same locks,
+    computes and telemetry callbacks in the same order as the recursive form.
+    """
+    # frames are [tensor, rematerialize, undefined parents, next parent index]
+    stack = [[t, rematerialize, self._materialize_enter(t, rematerialize), 0]]
+    while stack:
+      frame = stack[-1]
+      u, u_remat, pending, i = frame
+      if i < len(pending):
+        p = pending[i]
+        # p may already be defined if a sibling of it was rematerialized
+        if not p.defined:
+          stack.append([p, True, self._materialize_enter(p, True), 0])
+          continue
+        self._lock(p.storage)
+        frame[3] = i + 1
+        continue
+      stack.pop()
+      self._materialize_exit(u, u_remat)
+    return t
+
+  def _materialize_enter(self, t : Tensor, rematerialize : bool) -> List[Tensor]:
+    """
+    Starts materializing `t`: records the parent accesses and locks the defined
+    parents. Returns the undefined parents, which must be rematerialized and
+    then locked (in order) before `_materialize_exit`.
+    """
     # NOTE: t.defined is False when a Tensor is an alias which has not
     #       been recomputed, even after the underlying Storage was rematerialized.
     #       This models the behavior in the PyTorch implementation, where alias
@@ -163,24 +202,25 @@ class RuntimeV2(TelemetrizedRuntimeBase):
 
     for p in t.parents:
       # Update last accessed times iff the underlying Storage is externally accessible
-      p.storage.meta['last_access_int'] = self.clock
+      p.storage.last_access_int = self.clock
       if not rematerialize:
-        p.storage.meta['last_access'] = self.clock
+        p.storage.last_access = self.clock
+      self.storage_pool.invalidate(p.storage)
       self._T_use(p, rematerialize=rematerialize)
 
     # TODO (MAJOR): figure out how to soundly order the rematerializations
 
-    # get locks on all parents; rematerialize if needed
+    # get locks on all parents; the rest are rematerialized by `_materialize`
     for p in list(filter(lambda p: p.defined, t.parents)):
       self._lock(p.storage)
-    for p in list(filter(lambda p: not p.defined, t.parents)):
-      # NOTE: we wrap the filter in a list since lazy evaluation might cause
-      #       locks to not be acquired when two parents are siblings
-      if not p.defined:
-        # As above, this condition may be true if siblings get rematerialized
-        self._materialize(p)
-      self._lock(p.storage)
+    # NOTE: we wrap the filter in a list since lazy evaluation might cause
+    #       locks to not be acquired when two parents are siblings
+    return list(filter(lambda p: not p.defined, t.parents))
 
+  def _materialize_exit(self, t : Tensor, rematerialize : bool):
+    """
+    Finishes materializing `t` once all of its parents are locked.
+    """
     self._T_pressure(t)
 
     if self.memory_usage + t.op.total_size > self.budget:
@@ -199,8 +239,6 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     # record total required memory
     self._T_bottleneck(t)
 
-    return t
-
   def rematerialize(self, t : Tensor):
     self._materialize(t, rematerialize=True)
 
@@ -215,10 +253,8 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     tensors = Tensor.from_op(inputs, op, op_id, ids, names)
     for t in tensors:
       self.tensor_map[t.id] = t
-      if 'last_access' not in t.storage.meta:
-        t.storage.meta['last_access'] = -math.inf
-      if 'last_access_int' not in t.storage.meta:
-        t.storage.meta['last_access_int'] = -math.inf
+      # aliases add to the compute of an existing (possibly evictable) Storage
+      self.storage_pool.invalidate(t.storage)
       self._T_new_tensor(t, op_id)
 
     # materialize
@@ -226,8 +262,9 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     
     for t in tensors:
       # set the last access times to avoid them being evicted immediately
-      t.storage.meta['last_access'] = self.clock
-      t.storage.meta['last_access_int'] = self.clock
+      t.storage.last_access = self.clock
+      t.storage.last_access_int = self.clock
+      self.storage_pool.invalidate(t.storage)
 
       # finalize telemetry
       self._T_birth(t)
@@ -238,15 +275,15 @@ class RuntimeV2(TelemetrizedRuntimeBase):
     assert t.storage.ref_ext > 0, \
       'cannot get a Tensor whose Storage has no external refs {}'.format(t)
     t.storage.ref_ext += 1
-    t.meta['ref_ext'] += 1
+    t.ref_ext += 1
     return t
 
   def release(self, t : Tensor):
     assert t.storage.ref_ext > 0, \
       'cannot release a Tensor whose Storage has no external refs {}'.format(t)
     t.storage.ref_ext -= 1
-    t.meta['ref_ext'] -= 1
-    if t.meta['ref_ext'] == 0:
+    t.ref_ext -= 1
+    if t.ref_ext == 0:
       self._T_death(t)
 
   def pin(self, t : Tensor):
@@ -276,6 +313,25 @@ class RuntimeV2Optimized(RuntimeV2):
   FEATURES = RuntimeV2.FEATURES.union([
     'regions', 'eq_class'
   ])
+  KWARGS = {
+    **RuntimeV2.KWARGS,
+    'incremental_regions': True,
+    'exact_eq_class': False
+  }
+  INVALIDATION_EVENTS = RuntimeV2.INVALIDATION_EVENTS.union([
+    'regions'
+  ])
+
+  def __init__(self, budget, heuristic, **kwargs):
+    super().__init__(budget, heuristic, **kwargs)
+    self.incremental_regions = kwargs.get('incremental_regions', True)
+    self.exact_eq_class = kwargs.get('exact_eq_class', False)
+    # Storages of the operator in compute(), until they are first computed
+    self._fresh = []
+
+  def _prepickle(self):
+    super()._prepickle()
+    self._fresh = []
 
   def _evict(self, s : Storage):
     super()._evict(s)
@@ -283,54 +339,191 @@ class RuntimeV2Optimized(RuntimeV2):
     # TODO: profile, if slow then make it a static boolean
     if 'regions' in self.heuristic.FEATURES:
       # Update regions
-      for ps_id in s.meta['region_rev'].frontier:
+      for ps_id in s.region_rev.frontier:
         ps = self.tensor_map[ps_id].storage
-        ps.meta['region'].absorb(s, self.tensor_map, self.telemetry)
-      for cs_id in s.meta['region'].frontier:
+        ps.region.absorb(s, self.tensor_map, self.telemetry)
+        self.storage_pool.invalidate(ps)
+      for cs_id in s.region.frontier:
         cs = self.tensor_map[cs_id].storage
-        cs.meta['region_rev'].absorb(s, self.tensor_map, self.telemetry)
-      s.meta['region'].clear()
-      s.meta['region_rev'].clear()
+        cs.region_rev.absorb(s, self.tensor_map, self.telemetry)
+        self.storage_pool.invalidate(cs)
+      s.region.clear()
+      s.region_rev.clear()
 
     if 'eq_class' in self.heuristic.FEATURES:
       # Make an EqClassNode for s and merge with DISTINCT neighboring EqClasses
-      assert s.meta.get('ecn', None) is None
-      s.meta['ecn'] = EqClassNode(CheckpointInfo(s.compute), tel=self.telemetry)
-      neighbors = Storage.evicted_neighbors(s, self.telemetry)
+      assert s.ecn is None
+      s.ecn = EqClassNode(CheckpointInfo(s.compute), tel=self.telemetry)
+      for n in Storage.neighbors(s, self.telemetry):
+        n.evicted_adjacent.add(s)
       # TODO: optimize merge order?
-      for n in neighbors:
-        assert n.meta.get('ecn', None) is not None
+      for n in s.evicted_adjacent:
+        assert n.ecn is not None
+        if self.exact_eq_class and n.last_evict == -math.inf:
+          # not computed yet (a sibling or child being materialized), so it is
+          # not part of any evicted component
+          continue
         # Merge will only merge the same EqClass once
-        EqClassNode.merge(CheckpointInfo.merge_f, n.meta['ecn'], s.meta['ecn'])
+        EqClassNode.merge(CheckpointInfo.merge_f, n.ecn, s.ecn)
 
   def _compute(self, t : Tensor, rematerialize=True):
     remat_siblings, remat_storages = super()._compute(t, rematerialize=rematerialize)
 
     if 'regions' in self.heuristic.FEATURES:
-      # Rebuild regions
+      # Rebuild regions of the rematerialized storages
       affected_regions = set()
       affected_regions_rev = set()
+      remat_ids, downstream, upstream = set(), set(), set()
+      fresh = set(s.root_id for s in self._fresh if not s.material)
       for u in remat_storages:
         us = u.storage
-        us.meta['region'].rebuild(self.telemetry)
-        us.meta['region_rev'].rebuild(self.telemetry)
-        affected_regions.update(us.meta['region_rev'].frontier)
-        affected_regions_rev.update(us.meta['region'].frontier)
+        us.region.rebuild(self.telemetry)
+        us.region_rev.rebuild(self.telemetry)
+        affected_regions.update(us.region_rev.frontier)
+        affected_regions_rev.update(us.region.frontier)
+        remat_ids.add(us.root_id)
+        downstream.update(us.region.interior)
+        upstream.update(us.region_rev.interior)
+        self.storage_pool.invalidate(us)
+
+      # Shrink (or rebuild) the regions that contained them
       for s_id in affected_regions:
-        self.tensor_map[s_id].storage.meta['region'].rebuild(self.telemetry)
+        s = self.tensor_map[s_id].storage
+        if not self.incremental_regions:
+          s.region.rebuild(self.telemetry)
+        elif s_id not in remat_ids:
+          s.region.shrink(remat_ids, downstream, fresh, self.tensor_map, self.telemetry)
+        self.storage_pool.invalidate(s)
       for s_id in affected_regions_rev:
-        self.tensor_map[s_id].storage.meta['region_rev'].rebuild(self.telemetry)
+        s = self.tensor_map[s_id].storage
+        if not self.incremental_regions:
+          s.region_rev.rebuild(self.telemetry)
+        elif s_id not in remat_ids:
+          s.region_rev.shrink(remat_ids, upstream, fresh, self.tensor_map, self.telemetry)
+        self.storage_pool.invalidate(s)
 
     if 'eq_class' in self.heuristic.FEATURES:
-      for s in map(lambda u: u.storage, remat_storages):
-        assert s.meta.get('ecn', None) is not None
-        cpi_pre  = EqClassNode.get_value(s.meta['ecn'])
-        cpi_post = CheckpointInfo(cpi_pre.compute - s.compute)
-        EqClassNode.set_value(s.meta['ecn'], cpi_post)
-        s.meta['ecn'] = None
+      storages = list(map(lambda u: u.storage, remat_storages))
+      for s in storages:
+        for n in Storage.neighbors(s, self.telemetry):
+          n.evicted_adjacent.discard(s)
+      if self.exact_eq_class:
+        # storages computed for the first time were never in an EqClass
+        if rematerialize:
+          self._split_eq_classes(storages)
+      else:
+        # NOTE: EqClasses are never split, and just lose the compute of
+        #       rematerialized storages
+        for s in storages:
+          assert s.ecn is not None
+          cpi_pre  = EqClassNode.get_value(s.ecn)
+          cpi_post = CheckpointInfo(cpi_pre.compute - s.compute)
+          EqClassNode.set_value(s.ecn, cpi_post)
+      for s in storages:
+        s.ecn = None
 
     return remat_siblings, remat_storages
 
+  def _split_eq_classes(self, storages : List[Storage]):
+    """
+    Splits the EqClasses of the just-rematerialized `storages` into the evicted
+    components that remain without them. Each remaining component is adjacent
+    to one of `storages`, so it is found by searching from their evicted
+    neighbors.
+
+    The searches in each class run in lockstep, merging when they meet, and stop
+    once at most one is unfinished. Only the finished (smaller) sides get fresh
+    EqClassNodes; the unfinished side keeps the class's root, along with what is
+    left of its value.
+    """
+    storages = set(storages)
+    for s in storages:
+      assert s.ecn is not None
+      cpi = EqClassNode.get_value(s.ecn)
+      EqClassNode.set_value(s.ecn, CheckpointInfo(cpi.compute - s.compute))
+
+    def neighbors(s):
+      # skip Storages that are not computed yet, as when merging
+      return filter(lambda n: n.last_evict > -math.inf, s.evicted_adjacent)
+
+    starts = {}  # map root -> evicted neighbors in its class
+    for s in storages:
+      for n in neighbors(s):
+        starts.setdefault(EqClassNode.find_root(n.ecn), set()).add(n)
+
+    for root, ns in starts.items():
+      if len(ns) < 2:
+        continue
+      owner = {}
+      searches = []
+      for n in ns:
+        owner[n] = len(searches)
+        searches.append(([n], [n]))  # (members, stack)
+      live = list(range(len(searches)))
+
+      while sum(1 for i in live if searches[i][1]) > 1:
+        for i in list(live):
+          if not searches[i][1]:
+            continue
+          for m in neighbors(searches[i][1].pop()):
+            j = owner.get(m)
+            if j is None:
+              owner[m] = i
+              searches[i][0].append(m)
+              searches[i][1].append(m)
+            elif j != i:
+              # met another search; fold the smaller one into the larger
+              if len(searches[i][0]) > len(searches[j][0]):
+                i, j = j, i
+              for k in searches[i][0]:
+                owner[k] = j
+              searches[j][0].extend(searches[i][0])
+              searches[j][1].extend(searches[i][1])
+              searches[i] = ([], [])
+              live.remove(i)
+              i = j
+
+      # the unfinished (or else the largest) side stays with the root
+      keep = max(live, key=lambda i: (bool(searches[i][1]), len(searches[i][0])))
+      for i in live:
+        if i == keep:
+          continue
+        members = searches[i][0]
+        compute = sum(map(lambda m: m.compute, members))
+        ecn = EqClassNode(CheckpointInfo(compute), tel=self.telemetry)
+        for m in members:
+          m.ecn = ecn
+        cpi = EqClassNode.get_value(root)
+        EqClassNode.set_value(root, CheckpointInfo(cpi.compute - compute))
+
+  def _rebuild_alias_regions(self, s : Storage):
+    """
+    Rebuilds the Regions that contain or border `s`, after an alias added a
+    Tensor to it. The alias adds edges from its parents to `s`, and adds to
+    `s.compute` even when `s` is evicted, so these Regions cannot be updated
+    incrementally. They are found by searching from `s` through evicted
+    Storages, backwards for the forward Regions and forwards for the reversed.
+    """
+    accesses = 0
+    for reverse in [False, True]:
+      seen = set([s.root_id])
+      stack = [s]
+      while stack:
+        u = stack.pop()
+        if u.material:
+          region = u.region_rev if reverse else u.region
+          region.rebuild(self.telemetry)
+          self.storage_pool.invalidate(u)
+          if u is not s:
+            continue
+        for t in u.tensors:
+          for v in (t.children if reverse else t.parents):
+            accesses += 1
+            if v.storage.root_id not in seen:
+              seen.add(v.storage.root_id)
+              stack.append(v.storage)
+    self.telemetry.summary['heuristic_access_count'] += accesses
+
   # Overload compute() to add regions as necessary
   def compute(self, inputs : List[Tensor], op : Operator,
               ids : Tuple[int] = None, names : Tuple[str] = None):
@@ -340,29 +533,57 @@ class RuntimeV2Optimized(RuntimeV2):
     self.tensor_count += op.outputs
     self.op_count += 1
 
+    computes = {p.storage: p.storage.compute for p in inputs}
     tensors = Tensor.from_op(inputs, op, op_id, ids, names)
     for t in tensors:
       self.tensor_map[t.id] = t
-      if 'last_access' not in t.storage.meta:
-        t.storage.meta['last_access'] = -math.inf
-      if 'last_access_int' not in t.storage.meta:
-        t.storage.meta['last_access_int'] = -math.inf
+      # aliases add to the compute of an existing (possibly evictable) Storage
+      self.storage_pool.invalidate(t.storage)
+      if self.exact_eq_class and t.storage.ecn is not None and \
+         t.storage.last_evict > -math.inf and not t.storage.material:
+        # ...or an evicted one, and so to its EqClass
+        cpi = EqClassNode.get_value(t.storage.ecn)
+        compute = cpi.compute + t.storage.compute - computes[t.storage]
+        EqClassNode.set_value(t.storage.ecn, CheckpointInfo(compute))
+        computes[t.storage] = t.storage.compute
       if 'regions' in self.heuristic.FEATURES:
-        if 'region' not in t.storage.meta:
-          t.storage.meta['region'] = Region(t.storage, reverse=False)
-        if 'region_rev' not in t.storage.meta:
-          t.storage.meta['region_rev'] = Region(t.storage, reverse=True)
-      if 'eq_class' in self.heuristic.FEATURES and 'ecn' not in t.storage.meta:
-        t.storage.meta['ecn'] = EqClassNode(CheckpointInfo(0), tel=self.telemetry)
+        if t.storage.region is None:
+          t.storage.region = Region(t.storage, reverse=False)
+        if t.storage.region_rev is None:
+          t.storage.region_rev = Region(t.storage, reverse=True)
+      if 'eq_class' in self.heuristic.FEATURES and not t.is_alias:
+        # aliases share the (possibly cleared) EqClassNode of their Storage
+        t.storage.ecn = EqClassNode(CheckpointInfo(0), tel=self.telemetry)
+      if 'eq_class' in self.heuristic.FEATURES:
+        # link t's Storage with its parents'; Storages that are not computed yet
+        # count as evicted, like in Storage.evicted_neighbors
+        s = t.storage
+        if s.evicted_adjacent is None:
+          s.evicted_adjacent = set()
+        for ps in map(lambda p: p.storage, t.parents):
+          self.telemetry.summary['heuristic_access_count'] += 1
+          if ps.root_id == s.root_id:
+            continue
+          if not s.material:
+            ps.evicted_adjacent.add(s)
+          if not ps.material:
+            s.evicted_adjacent.add(ps)
       self._T_new_tensor(t, op_id)
 
+    if 'regions' in self.heuristic.FEATURES:
+      for s in set(t.storage for t in tensors if t.is_alias):
+        self._rebuild_alias_regions(s)
+
     # materialize
+    self._fresh = [t.storage for t in tensors if not t.is_alias]
     self._materialize(tensors[0], rematerialize=False)
+    self._fresh = []
 
     for t in tensors:
       # set the last access times to avoid them being evicted immediately
-      t.storage.meta['last_access'] = self.clock
-      t.storage.meta['last_access_int'] = self.clock
+      t.storage.last_access = self.clock
+      t.storage.last_access_int = self.clock
+      self.storage_pool.invalidate(t.storage)
 
       # finalize telemetry
       self._T_birth(t)
@@ -1,7 +1,106 @@
-from typing import List
+import os
+from typing import List, Dict
+
+import numpy as np
 
 from .tensor import Storage, Operator, Tensor
 
+def _column_dtype(column):
+  if column in ['name', 'op_name']:
+    return object
+  if column in ['is_alias', 'is_aliasing']:
+    return np.bool_
+  # compute (and so the clock) may be fractional; sizes are always whole bytes
+  if column == 'compute' or column.endswith('_time'):
+    return np.float64
+  if column.endswith('_count') or column in ['index', 'outputs']:
+    return np.int32
+  return np.int64
+
+class ColumnTable:
+  """
+  Columnar store of the stats of one kind of object (e.g. Tensors), keyed by
+  id. Each id gets a dense row when it is added, and each column is a NumPy
+  array indexed by row that is preallocated and doubled when full. While ids
+  are added in order from 0 (as runtimes assign them), an id is its own row;
+  otherwise, a dict maps ids to rows.
+
+  Behaves like the dict of rows (`id -> List`) it replaces for reading: `in`,
+  `keys`, `values` and `table[id]` work on ids, with rows given as lists in the
+  order of `columns`.
+  """
+  def __init__(self, columns : List[str], capacity=1024):
+    self.columns = columns
+    self.rows = None  # map id -> row, unless every id is its row
+    self._len = 0
+    self._capacity = capacity
+    self.data = {c : np.zeros(capacity, dtype=_column_dtype(c)) for c in columns}
+
+  def __len__(self):
+    return self._len
+
+  def __contains__(self, rid):
+    if self.rows is None:
+      return isinstance(rid, int) and 0 <= rid < self._len
+    return rid in self.rows
+
+  def __getitem__(self, rid):
+    return [self.get(rid, c) for c in self.columns]
+
+  def row(self, rid) -> int:
+    if self.rows is None:
+      if rid not in self:
+        raise KeyError(rid)
+      return rid
+    return self.rows[rid]
+
+  def get(self, rid, column):
+    """Returns the value of `column` for `rid`, as a plain Python value."""
+    r = self.row(rid)
+    return self.data[column][r:r+1].tolist()[0]
+
+  def keys(self):
+    return range(self._len) if self.rows is None else self.rows.keys()
+
+  def values(self):
+    return map(self.__getitem__, self.keys())
+
+  def _grow(self):
+    self._capacity = max(2 * self._capacity, 1)
+    for c, old in self.data.items():
+      new = np.zeros(self._capacity, dtype=old.dtype)
+      new[:len(old)] = old
+      self.data[c] = new
+
+  def add(self, rid, values : List):
+    assert rid not in self
+    r = self._len
+    if r == self._capacity:
+      self._grow()
+    if self.rows is None and rid != r:
+      self.rows = {i : i for i in range(r)}
+    if self.rows is not None:
+      self.rows[rid] = r
+    self._len += 1
+    for c, v in zip(self.columns, values):
+      if v:  # the columns start zeroed
+        self.data[c][r] = v
+
+  def arrays(self) -> Dict[str, np.ndarray]:
+    """Returns the columns, trimmed to the rows in use."""
+    return {c : a[:self._len] for c, a in self.data.items()}
+
+  def dataframe(self):
+    import pandas as pd
+    return pd.DataFrame(self.arrays(), columns=self.columns)
+
+  def __getstate__(self):
+    # don't pickle the unused capacity
+    state = self.__dict__.copy()
+    state['data'] = self.arrays()
+    state['_capacity'] = self._len
+    return state
+
 class Telemetry:
   # TODO: do we want to log Tensor/Storage remat uses after death? might be useful
   SUMMARY_STATS = [
@@ -26,71 +125,60 @@ class Telemetry:
     'direct_remat_count', 'collateral_remat_count'
   ]
 
-  def __init__(self, has_stats=True, has_trace=True):
+  TABLES = ['storage', 'operator', 'tensor']
+
+  def __init__(self, has_stats=True, has_trace=True, trace_spill=None):
     self.summary = {stat : 0 for stat in Telemetry.SUMMARY_STATS}
     self.neighborhood_sizes = {}
-    self.storage  = {}  # map id -> column
-    self.operator = {}  # map id -> column
-    self.tensor   = {}  # map id -> column
-    self.trace = Trace()
+    self.storage  = ColumnTable(Telemetry.STORAGE_STATS)
+    self.operator = ColumnTable(Telemetry.OPERATOR_STATS)
+    self.tensor   = ColumnTable(Telemetry.TENSOR_STATS)
+    self.trace = Trace(spill_path=trace_spill)
     self.adj_list = {}  # map id -> List[id] (children)
-    self.column_maps = {
-      'storage'  : { col : Telemetry.STORAGE_STATS.index(col) for col in Telemetry.STORAGE_STATS},
-      'operator' : { col : Telemetry.OPERATOR_STATS.index(col) for col in Telemetry.OPERATOR_STATS},
-      'tensor'   : { col : Telemetry.TENSOR_STATS.index(col) for col in Telemetry.TENSOR_STATS}
-    }
     self.has_stats = has_stats
     self.has_trace = has_trace
 
   def inc(self, field, rid, column, amt=1):
-    field_dict = getattr(self, field)
-    assert rid in field_dict
-    field_dict[rid][self.column_maps[field][column]] += amt
+    table = getattr(self, field)
+    table.data[column][table.row(rid)] += amt
 
   def set(self, field, rid, column, value):
-    field_dict = getattr(self, field)
-    assert rid in field_dict
-    field_dict[rid][self.column_maps[field][column]] = value
+    table = getattr(self, field)
+    table.data[column][table.row(rid)] = value
 
   def get(self, field, rid, column):
-    field_dict = getattr(self, field)
-    assert rid in field_dict
-    return field_dict[rid][self.column_maps[field][column]]
+    return getattr(self, field).get(rid, column)
 
   def register_storage(self, s : Storage):
     root_id = s.root_id
-    assert root_id not in self.storage
-    self.storage[root_id] = [
+    self.storage.add(root_id, [
       root_id, s.size, 0,
       0, 0, 0, 0, 0, 0,
       0, 0, 0, 0,
       0, 0,
       0
-    ]
+    ])
 
   def register_operator(self, op : Operator, call_id):
-    assert call_id not in self.operator
     is_aliasing = any(map(lambda i: i != -1, op.aliases))
-    self.operator[call_id] = [
+    self.operator.add(call_id, [
       call_id, op.name, op.outputs, op.compute, op.total_size, is_aliasing, 0
-    ]
+    ])
 
   def register_tensor(self, t : Tensor, call_id):
-    assert t.id not in self.tensor
-
     # register Storage and Operator if not registered
     if t.storage.root_id not in self.storage:
       self.register_storage(t.storage)
     if call_id not in self.operator:
       self.register_operator(t.op, call_id)
 
-    self.tensor[t.id] = [
-      t.id, t.name, call_id, t.storage.root_id, t.index, t.meta['is_alias'],
+    self.tensor.add(t.id, [
+      t.id, t.name, call_id, t.storage.root_id, t.index, t.is_alias,
       t.op.name, t.op.sizes[t.index], t.op.compute,
       0, 0, 0, 0,
       0, 0, 0, 0,
       0, 0
-    ]
+    ])
 
     # update storage telemetry
     self.inc('storage', t.storage.root_id, 'tensor_count')
@@ -105,46 +193,180 @@ class Telemetry:
     assert t.id not in self.adj_list
     self.adj_list[t.id] = []
 
+  def tables(self) -> Dict[str, 'pd.DataFrame']:
+    """
+    Returns the stats as pandas DataFrames, by table name ('storage',
+    'operator', 'tensor'), along with the summary as a single-row 'summary'.
+    """
+    import pandas as pd
+    tables = {name : getattr(self, name).dataframe() for name in Telemetry.TABLES}
+    tables['summary'] = pd.DataFrame([self.summary], columns=Telemetry.SUMMARY_STATS)
+    return tables
+
+  def save(self, path : str) -> None:
+    """
+    Saves the summary and stats to `path`, which is either an `.npz` file, or
+    a directory of Parquet files (one per table, see `tables`) otherwise.
+    Parquet requires an engine for pandas, such as pyarrow. Load them back
+    with `load_tables`.
+    """
+    if path.endswith('.npz'):
+      arrays = {}
+      for name in Telemetry.TABLES:
+        for c, a in getattr(self, name).arrays().items():
+          arrays['{}/{}'.format(name, c)] = a.astype(str) if a.dtype == object else a
+      for stat, value in self.summary.items():
+        arrays['summary/{}'.format(stat)] = np.array([value])
+      np.savez(path, **arrays)
+    else:
+      os.makedirs(path, exist_ok=True)
+      for name, df in self.tables().items():
+        df.to_parquet(os.path.join(path, name + '.parquet'))
+
   def json(self):
     raise NotImplementedError()
 
+def load_tables(path : str) -> Dict[str, 'pd.DataFrame']:
+  """
+  Loads the tables saved by `Telemetry.save` at `path` as pandas DataFrames,
+  keyed like `Telemetry.tables`.
+  """
+  import pandas as pd
+  tables = {}
+  if path.endswith('.npz'):
+    columns = {}
+    with np.load(path) as f:
+      for key in f.files:
+        name, c = key.split('/')
+        columns.setdefault(name, {})[c] = f[key]
+    for name, cols in columns.items():
+      tables[name] = pd.DataFrame(cols)
+  else:
+    for name in Telemetry.TABLES + ['summary']:
+      tables[name] = pd.read_parquet(os.path.join(path, name + '.parquet'))
+  return tables
+
 # TODO: update trace to work with Storage abstraction
 class Trace:
-  def __init__(self, track_costs=False):
+  """
+  Append-only log of runtime events `(time, kind, id, value)`, in the order
+  they were recorded (so, in time order). `kind` indexes `FIELDS`; `id` is a
+  Tensor id (compute, pending, pressure) or Storage id (the rest), and `value`
+  is only used by pressure events, for the memory required to complete the
+  pending op.
+
+  Events are buffered and packed into typed chunks of `chunk_size` events. With
+  `spill_path`, full chunks are appended to that file instead of being kept in
+  memory, and read back through a memory map; the file must stay around for as
+  long as the Trace is read.
+
+  Read the log with `steps` (streaming) or `events`; `view` (or e.g.
+  `trace.compute`) reconstructs the per-field map `time -> List[id]`.
+  """
+  FIELDS = ['compute', 'evict', 'lock', 'unlock', 'pending', 'pin', 'banish', 'pressure']
+  KINDS = {field : i for i, field in enumerate(FIELDS)}
+  EVENT = np.dtype([
+    ('time', np.float64), ('kind', np.uint8), ('id', np.int64), ('value', np.int64)
+  ])
+
+  def __init__(self, track_costs=False, spill_path=None, chunk_size=65536):
     """
     NOTE: heuristic cost tracking is currently unimplemented due to performance degradation
     """
-    self.compute  = {}  # map Time -> List[Tensor id]
-    self.evict    = {}  # map Time -> List[Storage id]
-    self.lock     = {}  # map Time -> List[Storage id]
-    self.unlock   = {}  # map Time -> List[Storage id]
-    self.pending  = {}  # map Time -> List[Tensor id]
-    self.pin      = {}  # map Time -> List[Storage id]
-    self.banish   = {}  # map Time -> List[Storage id]
-    self.pressure = {}  # map Time -> float; memory required to complete a pending op at t
-    
-    # NOTE: this is COSTLY; recomputed for all material tensors whenever state changes
-    self.costs    = {}  # map Time -> List[Tuple[id, float]]
     self.track_costs = track_costs
-
     if track_costs:
       raise NotImplementedError('heuristic cost tracking is not implemented')
 
-    self.timesteps = []  # times where something has happened
-  
-  def get(self, field, time):
-    field = getattr(self, field)
-    if time not in field:
-      field[time] = []
-      if time not in self.timesteps:
-        self.timesteps.append(time)
-    return field[time]
-
-  def record(self, field, time, item):
+    self.spill_path = spill_path
+    self.chunk_size = chunk_size
+    self._buffer = []  # List[Tuple], events not yet packed
+    self._chunks = []  # List[np.ndarray], packed events kept in memory
+    self._spilled = 0  # number of events in the spill file
+    if spill_path is not None:
+      open(spill_path, 'wb').close()
+
+  def __len__(self):
+    return self._spilled + sum(map(len, self._chunks)) + len(self._buffer)
+
+  def __getattr__(self, name):
+    if name in Trace.KINDS:
+      return self.view(name)
+    raise AttributeError(name)
+
+  def record(self, field, time, item, value=0):
     """
-    Appends item to the list at `field[time]`.
+    Appends the event `field` of `item` (an id) at `time`.
     """
-    self.get(field, time).append(item)
+    self._buffer.append((time, Trace.KINDS[field], item, value))
+    if len(self._buffer) == self.chunk_size:
+      self._pack()
+
+  def _pack(self):
+    chunk = np.array(self._buffer, dtype=Trace.EVENT)
+    self._buffer = []
+    if self.spill_path is None:
+      self._chunks.append(chunk)
+    else:
+      with open(self.spill_path, 'ab') as f:
+        chunk.tofile(f)
+      self._spilled += len(chunk)
+
+  def chunks(self):
+    """Yields the events as arrays of `EVENT`, at most `chunk_size` at a time."""
+    if self._spilled > 0:
+      spilled = np.memmap(self.spill_path, dtype=Trace.EVENT, mode='r', shape=(self._spilled,))
+      for i in range(0, self._spilled, self.chunk_size):
+        yield spilled[i:i+self.chunk_size]
+    yield from self._chunks
+    if len(self._buffer) > 0:
+      yield np.array(self._buffer, dtype=Trace.EVENT)
+
+  def events(self) -> np.ndarray:
+    """Returns all of the events, as one array of `EVENT`."""
+    chunks = list(self.chunks())
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=Trace.EVENT)
+
+  def steps(self):
+    """
+    Yields `(time, events)` for every time with events, in order, where
+    `events` are those at `time`. Only holds a chunk of events at once.
+    """
+    rest = None
+    for chunk in self.chunks():
+      if rest is not None:
+        chunk = np.concatenate([rest, chunk])
+      times = chunk['time']
+      starts = np.flatnonzero(times[1:] != times[:-1]) + 1
+      lo = 0
+      for hi in starts.tolist():
+        yield float(times[lo]), chunk[lo:hi]
+        lo = hi
+      rest = np.array(chunk[lo:])
+    if rest is not None and len(rest) > 0:
+      yield float(rest['time'][0]), rest
+
+  def view(self, field):
+    """
+    Returns the events of `field` as a map `time -> List[id]`, or for
+    pressure, `time -> value` (the last one recorded at that time).
+    """
+    kind = Trace.KINDS[field]
+    view = {}
+    for time, events in self.steps():
+      events = events[events['kind'] == kind]
+      if len(events) == 0:
+        continue
+      if field == 'pressure':
+        view[time] = events['value'][-1].item()
+      else:
+        view[time] = events['id'].tolist()
+    return view
+
+  @property
+  def timesteps(self):
+    """The times with events other than pressure, in order."""
+    pressure = Trace.KINDS['pressure']
+    return [time for time, events in self.steps() if (events['kind'] != pressure).any()]
 
   def json(self):
     raise NotImplementedError()
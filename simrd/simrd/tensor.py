@@ -1,6 +1,20 @@
+import math
 from typing import List, Union, Tuple, Mapping
 
+def _slots_dict(obj) -> dict:
+  """Returns the set fields of a `__slots__` object, like `__dict__` would."""
+  return {k: getattr(obj, k) for k in obj.__slots__ if not k.startswith('_')}
+
 class Storage:
+  __slots__ = (
+    'size', 'compute', 'material', 'tensors', 'ref_int', 'ref_ext', 'pinned',
+    'root_id',
+    # runtime state, see the runtimes and heuristics using each field
+    'last_access', 'last_access_int', 'last_evict', 'banished',
+    'evicted_dependents', 'region', 'region_rev', 'ecn', 'evicted_adjacent',
+    '_meta'
+  )
+
   def __init__(self, size : int, material=False):
     """
     Invariant: tensors[0] == root
@@ -13,7 +27,24 @@ class Storage:
     self.ref_ext = 0
     self.pinned = False
     self.root_id = None
-    self.meta = {}
+
+    self.last_access : float = -math.inf
+    self.last_access_int : float = -math.inf
+    self.last_evict : float = -math.inf
+    self.banished = False
+    self.evicted_dependents : set = None
+    self.region = None
+    self.region_rev = None
+    self.ecn = None
+    self.evicted_adjacent : set = None
+    self._meta = None
+
+  @property
+  def meta(self) -> dict:
+    """Ad-hoc metadata, created on first use."""
+    if self._meta is None:
+      self._meta = {}
+    return self._meta
 
   def get_compute(self) -> float:
     """
@@ -30,25 +61,43 @@ class Storage:
     return compute
 
   def __repr__(self):
-    s_dict = dict(self.__dict__)
+    s_dict = _slots_dict(self)
     s_dict['tensors'] = list(map(lambda t: t.name, self.tensors))
+    if self.evicted_adjacent is not None:
+      s_dict['evicted_adjacent'] = sorted(map(lambda n: n.root_id, self.evicted_adjacent))
     return str(s_dict)
 
+  @staticmethod
+  def neighbors(s : 'Storage', tel : 'Telemetry'):
+    """
+    Returns the other Storages that share an edge with `s`, material or not.
+    """
+    neighbors = set()
+    accesses = 0
+    for t in s.tensors:
+      for u in t.parents + t.children:
+        accesses += 1
+        if u.storage.root_id != s.root_id:
+          neighbors.add(u.storage)
+    tel.summary['heuristic_access_count'] += accesses
+    return neighbors
+
   @staticmethod
   def evicted_neighbors(s : 'Storage', tel : 'Telemetry'):
     neighbors = set()
     for t in s.tensors:
+      tel.summary['heuristic_access_count'] += len(t.parents) + len(t.children)
       for ps in map(lambda p: p.storage, t.parents):
-        tel.summary['heuristic_access_count'] += 1
         if not ps.material and ps.root_id != s.root_id:
           neighbors.add(ps)
       for cs in map(lambda c: c.storage, t.children):
-        tel.summary['heuristic_access_count'] += 1
         if not cs.material and cs.root_id != s.root_id:
           neighbors.add(cs)
     return neighbors
 
 class Operator:
+  __slots__ = ('compute', 'sizes', 'aliases', 'name', 'total_size', 'outputs')
+
   def __init__(self, compute : float, sizes : Tuple[int], aliases : Tuple[int], name=None):
     """
     Represents an operator that produces a tuple of len(sizes) Tensors, taking
@@ -73,9 +122,14 @@ class Operator:
       if aliases[i] != -1: assert sizes[i] == 0
 
   def __repr__(self):
-    return str(self.__dict__)
+    return str(_slots_dict(self))
 
 class Tensor:
+  __slots__ = (
+    'parents', 'siblings', 'children', 'index', 'op', 'storage', 'defined',
+    'id', 'op_id', 'name', 'is_alias', 'ref_ext', '_meta'
+  )
+
   def __init__(self, parents, op : Operator, index : int, storage : Storage,
                op_id : int, tensor_id : int, name : str = None):
     self.parents  = parents.copy()
@@ -88,7 +142,7 @@ class Tensor:
     self.id       = tensor_id
     self.op_id    = op_id
     self.name     = name if name != None else 'x{}'.format(self.id)
-    self.meta     = {}
+    self._meta    = None
 
     # NOTE: we assume every created Tensor has 1 external/model ref initially
     assert self not in self.storage.tensors
@@ -102,11 +156,18 @@ class Tensor:
     self.storage.get_compute()  # update cached storage_compute
 
     # initialize helpful metadata
-    self.meta['is_alias'] = self.id != self.storage.root_id
-    self.meta['ref_ext'] = 1
+    self.is_alias = self.id != self.storage.root_id
+    self.ref_ext = 1
+
+  @property
+  def meta(self) -> dict:
+    """Ad-hoc metadata, created on first use."""
+    if self._meta is None:
+      self._meta = {}
+    return self._meta
 
   def __repr__(self):
-    s_dict = dict(self.__dict__)
+    s_dict = _slots_dict(self)
     s_dict['parents'] = list(map(lambda p: p.name, self.parents))
     s_dict['siblings'] = list(map(lambda s: s.name, self.siblings))
     s_dict['children'] = list(map(lambda c: c.name, self.children))
@@ -1,3 +1,4 @@
+import os
 import pickle
 import json
 import time
@@ -8,6 +9,7 @@ import cProfile
 from simrd.runtime import *
 from simrd.heuristic import *
 from simrd.parse import parse_file
+from simrd.telemetry import load_tables
 
 from simrd_experiments.util import ensure_path, get_output_dir, date_string
 from simrd_experiments.execution_analysis.trace import *
@@ -77,6 +79,8 @@ def dump_run(rt, result, pr, analysis_dir=None):
   with open(analysis_dir + '/runtime.bin', 'wb') as pf:
     rt._prepickle()
     pickle.dump(rt, pf)
+  if rt.stats:
+    rt.telemetry.save(analysis_dir + '/telemetry.npz')
 
   with open(analysis_dir + '/result.json', 'w') as jf:
     jf.write(json.dumps(result, indent=2))
@@ -180,14 +184,13 @@ def dump_run(rt, result, pr, analysis_dir=None):
 #   return basename
 
 def dump_csv(analysis_dir):
-  with open(analysis_dir + '/runtime.bin', 'rb') as pf:
-    rt = pickle.load(pf)
-    df = pd.DataFrame(rt.telemetry.tensor.values(), columns=Telemetry.TENSOR_STATS)
-    df.to_csv(analysis_dir + '/tensor.csv')
-    df = pd.DataFrame(rt.telemetry.storage.values(), columns=Telemetry.STORAGE_STATS)
-    df.to_csv(analysis_dir + '/storage.csv')
-    df = pd.DataFrame(rt.telemetry.operator.values(), columns=Telemetry.OPERATOR_STATS)
-    df.to_csv(analysis_dir + '/operator.csv')
+  if os.path.exists(analysis_dir + '/telemetry.npz'):
+    tables = load_tables(analysis_dir + '/telemetry.npz')
+  else:
+    with open(analysis_dir + '/runtime.bin', 'rb') as pf:
+      tables = pickle.load(pf).telemetry.tables()
+  for name in Telemetry.TABLES:
+    tables[name].to_csv(analysis_dir + '/{}.csv'.format(name))
 
 def analyze_memory(analysis_dir, start=0, end=None, render=True):
   with open(analysis_dir + '/runtime.bin', 'rb') as pf:
@@ -0,0 +1,115 @@
+import sys
+from collections import defaultdict
+
+from simrd.tensor import Storage
+from simrd.runtime import *
+from simrd.heuristic import *
+from simrd.heuristic.ablation import *
+from simrd.optimization import EqClassNode
+from simrd.parse import parse_file
+
+from simrd_experiments.eval.models import MANIFEST
+
+"""
+Compares the approximate EqClasses of `RuntimeV2Optimized` (which are never
+split when a member is rematerialized) with exact ones (`exact_eq_class`) on
+the simulated eval models. For the approximation, reports the relative error of
+the EqClass cost (a Storage's compute plus that of its evicted neighborhood) of
+every evictable Storage, measured before every eviction against the exact
+evicted components; then compares the results of running with either.
+"""
+
+EQ_HEURISTICS = [DTREqClass(), AbEqSize(), AbEqStale(), AbEq()]
+RATIOS = [0.25, 0.5]
+
+class _Summary:
+  def __init__(self):
+    self.summary = defaultdict(int)
+
+def eq_class_errors(rt):
+  """
+  Returns the relative errors of the approximate EqClass costs of the Storages
+  in `rt.storage_pool`.
+  """
+  tel = _Summary()  # don't count these accesses
+  label = {}
+  computes = []
+  for t in rt.tensor_map.values():
+    s = t.storage
+    if s.material or s.last_evict == -math.inf or s in label:
+      continue
+    label[s] = len(computes)
+    compute = 0
+    stack = [s]
+    while stack:
+      u = stack.pop()
+      compute += u.compute
+      for n in Storage.evicted_neighbors(u, tel):
+        if n.last_evict > -math.inf and n not in label:
+          label[n] = label[s]
+          stack.append(n)
+    computes.append(compute)
+
+  errors = []
+  for s in rt.storage_pool:
+    ns = Storage.evicted_neighbors(s, tel)
+    approx = s.compute + sum(map(lambda cpi: cpi.compute,
+                                 set(map(lambda n: EqClassNode.get_value(n.ecn), ns))))
+    exact = s.compute + sum(map(lambda c: computes[c],
+                                set(label[n] for n in ns if n in label)))
+    if exact > 0:
+      errors.append(abs(approx - exact) / exact)
+  return errors
+
+class _ErrorRuntime(RuntimeV2EagerOptimized):
+  def __init__(self, budget, heuristic, **kwargs):
+    super().__init__(budget, heuristic, **kwargs)
+    self.errors = []
+
+  def _evict(self, s):
+    self.errors.extend(eq_class_errors(self))
+    super()._evict(s)
+
+def run_eq_class(callback, budget, remat_limit, heuristic, exact):
+  runtime = RuntimeV2EagerOptimized if exact else _ErrorRuntime
+  rt = runtime(budget, heuristic, remat_limit=remat_limit, exact_eq_class=exact)
+  try:
+    callback(rt)
+  except (MemoryError, RematExceededError):
+    pass
+  return rt
+
+def compare_eq_classes(models=None, heuristics=EQ_HEURISTICS, ratios=RATIOS):
+  models = MANIFEST.values() if models is None else models
+  print('{:<24} {:<12} {:>5} {:>10} {:>10} {:>10} {:>14} {:>14}'.format(
+    'model', 'heuristic', 'ratio', 'mean err.', 'max err.', 'frac. err.',
+    'approx. remat', 'exact remat'
+  ))
+  for model in models:
+    with open(model['log'], 'r') as log_f:
+      callback = parse_file(log_f, start=model['has_start']).get_closure()
+    rt = RuntimeV1(math.inf, Heuristic(), stats=False, trace=False)
+    callback(rt)
+    baseline_memory = rt.telemetry.summary['max_memory']
+    remat_limit = rt.telemetry.summary['model_compute']
+
+    for heuristic in heuristics:
+      for ratio in ratios:
+        budget = int(baseline_memory * ratio)
+        results = []
+        for exact in [False, True]:
+          rt = run_eq_class(callback, budget, remat_limit, heuristic, exact)
+          results.append('fail' if rt.OOM or rt.remat_exceeded else \
+                         str(rt.telemetry.summary['remat_compute']))
+          if not exact:
+            errors = rt.errors
+        n = max(len(errors), 1)
+        print('{:<24} {:<12} {:>5} {:>10.4f} {:>10.4f} {:>10.4f} {:>14} {:>14}'.format(
+          model['name'], type(heuristic).__name__, ratio,
+          sum(errors) / n, max(errors, default=0),
+          sum(1 for e in errors if e > 0) / n, *results
+        ), flush=True)
+
+if __name__ == '__main__':
+  sys.setrecursionlimit(1000000000)
+  compare_eq_classes()
@@ -2,6 +2,7 @@ from simrd.heuristic import *
 from simrd.heuristic.ablation import *
 
 PARETO_MOD = 'eval/pareto-all'
+CACHE_MOD = 'eval/graph-cache'  # parsed logs, see `parse_file_cached`
 PAPER_PARETO_HEURISTICS = [
   DTR(), DTREqClass(), DTRLocal(), MSPS(), LRU(), LargestStorage(), RandomStorage()
 ]
@@ -6,42 +6,24 @@ from datetime import datetime
 from simrd.runtime import *
 from simrd.heuristic import *
 from simrd.heuristic.ablation import *
-from simrd.parse import parse_file, GRelease
+from simrd.parse import parse_file_cached
 
-from ...pareto import pareto
+from ...pareto import pareto, Sweep, SweepTask, SweepResult
 from ...util import get_output_dir, ensure_path, date_string
 
 from ...eval import models as _models
 from .definitions import *
 
-def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
-               num_trials=1, verbose=True, **kwargs):
-  config = {
-    'model': model,
-    'heuristic': type(heuristic).__name__,
-    'heuristic_features': list(heuristic.FEATURES),
-    'ratios': ratios,
-    'overhead_limit': overhead_limit,
-    'runtime': runtime.ID,
-    'runtime_features': list(runtime.FEATURES),
-    'kwargs': kwargs
-  }
-
-  if verbose:
-    print('starting pareto trial for config: {}...'.format(json.dumps(config, indent=2)))
-  else:
-    # we're probably running the full eval, let's say which heuristic
-    print('  - running heuristic {}...'.format(type(heuristic).__name__), end='', flush=True)
-
+def _load_baseline(model, config, verbose):
+  """
+  Returns the `Topology` of the `model`'s log, recording the baseline stats of
+  running it with an infinite budget in `config`.
+  """
   # get log executor callback
   log_path = model['log']
   if verbose: print('parsing log [{}]...'.format(log_path))
-  graph = None
-  callback = None
-  with open(log_path, 'r') as log_f:
-    graph = parse_file(log_f, start=model['has_start'])
-    callback = graph.get_closure()
-  assert callback is not None
+  topology = parse_file_cached(log_path, get_output_dir(CACHE_MOD), start=model['has_start'])
+  callback = topology.run
   if verbose: print('  done.')
 
   # run model with infinite budget to get baseline memory usage
@@ -64,6 +46,45 @@ def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
   config['baseline_memory'] = baseline_memory
   config['baseline_const'] = baseline_const
   config['baseline_bottleneck'] = baseline_bottleneck
+  return topology
+
+def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
+               num_trials=1, verbose=True, fork_at_divergence=False, sweep=None,
+               prune=True, verify=0.0, **kwargs):
+  """
+  Runs the budgets (and trials) on the workers of `sweep`, or of a new `Sweep`
+  if not given. With `prune`, once a budget fails the smaller budgets of its
+  trial are inferred to fail instead of being run, verifying a `verify`
+  fraction of them (see `Sweep.map`). With `fork_at_divergence` (POSIX only),
+  each trial instead forks its budgets off a shared prefix, see
+  `pareto_forked`.
+  """
+  if sweep is None and not fork_at_divergence:
+    with Sweep() as sweep:
+      return run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
+                        num_trials, verbose, fork_at_divergence, sweep, prune, verify,
+                        **kwargs)
+
+  config = {
+    'model': model,
+    'heuristic': type(heuristic).__name__,
+    'heuristic_features': list(heuristic.FEATURES),
+    'ratios': ratios,
+    'overhead_limit': overhead_limit,
+    'prune': prune and not fork_at_divergence,
+    'runtime': runtime.ID,
+    'runtime_features': list(runtime.FEATURES),
+    'kwargs': kwargs
+  }
+
+  if verbose:
+    print('starting pareto trial for config: {}...'.format(json.dumps(config, indent=2)))
+  else:
+    # we're probably running the full eval, let's say which heuristic
+    print('  - running heuristic {}...'.format(type(heuristic).__name__), end='', flush=True)
+
+  topology = _load_baseline(model, config, verbose)
+  baseline_memory, baseline_compute = config['baseline_memory'], config['baseline_compute']
 
   # run pareto, record results
   budgets = [int(baseline_memory * r) for r in ratios]
@@ -75,6 +96,7 @@ def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
     'budget': budgets[i],
     'OOM': [],
     'remat_exceeded': [],
+    'inferred': [],
     'meta': None,
     'total_time': [],
     'overhead': [],
@@ -84,25 +106,39 @@ def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
   } for i in range(len(ratios))]
 
   if kwargs.get('no_dealloc', False):
-    schedule = []
-    for op in graph.schedule:
-      if isinstance(op, GRelease):
-        continue
-      schedule.append(op)
-    graph.schedule = schedule
-    callback = graph.get_closure()
-
-  # average numerical values over trials, pick the last meta (or the first that fails)
-  for trial in range(num_trials):
-    rts = pareto(callback, budgets, heuristic, runtime, verbose=verbose, \
-      remat_limit=remat_limit, trace=False, stats=False, **kwargs)
-    for i, rt in enumerate(rts):
-      results[i]['OOM'].append(rt.OOM)
-      results[i]['remat_exceeded'].append(rt.remat_exceeded)
-      results[i]['total_time'].append(rt.meta['total_time'])
-      results[i]['overhead'].append(rt.clock / baseline_compute)
-      results[i]['heuristic_eval_count'].append(rt.telemetry.summary['heuristic_eval_count'])
-      results[i]['heuristic_access_count'].append(rt.telemetry.summary['heuristic_access_count'])
+    topology = topology.without_releases()
+  rt_kwargs = dict(remat_limit=remat_limit, summary_only=True, **kwargs)
+
+  if fork_at_divergence:
+    trials = []
+    for trial in range(num_trials):
+      rts = pareto(topology.run, budgets, heuristic, runtime, verbose=verbose, \
+        fork_at_divergence=True, **rt_kwargs)
+      trials.append([SweepResult.of(rt) for rt in rts])
+  else:
+    # every trial of every budget at once, so they share the workers
+    source = sweep.publish(topology)
+    records = sweep.map([
+      SweepTask(source, budget, heuristic, runtime, rt_kwargs, group=trial)
+      for trial in range(num_trials) for budget in budgets
+    ], verbose=verbose, prune=prune, verify=verify)
+    trials = [records[i:i + len(budgets)] for i in range(0, len(records), len(budgets))]
+
+  # average numerical values over trials, pick the last meta (or the first that fails);
+  # inferred failures have no numerical values
+  for records in trials:
+    for i, r in enumerate(records):
+      results[i]['OOM'].append(r.OOM)
+      results[i]['remat_exceeded'].append(r.remat_exceeded)
+      results[i]['inferred'].append(r.inferred)
+      results[i]['total_time'].append(r.total_time)
+      results[i]['overhead'].append(r.clock / baseline_compute if not r.inferred else None)
+      results[i]['heuristic_eval_count'].append(
+        r.summary['heuristic_eval_count'] if not r.inferred else None
+      )
+      results[i]['heuristic_access_count'].append(
+        r.summary['heuristic_access_count'] if not r.inferred else None
+      )
 
   out_file = '{}-{}-{}.json'.format(date_string(), model['name'], type(heuristic).__name__)
   out_path = base_dir + '/' + out_file
@@ -119,10 +155,113 @@ def run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit,
 
   return out_path
 
-def run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, **kwargs):
+def run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit,
+                          sweep=None, **kwargs):
+  if sweep is None and not kwargs.get('fork_at_divergence', False):
+    with Sweep() as sweep:
+      return run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime,
+                                   overhead_limit, sweep, **kwargs)
+
   for heuristic in heuristics:
     num_trials = heuristic.TRIALS
-    run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit, num_trials, **kwargs)
+    run_pareto(base_dir, model, heuristic, ratios, runtime, overhead_limit, num_trials,
+               sweep=sweep, **kwargs)
+
+def run_pareto_search(base_dir, model, heuristic, runtime, overhead_limit, verbose=True,
+                      sweep=None, ratio_tol=0.01, overhead_tol=0.05, max_refine=16, **kwargs):
+  """
+  Like `run_pareto`, but instead of a fixed grid of ratios, searches for the
+  smallest ratio at which `heuristic` completes within `overhead_limit` (to
+  within `ratio_tol`, see `Sweep.min_budget`), then adds up to `max_refine`
+  ratios where the overhead changes by more than `overhead_tol` between
+  neighbouring ratios (see `Sweep.refine`), which is usually near the knee of
+  the curve. Runs a single trial.
+
+  The results have the format of `run_pareto`'s, with one entry per ratio that
+  ran, plus a `search` entry with the bracket of the smallest ratio and, for
+  each completed ratio, how much higher the overhead may be before the next
+  smaller ratio that ran.
+  """
+  if sweep is None:
+    with Sweep() as sweep:
+      return run_pareto_search(base_dir, model, heuristic, runtime, overhead_limit, verbose,
+                               sweep, ratio_tol, overhead_tol, max_refine, **kwargs)
+
+  config = {
+    'model': model,
+    'heuristic': type(heuristic).__name__,
+    'heuristic_features': list(heuristic.FEATURES),
+    'ratio_tol': ratio_tol,
+    'overhead_tol': overhead_tol,
+    'max_refine': max_refine,
+    'overhead_limit': overhead_limit,
+    'runtime': runtime.ID,
+    'runtime_features': list(runtime.FEATURES),
+    'kwargs': kwargs
+  }
+
+  if verbose:
+    print('starting pareto search for config: {}...'.format(json.dumps(config, indent=2)))
+  else:
+    print('  - searching heuristic {}...'.format(type(heuristic).__name__), end='', flush=True)
+
+  topology = _load_baseline(model, config, verbose)
+  baseline_memory, baseline_compute = config['baseline_memory'], config['baseline_compute']
+  remat_limit = baseline_compute * (overhead_limit - 1)
+  assert remat_limit >= 0
+
+  if kwargs.get('no_dealloc', False):
+    topology = topology.without_releases()
+  task = SweepTask(sweep.publish(topology), baseline_memory, heuristic, runtime,
+                   dict(remat_limit=remat_limit, summary_only=True, **kwargs))
+
+  # the baseline budget never needs to evict, and nothing runs in no memory
+  (top,) = sweep.map([task], verbose=verbose)
+  assert not top.failed()
+  tol = max(1, int(baseline_memory * ratio_tol))
+  lo, hi, probes = sweep.min_budget(task, 0, baseline_memory, tol, verbose=verbose)
+  overhead = lambda r: r.clock / baseline_compute
+  records = sweep.refine(task, probes + [top], overhead, tol, overhead_tol, max_refine,
+                         verbose=verbose)
+
+  results = [{
+    'ratio': r.budget / baseline_memory,
+    'budget': r.budget,
+    'OOM': [r.OOM],
+    'remat_exceeded': [r.remat_exceeded],
+    'inferred': [False],
+    'meta': None,
+    'total_time': [r.total_time],
+    'overhead': [overhead(r)],
+    'heuristic_eval_count': [r.summary['heuristic_eval_count']],
+    'heuristic_access_count': [r.summary['heuristic_access_count']],
+    'num_trials': 1
+  } for r in records]
+  config['ratios'] = [res['ratio'] for res in results]
+
+  frontier = [r for r in records if r.budget >= hi and not r.failed()]
+  search = {
+    'min_ratio': {'lower': lo / baseline_memory, 'upper': hi / baseline_memory},
+    'frontier': [{
+      'ratio': r.budget / baseline_memory,
+      'overhead': overhead(r),
+      # the overhead at the next smaller completed ratio, or the limit
+      'overhead_error': (overhead(prev) if i > 0 else overhead_limit) - overhead(r)
+    } for i, (prev, r) in enumerate(zip([None] + frontier, frontier))],
+    'runs': len(records)
+  }
+
+  out_file = '{}-{}-{}-search.json'.format(date_string(), model['name'], type(heuristic).__name__)
+  out_path = base_dir + '/' + out_file
+  ensure_path(base_dir)
+
+  with open(out_path, 'w') as out_f:
+    out_f.write(json.dumps({'config': config, 'results': results, 'search': search}, indent=2))
+
+  if verbose: print('-> done, saved to [{}]'.format(out_path))
+  else: print('done', flush=True)
+
+  return out_path
 
 def run_pareto_paper(models=None, output_dir=None):
   ratios = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
@@ -135,16 +274,41 @@ def run_pareto_paper(models=None, output_dir=None):
     output_dir = get_output_dir(PARETO_MOD)
 
   base_dirs = []
-  for model in models:
-    print('running simulated pareto evaluation for {}...'.format(model['name']))
-    base_dir = output_dir + '/' + date_string() + '-' + model['name']
-    t = time.time()
-    run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, verbose=False)
-    print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
-    base_dirs.append(base_dir)
+  with Sweep() as sweep:
+    for model in models:
+      print('running simulated pareto evaluation for {}...'.format(model['name']))
+      base_dir = output_dir + '/' + date_string() + '-' + model['name']
+      t = time.time()
+      run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, \
+        verbose=False, sweep=sweep)
+      print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
+      base_dirs.append(base_dir)
   
   return base_dirs
 
+def run_pareto_search_paper(models=None, output_dir=None):
+  overhead_limit = 2.0
+  heuristics = PAPER_PARETO_HEURISTICS
+  runtime = RuntimeV2EagerOptimized
+  if models is None:
+    models = _models.MANIFEST.values()
+  if output_dir is None:
+    output_dir = get_output_dir(PARETO_MOD)
+
+  base_dirs = []
+  with Sweep() as sweep:
+    for model in models:
+      print('running simulated pareto search for {}...'.format(model['name']))
+      base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-search'
+      t = time.time()
+      for heuristic in heuristics:
+        run_pareto_search(base_dir, model, heuristic, runtime, overhead_limit, verbose=False,
+                          sweep=sweep)
+      print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
+      base_dirs.append(base_dir)
+
+  return base_dirs
+
 def run_ablation_paper(models=None, output_dir=None):
   ratios = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
   overhead_limit = 2.0
@@ -156,14 +320,15 @@ def run_ablation_paper(models=None, output_dir=None):
     output_dir = get_output_dir(PARETO_MOD)
 
   base_dirs = []
-  for model in models:
-    print('running simulated ablation evaluation for {}...'.format(model['name']))
-    base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-ablate'
-    t = time.time()
-    run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, \
-      verbose=True)
-    print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
-    base_dirs.append(base_dir)
+  with Sweep() as sweep:
+    for model in models:
+      print('running simulated ablation evaluation for {}...'.format(model['name']))
+      base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-ablate'
+      t = time.time()
+      run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, \
+        verbose=True, sweep=sweep)
+      print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
+      base_dirs.append(base_dir)
 
   return base_dirs
 
@@ -176,15 +341,19 @@ def run_banishing_paper(models=None, output_dir=None):
     output_dir = get_output_dir(PARETO_MOD)
 
   base_dirs = []
-  for model in models:
-    print('running simulated banishing evaluation for {}...'.format(model['name']))
-    base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-banish'
-    t = time.time()
-    run_pareto(base_dir, model, DTRUnopt(), ratios, RuntimeV1, overhead_limit, verbose=True)
-    run_pareto(base_dir, model, DTR(), ratios, RuntimeV2EagerOptimized, overhead_limit, verbose=True)
-    run_pareto(base_dir, model, DTR(), ratios, RuntimeV2EagerOptimized, overhead_limit, verbose=True, no_dealloc=True)
-    print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
-    base_dirs.append(base_dir)
+  with Sweep() as sweep:
+    for model in models:
+      print('running simulated banishing evaluation for {}...'.format(model['name']))
+      base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-banish'
+      t = time.time()
+      run_pareto(base_dir, model, DTRUnopt(), ratios, RuntimeV1, overhead_limit, verbose=True, \
+        sweep=sweep)
+      run_pareto(base_dir, model, DTR(), ratios, RuntimeV2EagerOptimized, overhead_limit, \
+        verbose=True, sweep=sweep)
+      run_pareto(base_dir, model, DTR(), ratios, RuntimeV2EagerOptimized, overhead_limit, \
+        verbose=True, no_dealloc=True, sweep=sweep)
+      print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
+      base_dirs.append(base_dir)
 
   return base_dirs
 
@@ -199,13 +368,14 @@ def run_accesses_paper(models=None, output_dir=None):
     output_dir = get_output_dir(PARETO_MOD)
 
   base_dirs = []
-  for model in models:
-    print('running simulated access overhead evaluation for {}...'.format(model['name']))
-    base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-access'
-    t = time.time()
-    run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, \
-      verbose=True)
-    print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
-    base_dirs.append(base_dir)
+  with Sweep() as sweep:
+    for model in models:
+      print('running simulated access overhead evaluation for {}...'.format(model['name']))
+      base_dir = output_dir + '/' + date_string() + '-' + model['name'] + '-access'
+      t = time.time()
+      run_pareto_heuristics(base_dir, model, heuristics, ratios, runtime, overhead_limit, \
+        verbose=True, sweep=sweep)
+      print('  done, saved to [{}], took {} seconds.'.format(base_dir, time.time() - t))
+      base_dirs.append(base_dir)
 
   return base_dirs
@@ -0,0 +1,60 @@
+import sys
+import time
+
+from simrd.runtime import *
+from simrd.heuristic import *
+from simrd.heuristic.ablation import *
+from simrd.parse import parse_file
+
+from simrd_experiments.eval.models import MANIFEST
+
+"""
+Benchmark of incremental Region maintenance (`Region.shrink`) against
+rebuilding every affected Region after a rematerialization, on the simulated
+eval models. Both run the same simulation, so everything but the
+`heuristic_access_count` and the time taken must agree.
+"""
+
+REGION_HEURISTICS = [DTR(), AbE(), AbESize()]
+RATIOS = [0.25, 0.5]
+
+def run_regions(model, heuristic, ratio, incremental):
+  with open(model['log'], 'r') as log_f:
+    callback = parse_file(log_f, start=model['has_start']).get_closure()
+
+  rt = RuntimeV1(math.inf, Heuristic(), stats=False, trace=False)
+  callback(rt)
+  budget = int(rt.telemetry.summary['max_memory'] * ratio)
+  remat_limit = rt.telemetry.summary['model_compute']
+
+  rt = RuntimeV2EagerOptimized(budget, heuristic, remat_limit=remat_limit,
+                               incremental_regions=incremental)
+  t = time.time()
+  try:
+    callback(rt)
+  except (MemoryError, RematExceededError):
+    pass
+  summary = rt.telemetry.summary
+  result = (rt.clock, summary['remat_compute'], rt.OOM, rt.remat_exceeded,
+            summary['heuristic_eval_count'])
+  return result, summary['heuristic_access_count'], time.time() - t
+
+def bench_regions(models=None, heuristics=REGION_HEURISTICS, ratios=RATIOS):
+  models = MANIFEST.values() if models is None else models
+  print('{:<24} {:<10} {:>5} {:>14} {:>14} {:>8} {:>8}'.format(
+    'model', 'heuristic', 'ratio', 'rebuild acc.', 'shrink acc.', 'rebuild', 'shrink'
+  ))
+  for model in models:
+    for heuristic in heuristics:
+      for ratio in ratios:
+        res_r, acc_r, t_r = run_regions(model, heuristic, ratio, incremental=False)
+        res_s, acc_s, t_s = run_regions(model, heuristic, ratio, incremental=True)
+        assert res_r == res_s, \
+          'incremental Regions changed the simulation: {} vs {}'.format(res_r, res_s)
+        print('{:<24} {:<10} {:>5} {:>14} {:>14} {:>7.1f}s {:>7.1f}s'.format(
+          model['name'], type(heuristic).__name__, ratio, acc_r, acc_s, t_r, t_s
+        ), flush=True)
+
+if __name__ == '__main__':
+  sys.setrecursionlimit(1000000000)
+  bench_regions()
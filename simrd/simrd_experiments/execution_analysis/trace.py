@@ -2,7 +2,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from graphviz import Digraph
-from simrd.telemetry import Telemetry
+from simrd.telemetry import Telemetry, Trace
 
 TRACE_STATS = [
   'time', 'pinned_memory', 'locked_memory', 'evictable_memory', 'total_memory', 'memory_pressure'
@@ -16,7 +16,7 @@ class State:
     self.pending   = set()
     self.pinned    = set()
     self.banished  = set()
-    self.timesteps = sorted(telemetry.trace.timesteps)
+    self.steps     = telemetry.trace.steps()  # streamed, one time at a time
     self.time_idx  = -1
     self.time      = 0
     self.pressure  = 0
@@ -44,11 +44,19 @@ class State:
       self.storage_groups[storage_id].append(tid)
 
   def _step(self):
-    if self.time_idx + 1 >= len(self.timesteps):
+    # skip times with only pressure events, which are not steps
+    for time, events in self.steps:
+      kinds = events['kind']
+      if (kinds != Trace.KINDS['pressure']).any():
+        break
+    else:
       return False
 
     self.time_idx += 1
-    self.time = self.timesteps[self.time_idx]
+    self.time = time
+    trace = {}  # map field -> List[id], at this time
+    for field, kind in Trace.KINDS.items():
+      trace[field] = events['id'][kinds == kind].tolist()
 
     # A tensor cannot be evicted *and then* computed on the same timestep,
     # only computed then evicted. Thus, we can set computed = computed \ evicted.
@@ -61,30 +69,30 @@ class State:
     # locked /\ pinned = empty
 
     # add new material tensors
-    compute = self.telemetry.trace.compute.get(self.time, [])
+    compute = trace['compute']
     self.material.update(compute)
     self.evicted.difference_update(compute)
     self.pending.difference_update(compute)
     self.uncomputed.difference_update(compute)
 
     # add new evicted and banished tensors
-    for sid in self.telemetry.trace.evict.get(self.time, []):
+    for sid in trace['evict']:
       self.evicted.update(self.storage_groups[sid])
-    for sid in self.telemetry.trace.banish.get(self.time, []):
+    for sid in trace['banish']:
       self.evicted.update(self.storage_groups[sid])
       self.banished.update(self.storage_groups[sid])
 
     # add new pending tensors
-    self.pending.update(self.telemetry.trace.pending.get(self.time, []))
+    self.pending.update(trace['pending'])
 
     # update pinned, locked; a lock can only be locked after being unlocked at
     # the same timestep, *assuming computations take nonzero time*
-    for sid in self.telemetry.trace.unlock.get(self.time, []):
+    for sid in trace['unlock']:
       self.locked.difference_update(self.storage_groups[sid])
-    for sid in self.telemetry.trace.lock.get(self.time, []):
+    for sid in trace['lock']:
       self.locked.update(self.storage_groups[sid])
 
-    for sid in self.telemetry.trace.pin.get(self.time, []):
+    for sid in trace['pin']:
       self.pinned.update(self.storage_groups[sid])
 
     self.material.difference_update(self.evicted)
@@ -102,7 +110,8 @@ class State:
       if sid in self.pinned:
         self.pinned.add(tid)
 
-    self.pressure = self.telemetry.trace.pressure.get(self.time, 0)
+    pressure = events['value'][kinds == Trace.KINDS['pressure']]
+    self.pressure = pressure[-1].item() if len(pressure) > 0 else 0
 
     assert len(self.material.intersection(self.evicted)) == 0
     assert len(self.banished.intersection(self.evicted)) == len(self.banished)
@@ -226,10 +235,8 @@ def analyze_max_pinned(tel : Telemetry, filename, render_graph=False):
     if s.time_idx == max_pinned_step:
       if render_graph:
         s.render_dot(filename)
-      pinned_data = []
-      for tid in s.pinned:
-        pinned_data.append(s.telemetry.tensor[tid])
-      stats = pd.DataFrame(pinned_data, columns=Telemetry.TENSOR_STATS)
+      stats = s.telemetry.tensor.dataframe()
+      stats = stats[stats['id'].isin(s.pinned)]
   return stats
 
 def analyze_max_locked(tel : Telemetry, filename, render_graph=False):
@@ -252,10 +259,8 @@ def analyze_max_locked(tel : Telemetry, filename, render_graph=False):
     if s.time_idx == max_locked_step:
       if render_graph:
         s.render_dot(filename)
-      pinned_data = []
-      for tid in s.pinned:
-        pinned_data.append(s.telemetry.tensor[tid])
-      stats = pd.DataFrame(pinned_data, columns=Telemetry.TENSOR_STATS)
+      stats = s.telemetry.tensor.dataframe()
+      stats = stats[stats['id'].isin(s.pinned)]
   return stats
 
 def memory_analysis(tel : Telemetry, stats : pd.DataFrame, start=0, end=None):
@@ -1,38 +1,65 @@
+import math, os, sys, pickle, queue, random, shutil, tempfile
 import time
-from typing import List
+from typing import List, Union, Callable, Optional, Hashable
 
+import attr
 from pathos.multiprocessing import ProcessPool as Pool
+import multiprocessing
 from multiprocessing import cpu_count
 
 from simrd.heuristic import *
 from simrd.runtime import *
 from simrd.telemetry import Telemetry
+from simrd.parse import Topology
 
 import simrd_experiments.util as util
 
-def pareto(callback, budgets : List[float], heuristic, runtime, verbose=True, **kwargs):
+class SweepCancelled(Exception):
+  pass
+
+def _run(callback, rt, t):
+  """
+  Runs `callback` on `rt`, recording the time taken since `t` in `rt.meta`, and
+  prepares `rt` for pickling. Returns a description of the result.
+  """
+  result = 'pass'
+  try:
+    callback(rt)
+  except MemoryError:
+    result = 'fail (OOM)'
+  except RematExceededError:
+    result = 'fail (thrashed)'
+  except SweepCancelled:
+    result = 'cancelled'
+  except:
+    import traceback
+    traceback.print_exc()
+    print(flush=True)
+    raise
+  rt.meta['total_time'] = time.time() - t
+  rt._prepickle()
+  return result
+
+def pareto(callback, budgets : List[float], heuristic, runtime, verbose=True,
+           fork_at_divergence=False, **kwargs):
+  """
+  Runs `callback` on a `runtime` with `heuristic` for each of the `budgets`,
+  returning the finished runtimes (prepared for pickling) in the same order.
+
+  With `fork_at_divergence` (POSIX only), the budgets share the simulation of
+  their common prefix instead of each running from scratch; see
+  `pareto_forked`.
+  """
+  if fork_at_divergence:
+    return pareto_forked(callback, budgets, heuristic, runtime, verbose=verbose, **kwargs)
+
   def safe_callback(rt):
-    result = 'pass'
     t = time.time()
-    try:
-      callback(rt)
-    except MemoryError:
-      result = 'fail (OOM)'
-    except RematExceededError:
-      result = 'fail (thrashed)'
-    except:
-      import traceback
-      traceback.print_exc()
-      print(flush=True)
-      raise
-    total_time = time.time() - t
-    rt.meta['total_time'] = total_time
+    result = _run(callback, rt, t)
     if verbose:
       print('  budget {} finished in {} seconds: {}'.format(
-        rt.budget, total_time, result
+        rt.budget, rt.meta['total_time'], result
       ), flush=True)
-
-    rt._prepickle()
     return rt
 
   if verbose:
@@ -44,3 +71,364 @@ def pareto(callback, budgets : List[float], heuristic, runtime, verbose=True, **
   runtimes = p.map(safe_callback, runtimes)
 
   return runtimes
+
+def pareto_forked(callback, budgets : List[float], heuristic, runtime, verbose=True,
+                  processes=None, **kwargs):
+  """
+  Like `pareto`, but simulates the prefix that the budgets have in common only
+  once. A run only depends on its budget once it first needs to free memory,
+  so a single leader runtime executes `callback` and, at the point where the
+  run for a budget would first call `_free`, `os.fork`s a child that continues
+  with that budget. The child starts from exactly the state an independent run
+  would have, so the results are identical (except for `total_time`, which
+  includes the shared prefix). Budgets that are never exceeded finish with the
+  leader.
+
+  At most `processes` (default: the CPU count) children run at once; the
+  leader waits for one to finish before forking more.
+  """
+  if verbose:
+    print('running forked pareto trial for budgets: {}'.format(budgets), flush=True)
+  if processes is None:
+    processes = cpu_count()
+
+  pending = sorted(range(len(budgets)), key=lambda i: budgets[i])
+  paths = [None] * len(budgets)  # result files of forked children
+  children = {}                  # map pid -> budget index
+  child = None                   # budget index, in a forked child
+  t = time.time()
+
+  def reap(pid, status):
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+      raise RuntimeError('run for budget {} failed'.format(budgets[children[pid]]))
+    del children[pid]
+
+  rt = runtime(math.inf, heuristic, **kwargs)
+  free = rt._free
+
+  def diverge(size):
+    # The leader runs with the smallest pending budget, so a call here means
+    # that budget (and perhaps more) now needs to free memory.
+    nonlocal child
+    while pending and rt.memory_usage + size > budgets[pending[0]]:
+      i = pending.pop(0)
+      while len(children) >= processes:
+        reap(*os.wait())
+      fd, paths[i] = tempfile.mkstemp(prefix='simrd-pareto-')
+      os.close(fd)
+      sys.stdout.flush()
+      pid = os.fork()
+      if pid == 0:
+        child = i
+        pending.clear()
+        del rt._free
+        rt.budget = budgets[i]
+        return free(size)
+      children[pid] = i
+    rt.budget = budgets[pending[0]] if pending else math.inf
+
+  rt._free = diverge
+  rt.budget = budgets[pending[0]] if pending else math.inf
+
+  ok = False
+  try:
+    result = _run(callback, rt, t)
+    if child is not None:
+      with open(paths[child], 'wb') as f:
+        pickle.dump(rt, f)
+      if verbose:
+        print('  budget {} finished in {} seconds: {}'.format(
+          rt.budget, rt.meta['total_time'], result
+        ), flush=True)
+    ok = True
+  finally:
+    if child is not None:
+      os._exit(0 if ok else 1)
+
+  while children:
+    reap(*os.wait())
+
+  del rt._free
+  runtimes = [None] * len(budgets)
+  for i in range(len(budgets)):
+    if paths[i] is None:
+      # never needed to free memory, so identical to the leader's run
+      runtimes[i] = pickle.loads(pickle.dumps(rt))
+      runtimes[i].budget = budgets[i]
+      if verbose:
+        print('  budget {} finished in {} seconds: {} (no eviction)'.format(
+          budgets[i], rt.meta['total_time'], result
+        ), flush=True)
+    else:
+      with open(paths[i], 'rb') as f:
+        runtimes[i] = pickle.load(f)
+      os.remove(paths[i])
+
+  return runtimes
+
+@attr.s(auto_attribs=True)
+class SweepTask:
+  """
+  One simulation of a `Sweep`: `runtime(budget, heuristic, **kwargs)` running
+  `source`, which is either a key returned by `Sweep.publish` or a picklable
+  callback (e.g. a `functools.partial` of a module-level function). Tasks of
+  the same (non-None) `group` differ only in their budget, see `Sweep.map`.
+  """
+  source : Union[str, Callable]
+  budget : float
+  heuristic : 'Heuristic'
+  runtime : type
+  kwargs : dict = attr.attrib(factory=dict)
+  group : Optional[Hashable] = None
+
+@attr.s(auto_attribs=True)
+class SweepResult:
+  """
+  The part of a finished runtime that sweeps report. An `inferred` failure was
+  not (fully) run, so it only has the budget and the kind of failure.
+  """
+  budget : float
+  OOM : bool
+  remat_exceeded : bool
+  clock : Optional[int]
+  total_time : Optional[float]
+  summary : Optional[dict]
+  inferred : bool = False
+
+  @staticmethod
+  def of(rt) -> 'SweepResult':
+    return SweepResult(
+      rt.budget, rt.OOM, getattr(rt, 'remat_exceeded', False), rt.clock,
+      rt.meta['total_time'], dict(rt.telemetry.summary)
+    )
+
+  def failed(self) -> bool:
+    return self.OOM or self.remat_exceeded
+
+  def inferred_below(self, budget : float) -> 'SweepResult':
+    """Returns the inferred failure at `budget` (below this failure's)."""
+    assert self.failed() and budget <= self.budget
+    return SweepResult(budget, self.OOM, self.remat_exceeded, None, None, None, inferred=True)
+
+# per worker process, map key -> `Topology` loaded from a `Sweep`
+_topologies = {}
+# per worker process, the cancellation flags shared with the `Sweep`
+_cancelled = None
+
+def _init_worker(cancelled):
+  global _cancelled
+  _cancelled = cancelled
+
+def _callback(source):
+  if not isinstance(source, str):
+    return source
+  if source not in _topologies:
+    _topologies[source] = Topology.load(source)
+  return _topologies[source].run
+
+def _simulate(task : SweepTask, slot : int) -> (Optional[SweepResult], str):
+  rt = task.runtime(task.budget, task.heuristic, **task.kwargs)
+  compute = rt.compute
+  def compute_unless_cancelled(*args, **kwargs):
+    if _cancelled[slot]:
+      raise SweepCancelled()
+    return compute(*args, **kwargs)
+  rt.compute = compute_unless_cancelled
+  result = _run(_callback(task.source), rt, time.time())
+  return (SweepResult.of(rt) if result != 'cancelled' else None), result
+
+class Sweep:
+  """
+  A pool of long-lived worker processes for running many simulations, e.g. the
+  budgets of several pareto trials, heuristics and models.
+
+  Graphs are `publish`ed once as memory-mapped `Topology` directories, which
+  each worker loads the first time it needs them, so a task is only its budget,
+  heuristic, runtime and keyword arguments, and only a `SweepResult` is sent
+  back instead of the whole runtime. Use as a context manager, or `close`.
+  """
+  def __init__(self, processes : Optional[int] = None):
+    self.processes = processes if processes is not None else cpu_count()
+    self._dir = tempfile.mkdtemp(prefix='simrd-sweep-')
+    self._published = 0
+    # one cancellation flag per task in flight; keep twice as many tasks in
+    # flight as workers so none of them wait for the next task
+    self._cancelled = multiprocessing.RawArray('b', 2 * self.processes)
+    self._pool = multiprocessing.Pool(
+      self.processes, initializer=_init_worker, initargs=(self._cancelled,)
+    )
+
+  def publish(self, topology : Topology) -> str:
+    """Makes `topology` available to the workers, returning its key."""
+    key = os.path.join(self._dir, str(self._published))
+    self._published += 1
+    topology.save(key)
+    return key
+
+  def map(self, tasks : List[SweepTask], verbose=True, prune=False,
+          verify=0.0) -> List[SweepResult]:
+    """
+    Runs `tasks` on the workers, returning their results in order.
+
+    With `prune`, a task is assumed to fail whenever a task of its group with a
+    larger budget failed (by OOM or exceeding the remat limit), since memory
+    pressure only grows as the budget shrinks. Each group then runs from its
+    largest budget down, and once a budget fails, the smaller ones, pending or
+    already running, are cancelled and reported as inferred failures (of the
+    same kind). Each inferred failure is run anyway with probability `verify`,
+    warning if it passes.
+    """
+    order = list(range(len(tasks)))
+    if prune:
+      order.sort(key=lambda i: -tasks[i].budget)
+    pending = order[::-1]              # stack, next task last
+    results = [None] * len(tasks)
+    running = {}                       # map task index -> cancellation slot
+    slots = list(range(len(self._cancelled)))
+    failures = {}                      # map group -> largest failed result
+    checked = set()                    # inferred failures to run anyway
+    done = queue.Queue()
+
+    def inferred(i) -> Optional[SweepResult]:
+      task = tasks[i]
+      fail = failures.get(task.group) if task.group is not None else None
+      if fail is None or task.budget >= fail.budget or i in checked:
+        return None
+      if verify > 0 and random.random() < verify:
+        checked.add(i)
+        return None
+      return fail.inferred_below(task.budget)
+
+    def report(r : SweepResult, result : str = None):
+      if not verbose:
+        return
+      if r.inferred:
+        print('  budget {} inferred to fail'.format(r.budget), flush=True)
+      else:
+        print('  budget {} finished in {} seconds: {}'.format(
+          r.budget, r.total_time, result
+        ), flush=True)
+
+    while pending or running:
+      while pending and slots:
+        i = pending.pop()
+        results[i] = inferred(i)
+        if results[i] is not None:
+          report(results[i])
+          continue
+        slot = slots.pop()
+        self._cancelled[slot] = 0
+        running[i] = slot
+        self._pool.apply_async(
+          _simulate, (tasks[i], slot),
+          callback=lambda r, i=i: done.put((i, r)),
+          error_callback=lambda e, i=i: done.put((i, e))
+        )
+      if not running:
+        continue
+
+      i, r = done.get()
+      slots.append(running.pop(i))
+      if isinstance(r, BaseException):
+        raise r
+      record, result = r
+      if record is None:
+        # cancelled, already inferred
+        report(results[i])
+        continue
+      # (overrides the inferred failure if it finished before it was cancelled)
+      results[i] = record
+      report(record, result + (' (verified)' if i in checked else ''))
+      if i in checked and not record.failed():
+        print('WARNING: budget {} passed though a larger budget failed'.format(
+          record.budget
+        ), flush=True)
+
+      group = tasks[i].group
+      if prune and record.failed() and group is not None:
+        if group not in failures or record.budget > failures[group].budget:
+          failures[group] = record
+        for j, slot in running.items():
+          if tasks[j].group == group and results[j] is None:
+            results[j] = inferred(j)
+            if results[j] is not None:
+              self._cancelled[slot] = 1
+
+    return results
+
+  def min_budget(self, task : SweepTask, lo : float, hi : float, tol : float,
+                 verbose=True) -> (float, float, List[SweepResult]):
+    """
+    Searches for the smallest budget in (`lo`, `hi`] at which `task` completes,
+    assuming it fails at `lo`, completes at `hi` and, like `map` with `prune`,
+    fails below any budget that fails. Each round probes as many evenly spaced
+    budgets as there are workers, so the bracket shrinks by a factor of
+    `processes + 1` per round, until it is at most `tol` wide.
+
+    Returns the final bracket (a failing and a completing budget) and every
+    probe's result.
+    """
+    assert lo < hi
+    records = []
+    while hi - lo > tol:
+      k = self.processes
+      budgets = sorted(set([int(lo + (hi - lo) * (i + 1) / (k + 1)) for i in range(k)]))
+      budgets = [b for b in budgets if lo < b < hi]
+      if len(budgets) == 0:
+        break
+      probes = self.map([
+        attr.evolve(task, budget=b, group=0) for b in budgets
+      ], verbose=verbose, prune=True)
+      records.extend([r for r in probes if not r.inferred])
+      for r in probes:
+        if r.failed():
+          lo = max(lo, r.budget)
+        else:
+          hi = min(hi, r.budget)
+    return lo, hi, records
+
+  def refine(self, task : SweepTask, records : List[SweepResult], value : Callable,
+             tol : float, value_tol : float, max_runs : int,
+             verbose=True) -> List[SweepResult]:
+    """
+    Adds budgets between the completed `records` of `task` where `value(record)`
+    (e.g. the overhead) changes the most between neighbouring budgets, until
+    every gap is within `value_tol` or `tol` wide, or `max_runs` more budgets
+    ran. Each round bisects the largest gaps, one per worker. Returns `records`
+    and the new results in order of budget.
+    """
+    records = sorted(records, key=lambda r: r.budget)
+    runs = 0
+    while runs < max_runs:
+      # (not across a failure, which would be bisected again and again)
+      gaps = [
+        (abs(value(a) - value(b)), a.budget, b.budget) for a, b in zip(records, records[1:])
+        if not a.failed() and not b.failed() and b.budget - a.budget > max(tol, 1)
+        and abs(value(a) - value(b)) > value_tol
+      ]
+      if len(gaps) == 0:
+        break
+      gaps.sort(reverse=True)
+      gaps = gaps[:min(self.processes, max_runs - runs)]
+      budgets = [int((a + b) / 2) for _, a, b in gaps]
+      new = self.map([attr.evolve(task, budget=b) for b in budgets], verbose=verbose)
+      runs += len(new)
+      for r in new:
+        if r.failed():
+          print('WARNING: budget {} failed above a budget that completed'.format(r.budget),
+                flush=True)
+      records = sorted(records + new, key=lambda r: r.budget)
+    return records
+
+  def close(self):
+    self._pool.close()
+    self._pool.join()
+    shutil.rmtree(self._dir, ignore_errors=True)
+
+  def __enter__(self) -> 'Sweep':
+    return self
+
+  def __exit__(self, *exc):
+    if exc[0] is not None:
+      self._pool.terminate()
+    self.close()
@@ -2,7 +2,7 @@ import json
 import time
 import glob
 from datetime import datetime
-from pathos.multiprocessing import ProcessPool as Pool
+from functools import partial
 import matplotlib.pyplot as plt
 
 from simrd.heuristic import *
@@ -10,8 +10,9 @@ from simrd.runtime import *
 
 from simrd_experiments.bounds import *
 import simrd_experiments.util as util
+from simrd_experiments.pareto import Sweep, SweepTask
 
-from simrd_experiments.uniform_linear.run import run, chop_failures
+from simrd_experiments.uniform_linear.run import run_with, chop_failures
 
 """
 Experiments to evaluate the best-case asymptotic behavior of DTR using various
@@ -22,7 +23,11 @@ performance).
 
 ASYMPTOTICS_MOD = 'uniform_linear/asymptotics'
 
-def run_asymptotics(base, ns, heuristic, bound, runtime, releases=True, **kwargs):
+def run_asymptotics(base, ns, heuristic, bound, runtime, releases=True, sweep=None, **kwargs):
+  if sweep is None:
+    with Sweep() as sweep:
+      return run_asymptotics(base, ns, heuristic, bound, runtime, releases, sweep, **kwargs)
+
   config = {
     'ns': ns,
     'heuristic': str(heuristic),
@@ -34,23 +39,22 @@ def run_asymptotics(base, ns, heuristic, bound, runtime, releases=True, **kwargs
     'kwargs': kwargs
   }
 
-  p = Pool()
-
   print('generating asymptotics data for config: {}...'.format(json.dumps(config, indent=2)))
 
-  args = []
+  tasks = []
   for n in ns:
-    args.append([n, bound(n), heuristic, runtime, releases, kwargs])
+    callback = partial(run_with, n, releases=releases)
+    tasks.append(SweepTask(callback, bound(n), heuristic, runtime, kwargs))
 
   t = time.time()
-  rts = p.map(run, *zip(*args))
+  rts = sweep.map(tasks, verbose=False)
   t = time.time() - t
   succ_ns, succ_rts = chop_failures(ns, rts)
   print('  - succeeded between n={} and n={}'.format(succ_ns[0], succ_ns[-1]))
   print('  done, took {} seconds.'.format(t))
   results = {
     'layers': succ_ns,
-    'computes': list(map(lambda rt: rt.telemetry.summary['remat_compute'], rts)),
+    'computes': list(map(lambda rt: rt.summary['remat_compute'], rts)),
     'had_OOM': ns[0] != succ_ns[0],
     'had_thrash': ns[-1] != succ_ns[-1]
   }
@@ -84,13 +88,16 @@ def plot_tq(ns):
     label=r'Chen et al. ($2\sqrt{n}$, theoretical)', color='black', linestyle='--', alpha=0.8)
 
 def run_runtime_comparison(base, ns, heuristic, bound):
-  for eager in [False, True]:
-    runtime = RuntimeV2EagerOptimized if eager else RuntimeV2Optimized
-    run_asymptotics(base, ns, heuristic, bound, runtime)
+  with Sweep() as sweep:
+    for eager in [False, True]:
+      runtime = RuntimeV2EagerOptimized if eager else RuntimeV2Optimized
+      run_asymptotics(base, ns, heuristic, bound, runtime, sweep=sweep)
 
 def run_heuristic_comparison(base, ns, heuristics, bound, runtime, releases=True, **kwargs):
-  for heuristic in heuristics:
-    run_asymptotics(base, ns, heuristic, bound, runtime, releases=releases, **kwargs)
+  with Sweep() as sweep:
+    for heuristic in heuristics:
+      run_asymptotics(base, ns, heuristic, bound, runtime, releases=releases, sweep=sweep,
+                      **kwargs)
 
 def plot_runtime_comparison(base, heuristic, bound, out_file):
   """Compare different runtime settings on the same budget and heuristic."""
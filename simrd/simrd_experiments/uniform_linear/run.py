@@ -8,7 +8,7 @@ def run_with(n, rt, releases=True):
   forward = []
   prev_grad = None
 
-  UNIT_OP = Operator(1, (1,), (-1,))
+  UNIT_OP = Operator(1, (1,), (-1,), name='unit')
 
   # forward pass
   for i in range(n):
@@ -112,6 +112,140 @@ def test_graph_simple():
 
   assert g.ops_topological() == ['f/0']
 
+def test_parse_streaming():
+  import json, pytest
+
+  log = [
+    {'INSTRUCTION': 'CONSTANT', 'NAME': 'x'},
+    {'INSTRUCTION': 'MEMORY', 'NAME': 'x', 'MEMORY': '4'},
+    {'INSTRUCTION': 'ANNOTATE', 'ANNOTATION': 'START'},
+    {'INSTRUCTION': 'CALL', 'RESULT': ['y', 'z'], 'NAME': 'f', 'ARGS': ['x'], 'TIME': '3'},
+    {'INSTRUCTION': 'MEMORY', 'NAME': 'y', 'MEMORY': '8'},
+    {'INSTRUCTION': 'ALIAS', 'NAME': 'y', 'ALIAS': '-1'},
+    {'INSTRUCTION': 'MEMORY', 'NAME': 'z', 'MEMORY': '0'},
+    {'INSTRUCTION': 'ALIAS', 'NAME': 'z', 'ALIAS': '0'},
+    {'INSTRUCTION': 'RELEASE', 'NAME': 'z'},
+  ]
+  read = []
+  def lines():
+    for l in log:
+      read.append(l)
+      yield json.dumps(l)
+
+  g = parse_file(lines(), start=False)
+  assert len(read) == len(log)
+  (op,) = [op for op in g.fwd_ops.values() if op.name.startswith('f/')]
+  assert (op.cost, op.size, op.alias) == (3, (8, 0), (-1, 0))
+  assert [type(c) for c in g.schedule] == [GCompute, GGet, GCompute, GRelease, GGet, GGet]
+
+  # everything before the START annotation is skipped
+  g = parse_file(map(json.dumps, log[:3]), start=True)
+  assert len(g.schedule) == 0
+
+  with pytest.raises(RuntimeError):
+    parse_file(iter(['{"INSTRUCTION": "CONSTANT", "NAME": "x"}', 'not json']))
+
+def test_parse_lines_workers():
+  import pytest
+  from simrd.parse.parse import parse_lines
+  with open(MANIFEST['U-Net (6)']['log'], 'r') as f:
+    lines = f.readlines()
+  assert list(parse_lines(iter(lines), workers=2, chunk_lines=100)) == \
+    list(parse_lines(iter(lines)))
+  with pytest.raises(RuntimeError):
+    list(parse_lines(iter(lines[:150] + ['not json'] + lines[150:]), workers=2, chunk_lines=100))
+
+def test_topology(tmp_path):
+  graph = Graph()
+
+  f, (x,) = GOp.make(graph, tuple(), 10, (5,), (-1,), 'f', ('x',), {})
+  split, (xa, xb) = GOp.make(graph, (x,), 1, (0, 0), (0, 0), 'split', ('xa', 'xb'), {})
+  h, (y,) = GOp.make(graph, (xa, xb), 5, (2,), (-1,), 'h', ('y',), {})
+
+  graph.schedule = [
+    GCompute(f), GCompute(split), GGet(x, pin=False), GRelease(x),
+    GCompute(h), GGet(y, pin=True), GRelease(xa), GRelease(xb)
+  ]
+
+  topology = Topology(graph)
+  assert topology.tensor_count == 4
+  assert topology.program.tolist() == [
+    (Topology.COMPUTE, 0, 0), (Topology.COMPUTE, 1, 1),
+    (Topology.GET, -1, 0), (Topology.RELEASE, -1, 0),
+    (Topology.COMPUTE, 2, 3), (Topology.PIN, -1, 3),
+    (Topology.RELEASE, -1, 1), (Topology.RELEASE, -1, 2)
+  ]
+  assert topology.op_args == ((), (0,), (1, 2))
+  assert topology.op_names == (('x',), ('xa', 'xb'), ('y',))
+
+  # saving and loading gives the same program
+  topology.save(str(tmp_path / 'topology.npz'))
+  loaded = Topology.load(str(tmp_path / 'topology.npz'))
+  assert loaded.program.tolist() == topology.program.tolist()
+  assert loaded.op_args == topology.op_args and loaded.op_names == topology.op_names
+  assert [str(op) for op in loaded.ops] == [str(op) for op in topology.ops]
+
+  # Operators are shared across runs, Tensors are not
+  for callback in [graph.get_closure(), loaded.run]:
+    rts = [RuntimeV2(math.inf, Heuristic()), RuntimeV2(math.inf, Heuristic())]
+    for rt in rts:
+      callback(rt)
+      assert rt.clock == 1 + 10 + 1 + 5
+      assert rt.tensor_map[3].storage.pinned and rt.tensor_map[3].parents == [
+        rt.tensor_map[1], rt.tensor_map[2]
+      ]
+    assert rts[0].tensor_map[0].op is rts[1].tensor_map[0].op
+    assert rts[0].tensor_map[0] is not rts[1].tensor_map[0]
+
+def test_stream_file():
+  import pytest
+  model = MANIFEST['ResNet-32 (56)']
+  with open(model['log'], 'r') as f:
+    g = parse_file(f, start=model['has_start'])
+  peak = None
+  for budget in [math.inf, 0.5]:
+    budget = budget if peak is None else int(budget * peak)
+    rts = [RuntimeV2EagerOptimized(budget, DTR()) for _ in range(2)]
+    g.get_closure()(rts[0])
+    with open(model['log'], 'r') as f:
+      meta = stream_file(f, rts[1], start=model['has_start'], batch_size=7, queue_size=2)
+    assert meta['compute'] == g.meta['compute'] and meta['outputs'] == g.meta['outputs']
+    assert rts[0].clock == rts[1].clock
+    assert rts[0].telemetry.summary == rts[1].telemetry.summary
+    peak = rts[0].telemetry.summary['max_memory']
+
+  # the runtime gives up early, and parse errors reach the caller
+  with open(model['log'], 'r') as f, pytest.raises(MemoryError):
+    stream_file(f, RuntimeV2EagerOptimized(1e6, DTR()), start=model['has_start'])
+  with pytest.raises(RuntimeError):
+    stream_file(iter(['{"INSTRUCTION": "CONSTANT", "NAME": "x"}', 'not json']),
+                RuntimeV2EagerOptimized(math.inf, DTR()), start=False)
+
+def test_parse_file_cached(tmp_path):
+  import os
+  log = MANIFEST['ResNet-32 (56)']['log']
+  cache_dir = str(tmp_path / 'cache')
+  with open(log, 'r') as f:
+    topology = Topology(parse_file(f))
+
+  cached = parse_file_cached(log, cache_dir)
+  assert len(os.listdir(cache_dir)) == 1
+  loaded = parse_file_cached(log, cache_dir)
+  assert len(os.listdir(cache_dir)) == 1
+  for t in [cached, loaded]:
+    assert t.program.tolist() == topology.program.tolist()
+    assert t.op_args == topology.op_args and t.op_names == topology.op_names
+    assert [(op.compute, op.sizes, op.aliases, op.name) for op in t.ops] == \
+      [(op.compute, op.sizes, op.aliases, op.name) for op in topology.ops]
+
+  # other parse options get their own entries
+  parse_file_cached(log, cache_dir, out_cond=OutputCondition.PREALLOCATE)
+  assert len(os.listdir(cache_dir)) == 2
+
+  no_dealloc = loaded.without_releases()
+  assert Topology.RELEASE not in no_dealloc.program['opcode']
+  assert Topology.RELEASE in loaded.program['opcode']
+
 def test_collapse_aliases_linear():
   graph = Graph()
 
@@ -317,3 +451,53 @@ def test_constant_elim():
     GCompute(graph_r.ops[graph_r.meta['op_map'][g.name]]),
     GRelease(graph_r.tensors[graph_r.meta['tensor_map'][x.name]])
   ]
+
+def test_ops_topological_deep():
+  import sys
+  graph = Graph()
+  _, (x,) = GOp.make(graph, tuple(), 1, (1,), (-1,), 'f', ('x0',), {})
+  for i in range(1, 5 * sys.getrecursionlimit()):
+    _, (x,) = GOp.make(graph, (x,), 1, (1,), (-1,), 'f', ('x{}'.format(i),), {})
+  topo = graph.ops_topological()
+  assert topo == ['f/{}'.format(i) for i in range(len(graph.ops))]
+
+  # the cached order is invalidated by new ops
+  GOp.make(graph, tuple(), 1, (1,), (-1,), 'g', ('y',), {})
+  assert graph.ops_topological() == ['g/{}'.format(len(topo))] + topo
+
+def test_rewrite_checkmate_fused():
+  graph = Graph()
+  cf, (c,) = GOp.make(graph, tuple(), 0, (10,), (-1,), GOp.CONST_NAME, ('c',), {})
+  f, (x1, x2) = GOp.make(graph, (c,), 2, (4, 6), (-1, -1), 'f', ('x1', 'x2'), {})
+  a, (xa,) = GOp.make(graph, (x2,), 1, (0,), (0,), 'a', ('xa',), {})
+  ca, (cv,) = GOp.make(graph, (c,), 1, (0,), (0,), 'a', ('cv',), {})
+  g, (y,) = GOp.make(graph, (x1, xa, cv), 5, (5,), (-1,), 'g', ('y',), {})
+  graph.schedule = [
+    GCompute(cf), GCompute(f), GCompute(a), GCompute(ca), GRelease(cv),
+    GCompute(g), GRelease(x1), GRelease(xa), GGet(y, pin=True)
+  ]
+
+  graph_r = rewrite_checkmate(graph)
+  graph_s = rewrite_constant_elim(rewrite_merge_tuples(rewrite_collapse_aliases(graph)))
+  assert [str(cmd) for cmd in graph_r.schedule] == [str(cmd) for cmd in graph_s.schedule]
+  for k in ['compute', 'constant_ram', 'no_aliases', 'no_tuples', 'no_constants']:
+    assert graph_r.meta[k] == graph_s.meta[k]
+  assert graph_r.meta['constant_ram'] == 10 and graph_r.meta['compute'] == 7
+
+  # the maps are from the names in the original graph
+  assert graph_r.meta['tensor_map'] == {'x1': 'x1+x2', 'x2': 'x1+x2', 'xa': 'x1+x2', 'y': 'y'}
+  assert graph_r.meta['op_map'] == {f.name: f.name, g.name: g.name}
+  assert graph_r.op_parents[g.name] == set([f.name])
+
+def test_graph_ids():
+  graph = Graph()
+  f, (x1, x2) = GOp.make(graph, tuple(), 2, (4, 6), (-1, -1), 'f', ('x1', 'x2'), {})
+  g, (y,) = GOp.make(graph, (x1, x2), 1, (5,), (-1,), 'g', ('y',), {})
+  assert (f.id, g.id) == (0, 1) and (x1.id, x2.id, y.id) == (0, 1, 2)
+  assert graph.op_list == [f, g] and graph.tensor_list == [x1, x2, y]
+
+  # parents are deduplicated, and the name views agree with the id lists
+  assert graph.op_parent_ids == [(), (0,)] and graph.op_child_ids == [[1], []]
+  assert graph.op_parents[g.name] == set([f.name])
+  assert graph.op_children[f.name] == set([g.name])
+  assert graph.ops_topological_ids() == [0, 1]
@@ -0,0 +1,181 @@
+import math
+from simrd.tensor import *
+from simrd.optimization import *
+
+def test_eviction_pool():
+  pool = EvictionPool()
+  s1, s2, s3 = Storage(1), Storage(2), Storage(3)
+
+  assert pool.add(s1) and pool.add(s2) and pool.add(s3)
+  assert not pool.add(s2)
+  assert len(pool) == 3
+  assert s2 in pool
+  assert list(pool) == [s1, s2, s3]
+  assert pool[1] == s2
+
+  assert pool.remove(s2)
+  assert not pool.remove(s2)
+  assert s2 not in pool
+  assert list(pool) == [s1, s3]
+  assert pool[1] == s3
+
+  # re-adding moves to the end, as with list append/remove
+  assert pool.add(s2) and pool.remove(s1) and pool.add(s1)
+  assert list(pool) == [s3, s2, s1]
+  # indices fill gaps with the last Storage instead
+  assert [pool[i] for i in range(len(pool))] == [s2, s3, s1]
+
+  pool.clear()
+  assert len(pool) == 0 and list(pool) == [] and pool.add(s3) and pool[0] == s3
+
+def test_priority_eviction_pool_matches_scan():
+  import random
+  from simrd.heuristic import Heuristic
+
+  class StaticCost(Heuristic):
+    INVALIDATED_BY = set()
+
+    def evaluate(self, s, rt, **kwargs):
+      return s.meta['cost']
+
+  random.seed(0)
+  h = StaticCost()
+  # costs with many ties, including 0, and (like LRU's) negative and infinite
+  for costs in [[0, 1, 2, 3], [-math.inf, -2, -1, 0, 1, 2, math.inf], [-math.inf, 0, 5]]:
+    storages = [Storage(1, material=True) for _ in range(50)]
+    pool, ppool = EvictionPool(), PriorityEvictionPool(h, None)
+    for _ in range(1000):
+      s = random.choice(storages)
+      if s in pool:
+        pool.remove(s); ppool.remove(s)
+      else:
+        s.meta['cost'] = random.choice(costs)
+        pool.add(s); ppool.add(s)
+      if random.random() < 0.2 and len(pool) > 0:
+        s = pool[random.randrange(0, len(pool))]
+        s.meta['cost'] = random.choice(costs)
+        ppool.invalidate(s)
+      if len(pool) > 0:
+        assert h.choose(ppool, None) == h.choose(pool, None)
+
+def test_staleness_eviction_pool_matches_scan():
+  import math, random
+  from simrd.heuristic import Heuristic
+
+  class Stale(Heuristic):
+    INVALIDATED_BY = set()
+    STALENESS_SCALED = True
+
+    def evaluate(self, s, rt, **kwargs):
+      denom = s.size * Heuristic.staleness(s.last_access_int, rt.clock)
+      return s.compute / denom if denom > 0 else math.inf
+
+    def base_cost(self, s, rt, **kwargs):
+      return s.compute / s.size if s.size > 0 else math.inf
+
+  class Clock:
+    clock = 1
+
+  random.seed(0)
+  h, rt = Stale(), Clock()
+  storages = [Storage(random.choice([0, 1, 2, 3]), material=True) for _ in range(60)]
+  for s in storages:
+    s.compute = random.choice([0, 1, 5, 10])
+    s.last_access_int = -math.inf
+  pool, spool = EvictionPool(), StalenessEvictionPool(h, rt)
+  for _ in range(1000):
+    rt.clock += random.choice([0, 1, 3])
+    s = random.choice(storages)
+    if s in pool:
+      pool.remove(s); spool.remove(s)
+    else:
+      pool.add(s); spool.add(s)
+    if random.random() < 0.3 and len(pool) > 0:
+      s = pool[random.randrange(0, len(pool))]
+      s.last_access_int = rt.clock
+      spool.invalidate(s)
+    if len(pool) > 0:
+      assert h.choose(spool, rt) == h.choose(pool, rt)
+
+def test_sampled_eviction_pool():
+  storages = [Storage(1000) for _ in range(99)] + [Storage(1)]
+  pool = SampledEvictionPool(sample='sqrt', seed=0)
+  for s in storages:
+    pool.add(s)
+  sample = pool.sample()
+  # strides are at most floor(sqrt(100)) and start at the first Storage
+  assert sample[0] == storages[0] and 10 <= len(sample) < 100
+  assert sample == sorted(sample, key=storages.index)
+  assert len(SampledEvictionPool(sample='sqrt', seed=0).sample()) == 0
+
+  pool = SampledEvictionPool(sample=5, seed=0, small_ratio=0.01)
+  for s in storages:
+    pool.add(s)
+  sample = pool.sample()
+  assert len(sample) == 5 and storages[-1] not in sample
+
+  # small Storages are only candidates if nothing else is
+  pool = SampledEvictionPool(small_ratio=0.01)
+  for s in storages:
+    pool.add(s)
+  for s in storages[:-1]:
+    pool.remove(s)
+  assert list(pool.sample()) == [storages[-1]]
+
+  # the mean size is over the Storages in the pool, however often re-added
+  pool = SampledEvictionPool(sample=3, seed=0, small_ratio=0.6)
+  small, large = [Storage(10) for _ in range(10)], [Storage(30) for _ in range(10)]
+  for s in small + large:
+    pool.add(s)
+  for _ in range(100):
+    pool.remove(large[0]); pool.add(large[0])
+  for _ in range(20):
+    sample = pool.sample()
+    assert len(sample) == 3 and all(s in large for s in sample)
+    assert sample == sorted(sample, key=list(pool).index)
+  for s in large[1:]:
+    pool.remove(s)
+  # mean (100 + 30) / 11, so only Storages of size < 7.1 are small
+  assert not pool._is_small(small[0])
+
+def test_array_eviction_pool_matches_scan():
+  import random
+  from simrd.heuristic import HEURISTICS
+  from simrd.heuristic.ablation import AbLocal, AbStale
+
+  class Summary:
+    summary = {'heuristic_eval_count': 0, 'heuristic_access_count': 0}
+
+  class Clock:
+    clock = 1
+    telemetry = Summary()
+
+  random.seed(0)
+  rt = Clock()
+  storages = [Storage(random.choice([0, 1, 2]), material=True) for _ in range(50)]
+  for s in storages:
+    s.compute = random.choice([0, 1, 5])
+    s.last_access_int = random.choice([-math.inf, 0])
+  for name in ['DTRLocal', 'LRU', 'LargestStorage', 'AbLocal', 'AbStale']:
+    h = HEURISTICS[name]()
+    pool, apool = EvictionPool(), ArrayEvictionPool()
+    assert ArrayEvictionPool.supports(h, set(['last_access']))
+    for _ in range(300):
+      rt.clock += random.choice([0, 1])
+      s = random.choice(storages)
+      if s in pool:
+        pool.remove(s); apool.remove(s)
+      else:
+        pool.add(s); apool.add(s)
+      if random.random() < 0.3 and len(pool) > 0:
+        s = pool[random.randrange(0, len(pool))]
+        s.last_access_int = rt.clock
+        apool.invalidate(s)
+      if len(pool) > 0:
+        summary = rt.telemetry.summary
+        count = summary['heuristic_eval_count']
+        choice = h.choose(apool, rt)
+        batch_count = summary['heuristic_eval_count'] - count
+        assert choice == h.choose(pool, rt)
+        # the batch counts only the evaluations the scan made
+        assert batch_count == summary['heuristic_eval_count'] - count - batch_count
@@ -1,3 +1,4 @@
+import sys
 from simrd.runtime import *
 from simrd.heuristic import DTRUnopt
 
@@ -5,6 +6,24 @@ OP1 = Operator(2, (1,), (-1,), name='op1')
 OP2 = Operator(2, (1,1), (-1,-1), name='op2')
 OPA1 = Operator(1, (0,), (0,), name='opa1')
 
+def run_random(rt, seed, steps, check=lambda rt, xs: None,
+               ops=lambda inputs: [OP1, OP2]):
+  """
+  Runs `steps` random operators from `ops(inputs)` on `rt`, each on one or two
+  of the last 6 Tensors, and gets a random Tensor with probability 0.3. Calls
+  `check(rt, xs)` with the Tensors so far after each step.
+  """
+  import random
+  random.seed(seed)
+  xs = list(rt.compute([], OP1))
+  for _ in range(steps):
+    inputs = random.sample(xs[-6:], random.randint(1, min(2, len(xs))))
+    xs.extend(rt.compute(inputs, random.choice(ops(inputs))))
+    if random.random() < 0.3:
+      rt.get(random.choice(xs))
+    check(rt, xs)
+  return xs
+
 def test_simple_V1():
   rt = RuntimeV1(math.inf, DTRUnopt)
   (x,) = rt.compute([], OP1)
@@ -40,3 +59,255 @@ def test_simple_V2():
 
   assert x in y.parents
   assert y.storage.root_id == y.id
+
+def test_deep_rematerialization():
+  from simrd.heuristic import LRU
+  from simrd.optimization import EqClassNode
+
+  # rematerializing the end of a fully evicted chain must not recurse per Tensor
+  n = 5 * sys.getrecursionlimit()
+  for rt in [RuntimeV1(3, LRU()), RuntimeV2(3, LRU())]:
+    (x,) = rt.compute([], OP1)
+    xs = [x]
+    for _ in range(n):
+      (x,) = rt.compute([x], OP1)
+      xs.append(x)
+    (y,) = rt.compute([xs[-1]], OP1)
+    (y,) = rt.compute([y], OP1)
+    assert not xs[-2].defined
+    rt.rematerialize(xs[-2])
+    assert xs[-2].defined and xs[-2].storage.ref_int == 0
+    assert rt.telemetry.summary['remat_compute'] == OP1.compute * n
+
+  ecns = [EqClassNode(0)]
+  for _ in range(n):
+    ecns.append(EqClassNode(0, parent=ecns[-1]))
+  assert EqClassNode.find_root(ecns[-1]) is ecns[0]
+  assert all(e._parent is ecns[0] for e in ecns[1:])
+
+def test_pareto_forked_matches_independent():
+  import os, pytest
+  from simrd.heuristic import DTR
+  from simrd_experiments.pareto import pareto
+  if not hasattr(os, 'fork'):
+    pytest.skip('requires os.fork')
+
+  def callback(rt):
+    (x,) = rt.compute([], OP1)
+    xs = [x]
+    for i in range(100):
+      (x,) = rt.compute([xs[-1], xs[i // 2]], OP1)
+      xs.append(x)
+    for x in xs[::3]:
+      rt.release(x)
+    for x in xs[1::3]:
+      if not x.defined:
+        rt.rematerialize(x)
+
+  budgets = [5, 10, 20, 40, 60, 200]
+  independent, forked = [
+    pareto(callback, budgets, DTR(), RuntimeV2EagerOptimized, verbose=False,
+           fork_at_divergence=fork)
+    for fork in [False, True]
+  ]
+  for a, b, budget in zip(independent, forked, budgets):
+    assert a.budget == b.budget == budget
+    assert (a.clock, a.OOM, a.memory_usage) == (b.clock, b.OOM, b.memory_usage)
+    assert a.telemetry.summary == b.telemetry.summary
+
+def test_sweep_matches_pareto():
+  from functools import partial
+  from simrd.heuristic import DTR
+  from simrd.parse.graph import Graph, GOp, GCompute, GGet, GRelease, Topology
+  from simrd_experiments.pareto import pareto, Sweep, SweepTask
+  from simrd_experiments.uniform_linear.run import run_with
+
+  g = Graph()
+  _, (x,) = GOp.make(g, tuple(), 2, (1,), (-1,), 'f', ('x0',), {})
+  xs = [x]
+  g.schedule = [GCompute(x.op)]
+  for i in range(50):
+    op, (x,) = GOp.make(g, (xs[-1], xs[i // 2]), 2, (1,), (-1,), 'f', ('x{}'.format(i + 1),), {})
+    g.schedule.append(GCompute(op))
+    xs.append(x)
+  g.schedule += [GRelease(x) for x in xs[::3]] + [GGet(x, pin=True) for x in xs[1::3]]
+  topology = Topology(g)
+
+  budgets = [5, 10, 20, 60]
+  with Sweep(processes=2) as sweep:
+    key = sweep.publish(topology)
+    records = sweep.map([
+      SweepTask(key, b, DTR(), RuntimeV2EagerOptimized, {'remat_limit': 100})
+      for b in budgets
+    ], verbose=False)
+    (linear,) = sweep.map([
+      SweepTask(partial(run_with, 20), 8, DTR(), RuntimeV2EagerOptimized)
+    ], verbose=False)
+  rts = pareto(topology.run, budgets, DTR(), RuntimeV2EagerOptimized, verbose=False,
+               remat_limit=100)
+  for r, rt in zip(records, rts):
+    assert (r.budget, r.OOM, r.remat_exceeded, r.clock) == \
+      (rt.budget, rt.OOM, rt.remat_exceeded, rt.clock)
+    assert r.summary == rt.telemetry.summary
+  assert linear.budget == 8 and not linear.OOM and linear.summary['remat_compute'] > 0
+
+def test_sweep_prune():
+  from simrd.heuristic import DTR
+  from simrd_experiments.pareto import Sweep, SweepTask
+  from simrd_experiments.uniform_linear.run import run_with
+  from functools import partial
+
+  callback = partial(run_with, 100)
+  # with one worker, at most one budget below the first failure is in flight
+  budgets = [0, 1, 2, 3, 4, 6, 8, 12, 20, 100, 200]
+  tasks = [
+    SweepTask(callback, b, DTR(), RuntimeV2EagerOptimized, {'remat_limit': 400}, group=0)
+    for b in budgets
+  ]
+  with Sweep(processes=1) as sweep:
+    full = sweep.map(tasks, verbose=False)
+    pruned = sweep.map(tasks, verbose=False, prune=True)
+    verified = sweep.map(tasks, verbose=False, prune=True, verify=1.0)
+  key = lambda r: (r.budget, r.OOM, r.remat_exceeded, r.clock, r.summary, r.inferred)
+  assert full[0].failed() and not full[-1].failed()
+  assert not any(r.inferred for r in full + verified)
+  assert list(map(key, verified)) == list(map(key, full))
+
+  # the pruned budgets never ran to completion, and are inferred from the
+  # largest failure; all but the one in flight when it failed, which is
+  # cancelled or finishes
+  fail = max((r for r in pruned if not r.inferred and r.failed()), key=lambda r: r.budget)
+  below = [r for r in pruned if r.budget < fail.budget]
+  assert len(below) > 1 and sum(1 for r in below if not r.inferred) <= 1
+  for a, b in zip(full, pruned):
+    assert a.budget == b.budget
+    if b.inferred:
+      assert a.failed() and b.budget < fail.budget
+      assert (b.OOM, b.remat_exceeded) == (fail.OOM, fail.remat_exceeded)
+      assert (b.clock, b.total_time, b.summary) == (None, None, None)
+    else:
+      assert key(a) == key(b)
+
+def test_sweep_min_budget():
+  import attr
+  from simrd.heuristic import DTR
+  from simrd_experiments.pareto import Sweep, SweepTask
+  from simrd_experiments.uniform_linear.run import run_with
+  from functools import partial
+
+  task = SweepTask(partial(run_with, 100), 200, DTR(), RuntimeV2EagerOptimized,
+                   {'remat_limit': 400})
+  with Sweep(processes=3) as sweep:
+    lo, hi, probes = sweep.min_budget(task, 0, 200, 1, verbose=False)
+    # the budgets around the bracket, run directly rather than searched
+    around = list(range(max(lo - 3, 0), hi + 4))
+    scan = sweep.map([attr.evolve(task, budget=b) for b in around], verbose=False)
+    records = sweep.refine(task, probes, lambda r: r.clock, 1, 0, 5, verbose=False)
+  assert hi - lo == 1
+  assert [r.failed() for r in scan] == [b <= lo for b in around]
+  assert all(r.failed() == (r.budget <= lo) for r in probes)
+  assert len(records) > len(probes) and len(records) <= len(probes) + 5
+  assert [r.budget for r in records] == sorted([r.budget for r in records])
+
+def test_summary_only_matches_telemetry():
+  import pickle
+  from simrd.heuristic import DTR
+
+  def run(**kwargs):
+    rt = RuntimeV2EagerOptimized(8, DTR(), **kwargs)
+    run_random(rt, 0, 100)
+    return rt
+
+  full, summary = run(stats=True, trace=True), run(summary_only=True)
+  assert full.telemetry.summary == summary.telemetry.summary
+  assert full.telemetry.summary['remat_compute'] > 0
+  assert len(full.telemetry.trace.compute) > 0 and len(summary.telemetry.trace.compute) == 0
+
+  summary._prepickle()
+  summary = pickle.loads(pickle.dumps(summary))
+  assert summary.telemetry.summary == full.telemetry.summary
+
+def check_region_paths(ops, seeds):
+  """
+  Runs random graphs of `ops` with incremental and rebuilt Regions side by
+  side, checking that the Regions are the same whenever they are used.
+  """
+  from simrd.heuristic import DTR
+  from simrd.optimization import Region
+
+  class RecordedDTR(DTR):
+    """Records the Regions of every candidate, at eviction time."""
+    def __init__(self):
+      super().__init__()
+      self.regions = []
+
+    def evaluate(self, s, rt, **kwargs):
+      for reg in [s.region, s.region_rev]:
+        self.regions.append((rt.clock, s.root_id, reg.reverse, set(reg.interior),
+                             set(reg.frontier), reg.compute))
+      return super().evaluate(s, rt, **kwargs)
+
+  def check(rt, xs):
+    for t in rt.tensor_map.values():
+      s = t.storage
+      if not s.material:
+        continue
+      for reg in [s.region, s.region_rev]:
+        fresh = Region(s, reg.reverse)
+        fresh.rebuild(rt.telemetry)
+        assert (reg.interior, reg.frontier, reg.compute) == \
+          (fresh.interior, fresh.frontier, fresh.compute)
+
+  def run(seed, budget, incremental):
+    rt = RuntimeV2EagerOptimized(budget, RecordedDTR(), priority_pool=False,
+                                 incremental_regions=incremental)
+    try:
+      run_random(rt, seed, 200, check=check if incremental else lambda rt, xs: None,
+                 ops=ops)
+    except MemoryError:
+      pass
+    return rt
+
+  # the Regions must match the rebuilt ones when they are used, mid-compute,
+  # not only between operators
+  remat = 0
+  for budget in [6, 7, 8]:
+    for seed in seeds:
+      inc, reb = run(seed, budget, True), run(seed, budget, False)
+      assert inc.heuristic.regions == reb.heuristic.regions
+      assert (inc.clock, inc.OOM) == (reb.clock, reb.OOM)
+      remat += inc.telemetry.summary['remat_compute']
+  assert remat > 0
+
+def test_incremental_regions_match_rebuild():
+  check_region_paths(lambda inputs: [OP1, OP2], range(40))
+
+def test_alias_regions_match_rebuild():
+  # aliases add edges to an existing Storage, and add to its compute even while
+  # it is evicted
+  check_region_paths(lambda inputs: [OP1, OP2, OPA1], range(20))
+
+def test_exact_eq_classes():
+  from simrd.heuristic import DTREqClass
+  from simrd.optimization import EqClassNode
+
+  def component_compute(rt, s):
+    seen, stack = set([s]), [s]
+    while stack:
+      for n in Storage.evicted_neighbors(stack.pop(), rt.telemetry):
+        if n not in seen:
+          seen.add(n)
+          stack.append(n)
+    return sum(map(lambda n: n.compute, seen))
+
+  def check(rt, xs):
+    for t in xs:
+      s = t.storage
+      assert s.evicted_adjacent == Storage.evicted_neighbors(s, rt.telemetry)
+      if not s.material and s.ecn is not None:
+        assert EqClassNode.get_value(s.ecn).compute == component_compute(rt, s)
+
+  rt = RuntimeV2EagerOptimized(10, DTREqClass(), exact_eq_class=True)
+  run_random(rt, 0, 150, check=check,
+             ops=lambda inputs: [OP1, OP2, OPA1] if len(inputs) == 1 else [OP1, OP2])
+  assert rt.telemetry.summary['remat_compute'] > 0
@@ -0,0 +1,74 @@
+import math
+from simrd.runtime import *
+from simrd.telemetry import Telemetry, load_tables
+
+OP1 = Operator(2, (1,), (-1,), name='op1')
+
+def test_telemetry_tables(tmp_path):
+  from simrd.heuristic import LRU
+
+  rt = RuntimeV2EagerOptimized(3, LRU(), stats=True)
+  (x,) = rt.compute([], OP1)
+  xs = [x]
+  for _ in range(2000):  # more than the initial capacity of the tables
+    (x,) = rt.compute([x], OP1)
+    xs.append(x)
+  rt.rematerialize(xs[10])
+  tel = rt.telemetry
+
+  assert len(tel.tensor) == len(xs)
+  assert tel.tensor[xs[10].id][:4] == [xs[10].id, xs[10].name, xs[10].op_id, xs[10].id]
+  assert tel.get('tensor', xs[10].id, 'direct_remat_count') == 1
+  assert tel.get('storage', xs[0].id, 'evict_count') > 0
+  # sizes stay ints, as they were before the columns were typed
+  assert type(tel.get('tensor', xs[10].id, 'size')) is int
+  assert type(tel.get('storage', xs[10].id, 'size')) is int
+
+  tables = tel.tables()
+  path = str(tmp_path / 'telemetry.npz')
+  tel.save(path)
+  loaded = load_tables(path)
+  for name in Telemetry.TABLES:
+    assert list(tables[name].columns) == getattr(Telemetry, name.upper() + '_STATS')
+    assert tables[name].equals(loaded[name])
+    assert tables[name].values.tolist() == list(getattr(tel, name).values())
+  assert loaded['summary'].iloc[0].to_dict() == tel.summary
+
+def test_column_table_ids():
+  from simrd.telemetry import ColumnTable
+
+  table = ColumnTable(['id', 'name', 'size'], capacity=1)
+  table.add(0, [0, 'a', 1])
+  table.add(1, [1, 'b', 2])
+  assert table.rows is None  # ids are their rows so far
+  table.add(7, [7, 'c', 3])
+  table.add(3, [3, 'd', 4])
+  assert list(table.keys()) == [0, 1, 7, 3] and 3 in table and 2 not in table
+  assert table[7] == [7, 'c', 3] and table.get(3, 'size') == 4
+  assert list(table.values())[-1] == [3, 'd', 4]
+
+def test_trace_spill(tmp_path):
+  from simrd.heuristic import LRU
+  from simrd.telemetry import Trace
+
+  rts = [RuntimeV2EagerOptimized(3, LRU(), trace=True, trace_spill=spill)
+         for spill in [None, str(tmp_path / 'trace.bin')]]
+  for rt in rts:
+    rt.telemetry.trace.chunk_size = 7
+    (x,) = rt.compute([], OP1)
+    xs = [x]
+    for _ in range(50):
+      (x,) = rt.compute([x], OP1)
+      xs.append(x)
+    rt.rematerialize(xs[10])
+  memory, spilled = rts[0].telemetry.trace, rts[1].telemetry.trace
+  assert spilled._spilled > 0 and len(spilled) == len(memory)
+  assert (spilled.events() == memory.events()).all()
+  for field in Trace.FIELDS:
+    assert getattr(spilled, field) == getattr(memory, field)
+  assert all(type(v) is int for v in memory.pressure.values())
+  # computed, then rematerialized
+  assert sum(ids.count(xs[10].id) for ids in memory.compute.values()) == 2
+
+  times = [time for time, _ in spilled.steps()]
+  assert times == sorted(set(times)) and len(times) >= len(spilled.timesteps)
@@ -17,9 +17,9 @@ def test_simple_tensors():
   assert t.op.name == 'f'
   assert t.id == 0
   assert t.name == 't'
-  assert not t.meta['is_alias']
+  assert not t.is_alias
   assert not t.defined
-  assert t.meta['ref_ext'] == 1
+  assert t.ref_ext == 1
 
   assert t.storage.root_id == 0
   assert t.storage.size == 5
@@ -37,7 +37,7 @@ def test_simple_tensors():
   assert len(x1.parents) == 1 and len(x1.siblings) == 0 and len(x1.children) == 0
   assert x1.id == 1 and x1.name == 'x1'
   assert x1.op.name == 'f2'
-  assert not x1.meta['is_alias'] and not x1.defined
+  assert not x1.is_alias and not x1.defined
   assert x1.storage.size == 4
 
 def test_tuple_tensors():
@@ -65,10 +65,10 @@ def test_simple_alias():
 
   assert t_alias.storage == t.storage
   assert t.storage.ref_ext == 2
-  assert t_alias.meta['is_alias']
+  assert t_alias.is_alias
 
   (t_alias_2,) = Tensor.from_op([t_alias], op_alias, 2, (2,))
 
   assert t_alias_2.storage == t.storage
   assert t.storage.ref_ext == 3
-  assert t_alias.meta['is_alias']
+  assert t_alias.is_alias